@@ -0,0 +1,13 @@
+import pytest
+
+
+@pytest.fixture(scope='session', autouse=True)
+def temporary_cache():
+    """Файловый кеш на время pytest — во временном каталоге, как и в
+    ``manage.py test`` (``core.test_runner.QueryBudgetRunner``)."""
+    from core.test_runner import TemporaryCache
+
+    cache = TemporaryCache()
+    cache.enable()
+    yield
+    cache.disable()
@@ -0,0 +1,144 @@
+"""Разбор и проверка пакетов записи API.
+
+Пакет — JSON-массив объектов. Каждый валидатор проверяет весь пакет за
+один проход: связанные посты, группы, комментарии и пользователи берутся
+одним запросом ``IN`` на модель. Валидатор возвращает объекты для записи,
+ошибки и номера уже существующих записей; всё — по номерам элементов.
+"""
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Count
+
+from posts import threads
+from posts.models import Comment, Follow, Group, Post, User
+
+from .resources import BadRequest
+
+
+def parse(request):
+    try:
+        items = json.loads(request.body)
+    except ValueError:
+        raise BadRequest('Тело запроса — не JSON')
+    if not isinstance(items, list):
+        raise BadRequest('Ожидается JSON-массив')
+    if len(items) > settings.API_BATCH_SIZE:
+        raise BadRequest(
+            f'Не больше {settings.API_BATCH_SIZE} элементов за раз')
+    if not all(isinstance(item, dict) for item in items):
+        raise BadRequest('Элементы массива должны быть объектами')
+    return items
+
+
+def _is_id(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _ids(items, name):
+    """Целые значения поля ``name``; остальные отсеет проверка элемента."""
+    return {item[name] for item in items if _is_id(item.get(name))}
+
+
+def _strings(items, name):
+    return {
+        item[name] for item in items if isinstance(item.get(name), str)}
+
+
+def _clean(obj, errors, exclude):
+    try:
+        obj.full_clean(exclude=exclude, validate_unique=False)
+    except ValidationError as exc:
+        errors.update(exc.message_dict)
+
+
+def validate_posts(items, user):
+    groups = Group.objects.in_bulk(
+        _strings(items, 'group'), field_name='slug')
+    valid, errors = {}, {}
+    for index, item in enumerate(items):
+        item_errors = {}
+        post = Post(text=item.get('text', ''), author=user)
+        slug = item.get('group')
+        if slug is not None and not isinstance(slug, str):
+            item_errors['group'] = ['Ожидается slug группы']
+        elif slug is not None:
+            post.group = groups.get(slug)
+            if post.group is None:
+                item_errors['group'] = ['Группа не найдена']
+        _clean(post, item_errors, exclude=('author', 'group', 'image'))
+        if item_errors:
+            errors[index] = item_errors
+        else:
+            valid[index] = post
+    return valid, errors, set()
+
+
+def _reply_errors(parent, post_id):
+    if parent is None or parent.post_id != post_id:
+        return ['Комментарий не найден']
+    try:
+        threads.check_reply(parent, parent.reply_count)
+    except ValidationError as exc:
+        return exc.messages
+    return []
+
+
+def validate_comments(items, user):
+    posts = Post.objects.only('pk').in_bulk(_ids(items, 'post'))
+    parents = Comment.objects.only(
+        'pk', 'post_id', 'depth', 'path'
+    ).annotate(reply_count=Count('replies')).in_bulk(_ids(items, 'parent'))
+    valid, errors = {}, {}
+    for index, item in enumerate(items):
+        item_errors = {}
+        post_id = item.get('post')
+        post = posts.get(post_id) if _is_id(post_id) else None
+        comment = Comment(text=item.get('text', ''), author=user, post=post)
+        if post_id is not None and not _is_id(post_id):
+            item_errors['post'] = ['Ожидается id поста']
+        elif post is None:
+            item_errors['post'] = ['Пост не найден']
+        parent_id = item.get('parent')
+        if parent_id is not None and not _is_id(parent_id):
+            item_errors['parent'] = ['Ожидается id комментария']
+        elif parent_id is not None:
+            comment.parent = parents.get(parent_id)
+            parent_errors = _reply_errors(comment.parent, post_id)
+            if parent_errors:
+                item_errors['parent'] = parent_errors
+        _clean(comment, item_errors, exclude=('author', 'post', 'parent'))
+        if item_errors:
+            errors[index] = item_errors
+            continue
+        valid[index] = comment
+        if comment.parent is not None:
+            # Ответы этого же пакета тоже считаются.
+            comment.parent.reply_count += 1
+    return valid, errors, set()
+
+
+def validate_follows(items, user):
+    """Подписки ``user`` на авторов; уже существующие — в ``existing``."""
+    authors = User.objects.only('pk', 'username').in_bulk(
+        _strings(items, 'author'), field_name='username')
+    following = set(Follow.objects.filter(
+        user=user, author__in=authors.values()
+    ).values_list('author_id', flat=True))
+    valid, errors, existing = {}, {}, set()
+    for index, item in enumerate(items):
+        username = item.get('author')
+        author = authors.get(username) if isinstance(username, str) else None
+        if username is not None and not isinstance(username, str):
+            errors[index] = {'author': ['Ожидается имя пользователя']}
+        elif author is None:
+            errors[index] = {'author': ['Автор не найден']}
+        elif author == user:
+            errors[index] = {'author': ['Нельзя подписаться на себя']}
+        elif author.pk in following:
+            existing.add(index)
+        else:
+            following.add(author.pk)
+            valid[index] = Follow(user=user, author=author)
+    return valid, errors, existing
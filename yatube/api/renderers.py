@@ -0,0 +1,32 @@
+"""Кодирование ответов API в JSON.
+
+Если установлен ``orjson``, ответы кодируются им: он заметно быстрее
+стандартного ``json``. Без него работает ``json`` с компактными
+разделителями. Даты приводятся к строкам ISO 8601 заранее, поэтому ответ
+не зависит от кодировщика.
+"""
+import json
+
+from django.http import HttpResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+CONTENT_TYPE = 'application/json'
+
+
+def dumps(data):
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(
+        data, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+def json_response(data, status=200):
+    return HttpResponse(dumps(data), content_type=CONTENT_TYPE, status=status)
+
+
+def error(status, message):
+    return json_response({'error': message}, status=status)
@@ -0,0 +1,146 @@
+"""Поля ответов API и колонки модели, которые им нужны.
+
+Клиент выбирает поля параметром ``?fields=id,text,author``. По выбранным
+полям запрос ограничивается через ``only()`` и ``select_related()``, так
+что невыбранные колонки и таблицы не читаются.
+"""
+from django.core.files.storage import default_storage
+
+from posts import thumbnails
+
+
+class BadRequest(Exception):
+    pass
+
+
+class Field:
+    """Поле ответа: колонки модели (через ``__`` — связанной) и функция
+    ``get(obj, request)``; по умолчанию — значение первой колонки."""
+
+    def __init__(self, *columns, get=None):
+        self.columns = columns
+        self.get = get or (lambda obj, request: getattr(obj, columns[0]))
+
+
+class Resource:
+    def __init__(self, fields, required=()):
+        self.fields = fields
+        self.required = required
+
+    def parse(self, query):
+        """Имена полей из ``?fields=``; без параметра — все поля."""
+        raw = query.get('fields')
+        if raw is None:
+            return list(self.fields)
+        names = [name.strip() for name in raw.split(',') if name.strip()]
+        unknown = [name for name in names if name not in self.fields]
+        if unknown:
+            raise BadRequest(f'Неизвестные поля: {", ".join(unknown)}')
+        if not names:
+            raise BadRequest('Не выбрано ни одного поля')
+        return list(dict.fromkeys(names))
+
+    def restrict(self, queryset, names):
+        columns = set(self.required)
+        related = set()
+        for name in names:
+            for column in self.fields[name].columns:
+                columns.add(column)
+                if '__' in column:
+                    relation = column.rsplit('__', 1)[0]
+                    related.add(relation)
+                    columns.add(relation)
+        if related:
+            queryset = queryset.select_related(*sorted(related))
+        return queryset.only(*sorted(columns))
+
+    def serialize(self, obj, names, request):
+        return {name: self.fields[name].get(obj, request) for name in names}
+
+
+def _isoformat(column):
+    return Field(
+        column, get=lambda obj, request: getattr(obj, column).isoformat())
+
+
+def _related(column):
+    relation, attribute = column.split('__')
+
+    def get(obj, request):
+        value = getattr(obj, relation, None)
+        return None if value is None else getattr(value, attribute)
+    return Field(column, get=get)
+
+
+def _count(column):
+    field = _related(column)
+    getter = field.get
+    field.get = lambda obj, request: getter(obj, request) or 0
+    return field
+
+
+def _image(post, request):
+    if not post.image:
+        return None
+    if not post.variants_ready:
+        thumbnails.schedule(post)
+    return {
+        'url': request.build_absolute_uri(post.image.url),
+        'thumbnails': [
+            {
+                'url': request.build_absolute_uri(
+                    default_storage.url(variant['name'])),
+                'width': variant['width'],
+                'type': variant['type'],
+            }
+            for variant in post.variants
+        ],
+    }
+
+
+POST = Resource(
+    {
+        'id': Field('id'),
+        'text': Field('text'),
+        'pub_date': _isoformat('pub_date'),
+        'author': _related('author__username'),
+        'group': _related('group__slug'),
+        'comment_count': Field('comment_count'),
+        'image': Field('image', 'image_variants', get=_image),
+    },
+    required=('pub_date',),
+)
+
+COMMENT = Resource(
+    {
+        'id': Field('id'),
+        'parent': Field(
+            'parent', get=lambda comment, request: comment.parent_id),
+        'depth': Field('depth'),
+        'author': _related('author__username'),
+        'text': Field('text'),
+        'created': _isoformat('created'),
+    },
+    required=('path',),
+)
+
+GROUP = Resource(
+    {
+        'id': Field('id'),
+        'slug': Field('slug'),
+        'title': Field('title'),
+        'description': Field('description'),
+    },
+    required=('slug',),
+)
+
+PROFILE = Resource({
+    'username': Field('username'),
+    'full_name': Field(
+        'first_name', 'last_name',
+        get=lambda user, request: user.get_full_name()),
+    'posts_count': _count('stats__posts_count'),
+    'comments_count': _count('stats__comments_count'),
+    'followers_count': _count('stats__followers_count'),
+    'following_count': _count('stats__following_count'),
+})
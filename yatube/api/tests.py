@@ -0,0 +1,364 @@
+import json
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from api import renderers
+from core.models import Job
+from posts import search, stats
+from posts.models import Comment, Follow, Group, Post, TimelineEntry, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(API_PAGE_SIZE=2, MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ApiTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', first_name='Лев', last_name='Толстой')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        cls.posts = [
+            Post.objects.create(
+                text=f'Пост {number}', author=cls.author, group=cls.group)
+            for number in range(3)
+        ]
+        cls.root = Comment.objects.create(
+            post=cls.posts[0], author=cls.reader, text='Комментарий')
+        Comment.objects.create(
+            post=cls.posts[0], author=cls.author, text='Ответ',
+            parent=cls.root)
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response['Content-Type'], renderers.CONTENT_TYPE)
+        return response
+
+    def walk(self, url, **params):
+        """Все элементы списка, пройденные по ссылкам ``next``."""
+        results = []
+        data = self.get(url, **params).json()
+        results.extend(data['results'])
+        while data['next']:
+            data = self.client.get(data['next']).json()
+            results.extend(data['results'])
+        return results
+
+    def test_lists_are_walked_by_cursor(self):
+        texts = ['Пост 2', 'Пост 1', 'Пост 0']
+        for url in (
+            reverse('api:posts'),
+            reverse('api:group_posts', args=[self.group.slug]),
+            reverse('api:profile_posts', args=[self.author.username]),
+        ):
+            with self.subTest(url=url):
+                results = self.walk(url, fields='text')
+                self.assertEqual(
+                    [post['text'] for post in results], texts)
+
+    def test_post_fields(self):
+        data = self.get(
+            reverse('api:post', args=[self.posts[0].pk])).json()
+        self.assertEqual(data['id'], self.posts[0].pk)
+        self.assertEqual(data['author'], 'author')
+        self.assertEqual(data['group'], 'group')
+        self.assertEqual(data['comment_count'], 2)
+        self.assertIsNone(data['image'])
+        self.assertEqual(
+            data['pub_date'], self.posts[0].pub_date.isoformat())
+
+    def test_sparse_fields_limit_columns(self):
+        with self.assertNumQueries(1):
+            response = self.get(reverse('api:posts'), fields='id,text')
+        self.assertEqual(
+            list(response.json()['results'][0]), ['id', 'text'])
+        cache.clear()
+        with self.assertNumQueries(1) as queries:
+            self.get(reverse('api:posts'), fields='id')
+        self.assertNotIn('"text"', queries.captured_queries[0]['sql'])
+        self.assertNotIn('auth_user', queries.captured_queries[0]['sql'])
+
+    def test_unknown_fields_are_rejected(self):
+        response = self.get(reverse('api:posts'), fields='id,password')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('password', response.json()['error'])
+
+    def test_image_has_thumbnail_urls(self):
+        post = Post.objects.create(
+            text='С картинкой', author=self.author,
+            image=SimpleUploadedFile('api.gif', SMALL_GIF, 'image/gif'))
+        image = self.get(reverse('api:post', args=[post.pk])).json()['image']
+        self.assertTrue(image['url'].startswith('http://testserver/'))
+        self.assertTrue(image['thumbnails'])
+        self.assertTrue(all(
+            thumbnail['url'].startswith('http://testserver/')
+            for thumbnail in image['thumbnails']))
+
+    def test_comments_come_in_thread_order(self):
+        results = self.walk(
+            reverse('api:post_comments', args=[self.posts[0].pk]))
+        self.assertEqual(
+            [(comment['text'], comment['parent']) for comment in results],
+            [('Комментарий', None), ('Ответ', self.root.pk)])
+
+    def test_groups_and_profile(self):
+        self.assertEqual(
+            self.walk(reverse('api:groups'), fields='slug'),
+            [{'slug': 'group'}])
+        data = self.get(
+            reverse('api:profile', args=[self.author.username])).json()
+        self.assertEqual(data['full_name'], 'Лев Толстой')
+        self.assertEqual(data['posts_count'], 3)
+        self.assertEqual(data['followers_count'], 1)
+
+    def test_signed_in_reads_fit_query_budgets(self):
+        self.client.force_login(self.reader)
+        urls = (
+            reverse('api:posts'),
+            reverse('api:post', args=[self.posts[0].pk]),
+            reverse('api:post_comments', args=[self.posts[0].pk]),
+            reverse('api:groups'),
+            reverse('api:group_posts', args=[self.group.slug]),
+            reverse('api:profile', args=[self.author.username]),
+            reverse('api:profile_posts', args=[self.author.username]),
+            reverse('api:follow'),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.get(url).status_code, 200)
+
+    def test_follow_feed_requires_login(self):
+        url = reverse('api:follow')
+        self.assertEqual(self.get(url).status_code, 401)
+        self.client.force_login(self.reader)
+        self.assertEqual(len(self.walk(url, fields='id')), 3)
+
+    def test_errors_are_json(self):
+        response = self.get(reverse('api:post', args=[0]))
+        self.assertEqual(response.status_code, 404)
+        response = self.client.post(reverse('api:posts'))
+        self.assertEqual(response.status_code, 405)
+
+    def test_new_post_invalidates_list(self):
+        url = reverse('api:posts')
+        self.get(url, fields='text')
+        Post.objects.create(text='Новый', author=self.author)
+        results = self.get(url, fields='text').json()['results']
+        self.assertEqual(results[0]['text'], 'Новый')
+
+    def test_cached_counts_follow_comments_and_follows(self):
+        posts_url = reverse('api:posts')
+        profile_url = reverse('api:profile', args=[self.reader.username])
+        self.get(posts_url, fields='comment_count')
+        self.get(profile_url)
+        Comment.objects.create(
+            post=self.posts[2], author=self.reader, text='Ещё')
+        Follow.objects.create(user=self.reader, author=self.reader)
+        results = self.get(posts_url, fields='comment_count').json()
+        self.assertEqual(results['results'][0]['comment_count'], 1)
+        data = self.get(profile_url).json()
+        self.assertEqual(data['comments_count'], 2)
+        self.assertEqual(data['following_count'], 2)
+
+
+class BatchWriteTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='importer')
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        cls.post = Post.objects.create(text='Пост', author=cls.author)
+        cls.comment = Comment.objects.create(
+            post=cls.post, author=cls.author, text='Комментарий')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def send(self, name, items):
+        response = self.client.post(
+            reverse(f'api:batch_{name}'), json.dumps(items),
+            content_type='application/json')
+        self.assertEqual(response['Content-Type'], renderers.CONTENT_TYPE)
+        return response
+
+    def statuses(self, response):
+        return [item['status'] for item in response.json()['results']]
+
+    def test_posts_are_created_with_side_effects(self):
+        response = self.send('posts', [
+            {'text': 'Первый', 'group': 'group'},
+            {'text': ''},
+            {'text': 'Второй', 'group': 'missing'},
+            {'text': 'Третий'},
+        ])
+        results = response.json()['results']
+        self.assertEqual(
+            self.statuses(response),
+            ['created', 'invalid', 'invalid', 'created'])
+        self.assertIn('text', results[1]['errors'])
+        self.assertIn('group', results[2]['errors'])
+        first = Post.objects.get(pk=results[0]['id'])
+        self.assertEqual(
+            (first.text, first.author, first.group),
+            ('Первый', self.user, self.group))
+        self.assertEqual(Post.objects.get(pk=results[3]['id']).text, 'Третий')
+        self.assertEqual(stats.for_user(self.user.pk).posts_count, 2)
+        self.assertEqual(
+            list(Post.objects.filter(
+                pk__in=search.matching_ids('Третий')).values_list(
+                'pk', flat=True)),
+            [results[3]['id']])
+        self.assertEqual(stats.reconcile(), 0)
+
+    @override_settings(JOBS_INLINE=False)
+    def test_queries_do_not_grow_with_batch(self):
+        counts = []
+        for size in (2, 20):
+            with CaptureQueriesContext(connection) as queries:
+                self.send(
+                    'posts', [{'text': f'Пост {n}', 'group': 'group'}
+                              for n in range(size)])
+            counts.append(len(queries))
+            # Второй прогрев тех же страниц не встал бы в очередь.
+            Job.objects.all().delete()
+        self.assertEqual(counts[0], counts[1])
+
+    def test_comments_and_replies(self):
+        response = self.send('comments', [
+            {'post': self.post.pk, 'text': 'Новый'},
+            {'post': self.post.pk, 'parent': self.comment.pk,
+             'text': 'Ответ'},
+            {'post': self.post.pk + 1, 'text': 'Мимо'},
+            {'post': self.post.pk, 'parent': self.comment.pk + 100,
+             'text': 'Мимо'},
+        ])
+        results = response.json()['results']
+        self.assertEqual(
+            self.statuses(response),
+            ['created', 'created', 'invalid', 'invalid'])
+        reply = Comment.objects.get(pk=results[1]['id'])
+        self.assertEqual(reply.depth, 1)
+        self.assertTrue(reply.path.startswith(self.comment.path + '.'))
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 3)
+        self.assertEqual(stats.reconcile(), 0)
+
+    def test_batches_invalidate_cached_counts(self):
+        posts_url = reverse('api:posts')
+        profile_url = reverse('api:profile', args=[self.user.username])
+        guest = Client()
+        guest.get(posts_url)
+        guest.get(profile_url)
+        self.send('comments', [{'post': self.post.pk, 'text': 'Новый'}])
+        self.send('follows', [{'author': 'author'}])
+        self.assertEqual(
+            guest.get(posts_url).json()['results'][0]['comment_count'], 2)
+        data = guest.get(profile_url).json()
+        self.assertEqual(data['comments_count'], 1)
+        self.assertEqual(data['following_count'], 1)
+
+    @override_settings(COMMENT_MAX_REPLIES=2)
+    def test_reply_limit_counts_the_batch(self):
+        response = self.send('comments', [
+            {'post': self.post.pk, 'parent': self.comment.pk, 'text': str(n)}
+            for n in range(3)
+        ])
+        self.assertEqual(
+            self.statuses(response), ['created', 'created', 'invalid'])
+
+    def test_follows(self):
+        Follow.objects.create(user=self.user, author=self.author)
+        other = User.objects.create_user(username='other')
+        Post.objects.create(text='Пост другого', author=other)
+        response = self.send('follows', [
+            {'author': 'other'}, {'author': 'author'}, {'author': 'other'},
+            {'author': 'importer'}, {'author': 'nobody'},
+        ])
+        self.assertEqual(
+            self.statuses(response),
+            ['created', 'exists', 'exists', 'invalid', 'invalid'])
+        self.assertEqual(
+            response.json()['results'][0]['id'],
+            Follow.objects.get(user=self.user, author=other).pk)
+        self.assertEqual(stats.for_user(other.pk).followers_count, 1)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.user, post__author=other).exists())
+        self.assertEqual(stats.reconcile(), 0)
+
+    def test_follows_written_meanwhile_are_not_counted(self):
+        other = User.objects.create_user(username='other')
+
+        def validate(items, user):
+            Follow.objects.create(user=user, author=self.author)
+            return {
+                0: Follow(user=user, author=self.author),
+                1: Follow(user=user, author=other),
+            }, {}, set()
+
+        with mock.patch('api.batch.validate_follows', validate):
+            response = self.send('follows', [{}, {}])
+        self.assertEqual(self.statuses(response), ['exists', 'created'])
+        self.assertEqual(stats.for_user(self.author.pk).followers_count, 1)
+        self.assertEqual(stats.for_user(self.user.pk).following_count, 2)
+        self.assertEqual(stats.reconcile(), 0)
+
+    def test_values_of_wrong_type_are_item_errors(self):
+        cases = (
+            ('posts', {'text': 'Пост', 'group': ['group']}, 'group'),
+            ('posts', {'text': 'Пост', 'group': 1}, 'group'),
+            ('comments', {'post': [self.post.pk], 'text': 'Нет'}, 'post'),
+            ('comments', {'post': True, 'text': 'Нет'}, 'post'),
+            ('comments', {'post': self.post.pk, 'parent': [self.comment.pk],
+                          'text': 'Нет'}, 'parent'),
+            ('comments', {'post': self.post.pk, 'parent': {},
+                          'text': 'Нет'}, 'parent'),
+            ('follows', {'author': ['author']}, 'author'),
+            ('follows', {'author': 1}, 'author'),
+        )
+        for name, item, field in cases:
+            with self.subTest(item=item):
+                response = self.send(name, [item])
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(self.statuses(response), ['invalid'])
+                self.assertIn(
+                    field, response.json()['results'][0]['errors'])
+
+    def test_bad_requests(self):
+        self.assertEqual(self.send('posts', {'text': 'x'}).status_code, 400)
+        self.assertEqual(self.send('posts', ['x']).status_code, 400)
+        with self.settings(API_BATCH_SIZE=1):
+            self.assertEqual(
+                self.send('posts', [{}, {}]).status_code, 400)
+        self.client.logout()
+        self.assertEqual(self.send('posts', []).status_code, 401)
+        self.assertEqual(
+            self.client.get(reverse('api:batch_posts')).status_code, 405)
@@ -0,0 +1,199 @@
+"""JSON API v1.
+
+Списки листаются курсорами ``KeysetPaginator`` (``next`` и ``previous`` —
+готовые ссылки), поля выбираются параметром ``?fields=`` (см.
+``api.resources``). Ответы кешируются в тех же пространствах имён, что и
+HTML-страницы, поэтому сбрасываются вместе с ними. Бюджеты запросов, как и
+у HTML-страниц, включают сессию и пользователя вошедшего читателя.
+
+Пакетная запись (``batch/...``) принимает JSON-массив, проверяет его
+целиком (``api.batch``) и пишет правильные элементы одной транзакцией
+(``posts.bulk``). В ответе на каждый элемент — ``created`` с ``id``,
+``exists`` для уже существующей подписки или ``invalid`` с ``errors``.
+"""
+from functools import partial, wraps
+
+from django.conf import settings
+from django.db import transaction
+from django.http import Http404
+from django.shortcuts import get_object_or_404
+
+from core.cache import cache_page_versioned
+from core.db_router import pin_to_primary, read_from_replica
+from core.paginator import KeysetPaginator
+from core.queries import query_budget
+from posts import bulk, timeline
+from posts.models import Comment, Group, Post, User
+
+from . import batch, renderers, resources
+
+POST_ORDERING = ('-pub_date', '-pk')
+
+
+def api_view(*methods):
+    """Разрешает методы ``methods`` (по умолчанию GET и HEAD); ошибки — в
+    JSON, а не страницами сайта."""
+    methods = methods or ('GET', 'HEAD')
+
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                return renderers.error(405, 'Метод не поддерживается')
+            try:
+                return view_func(request, *args, **kwargs)
+            except Http404:
+                return renderers.error(404, 'Не найдено')
+            except resources.BadRequest as exc:
+                return renderers.error(400, str(exc))
+        return wrapper
+    return decorator
+
+
+def _link(request, direction, cursor):
+    if not cursor:
+        return None
+    query = request.GET.copy()
+    for name in ('after', 'before', 'page'):
+        query.pop(name, None)
+    query[direction] = cursor
+    return request.build_absolute_uri(f'{request.path}?{query.urlencode()}')
+
+
+def page(request, queryset, resource, ordering=POST_ORDERING,
+         paginator_class=KeysetPaginator):
+    names = resource.parse(request.GET)
+    paginator = paginator_class(
+        resource.restrict(queryset, names), settings.API_PAGE_SIZE, ordering)
+    page_obj = paginator.page_from_request(request.GET)
+    return renderers.json_response({
+        'results': [
+            resource.serialize(obj, names, request) for obj in page_obj],
+        'next': _link(request, 'after', page_obj.next_cursor),
+        'previous': _link(request, 'before', page_obj.previous_cursor),
+    })
+
+
+def detail(request, queryset, resource, **lookup):
+    names = resource.parse(request.GET)
+    obj = get_object_or_404(resource.restrict(queryset, names), **lookup)
+    return renderers.json_response(resource.serialize(obj, names, request))
+
+
+@api_view()
+@query_budget(3)
+@cache_page_versioned(settings.POSTS_CACHE_TIMEOUT, 'index', 'groups')
+@read_from_replica
+def posts(request):
+    return page(request, Post.objects.all(), resources.POST)
+
+
+@api_view()
+@query_budget(3)
+@cache_page_versioned(
+    settings.POSTS_CACHE_TIMEOUT, 'post:{post_id}', 'groups')
+@read_from_replica
+def post(request, post_id):
+    return detail(request, Post.objects.all(), resources.POST, pk=post_id)
+
+
+@api_view()
+@query_budget(4)
+@cache_page_versioned(settings.POSTS_CACHE_TIMEOUT, 'post:{post_id}')
+@read_from_replica
+def post_comments(request, post_id):
+    if not Post.objects.filter(pk=post_id).exists():
+        raise Http404
+    return page(
+        request, Comment.objects.filter(post_id=post_id), resources.COMMENT,
+        ordering=('path',))
+
+
+@api_view()
+@query_budget(3)
+@cache_page_versioned(settings.POSTS_CACHE_TIMEOUT, 'groups')
+@read_from_replica
+def groups(request):
+    return page(request, Group.objects.all(), resources.GROUP, ('slug',))
+
+
+@api_view()
+@query_budget(4)
+@cache_page_versioned(
+    settings.POSTS_CACHE_TIMEOUT, 'group:{slug}', 'groups')
+@read_from_replica
+def group_posts(request, slug):
+    group = get_object_or_404(Group.objects.only('pk'), slug=slug)
+    return page(request, Post.objects.filter(group=group), resources.POST)
+
+
+@api_view()
+@query_budget(3)
+@cache_page_versioned(settings.POSTS_CACHE_TIMEOUT, 'profile:{username}')
+@read_from_replica
+def profile(request, username):
+    return detail(
+        request, User.objects.all(), resources.PROFILE, username=username)
+
+
+@api_view()
+@query_budget(4)
+@cache_page_versioned(
+    settings.POSTS_CACHE_TIMEOUT, 'profile:{username}', 'groups')
+@read_from_replica
+def profile_posts(request, username):
+    author = get_object_or_404(User.objects.only('pk'), username=username)
+    return page(request, Post.objects.filter(author=author), resources.POST)
+
+
+@api_view()
+@query_budget(6)
+@read_from_replica
+def follow(request):
+    if not request.user.is_authenticated:
+        return renderers.error(401, 'Нужно войти')
+    return page(
+        request, Post.objects.all(), resources.POST, timeline.FEED_ORDERING,
+        partial(timeline.FeedPaginator, user=request.user))
+
+
+def write_batch(request, validate, create):
+    """Общая часть пакетных представлений: ``validate(items, user)`` даёт
+    объекты и ошибки, ``create(objects)`` пишет объекты. Объект, который
+    база отбросила как повтор, остаётся без ключа и считается
+    существующим."""
+    if not request.user.is_authenticated:
+        return renderers.error(401, 'Нужно войти')
+    items = batch.parse(request)
+    valid, errors, existing = validate(items, request.user)
+    if valid:
+        with transaction.atomic():
+            create(list(valid.values()))
+    results = []
+    for index in range(len(items)):
+        if index in valid and valid[index].pk is not None:
+            results.append({'status': 'created', 'id': valid[index].pk})
+        elif index in valid or index in existing:
+            results.append({'status': 'exists'})
+        else:
+            results.append({'status': 'invalid', 'errors': errors[index]})
+    return renderers.json_response({'results': results})
+
+
+@api_view('POST')
+@pin_to_primary
+def batch_posts(request):
+    return write_batch(request, batch.validate_posts, bulk.create_posts)
+
+
+@api_view('POST')
+@pin_to_primary
+def batch_comments(request):
+    return write_batch(
+        request, batch.validate_comments, bulk.create_comments)
+
+
+@api_view('POST')
+@pin_to_primary
+def batch_follows(request):
+    return write_batch(request, batch.validate_follows, bulk.create_follows)
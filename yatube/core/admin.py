@@ -0,0 +1,52 @@
+from django.contrib import admin
+from django.utils import timezone
+
+from .models import Job, SlowQuery
+
+
+class SlowQueryAdmin(admin.ModelAdmin):
+    list_display = (
+        'statement_short', 'calls', 'total_time', 'average_time', 'max_time',
+        'view', 'template', 'last_seen',
+    )
+    list_filter = ('view',)
+    search_fields = ('statement', 'view', 'template')
+    readonly_fields = (
+        'fingerprint', 'statement', 'example', 'params', 'view', 'template',
+        'source', 'plan', 'calls', 'total_time', 'max_time', 'first_seen',
+        'last_seen',
+    )
+
+    def statement_short(self, obj):
+        return obj.statement[:120]
+    statement_short.short_description = 'Запрос'
+
+    def average_time(self, obj):
+        return round(obj.total_time / obj.calls, 4) if obj.calls else 0
+    average_time.short_description = 'Среднее время, с'
+
+    def has_add_permission(self, request):
+        return False
+
+
+admin.site.register(SlowQuery, SlowQueryAdmin)
+
+
+class JobAdmin(admin.ModelAdmin):
+    list_display = (
+        'name', 'status', 'priority', 'attempts', 'run_at', 'locked_until',
+        'locked_by', 'created',
+    )
+    list_filter = ('status', 'name')
+    search_fields = ('name', 'key', 'kwargs')
+    readonly_fields = ('created',)
+    actions = ('retry',)
+
+    def retry(self, request, queryset):
+        queryset.update(
+            status=Job.QUEUED, attempts=0, run_at=timezone.now(),
+            locked_until=None, locked_by='')
+    retry.short_description = 'Повторить выбранные задачи'
+
+
+admin.site.register(Job, JobAdmin)
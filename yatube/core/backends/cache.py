@@ -0,0 +1,354 @@
+"""Кеш, общий для всех процессов сервера.
+
+``LocMemCache`` у каждого воркера свой: промахи растут с числом воркеров,
+а сброс версии пространства имён виден только в одном процессе. Здесь два
+общих бэкенда с одинаковой сериализацией:
+
+* ``RedisCache`` — сервер с протоколом Redis (нужен пакет ``redis``);
+  ``get_many`` — один ``MGET``, ``set_many`` — один конвейер.
+* ``SQLiteCache`` — один файл SQLite в режиме WAL с ``mmap``: замена
+  сервера для разработки, тестов и одной машины. ``get_many`` — один
+  ``SELECT``, ``set_many`` — одна транзакция.
+
+Целые числа хранятся как текст, чтобы ``incr`` был атомарным на стороне
+хранилища; остальное — pickle, сжатый zlib, если он длиннее
+``COMPRESS_MIN_LENGTH`` байт. ``get_or_set`` защищает от «давки»: при
+промахе значение вычисляет тот, кто взял блокировку, остальные ждут его
+результат не дольше ``LOCK_TIMEOUT`` секунд.
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import zlib
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.exceptions import ImproperlyConfigured
+
+PICKLED = b'p'
+COMPRESSED = b'z'
+LOCK_POLL_INTERVAL = 0.05
+# Сколько записей между проверками переполнения SQLiteCache.
+CULL_CHECK_INTERVAL = 100
+# Меньше SQLITE_MAX_VARIABLE_NUMBER старых сборок SQLite.
+SQL_CHUNK_SIZE = 900
+
+
+class SharedCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._compress_min_length = int(
+            options.get('COMPRESS_MIN_LENGTH', 1024))
+        self._compress_level = int(options.get('COMPRESS_LEVEL', 6))
+        self._lock_timeout = float(options.get('LOCK_TIMEOUT', 10))
+
+    def _ttl(self, timeout):
+        """Время жизни в секундах; ``None`` — без срока."""
+        if timeout == DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        return timeout
+
+    def dumps(self, value):
+        if type(value) is int:
+            return str(value).encode()
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        if len(data) >= self._compress_min_length:
+            return COMPRESSED + zlib.compress(data, self._compress_level)
+        return PICKLED + data
+
+    def loads(self, data):
+        data = bytes(data)
+        kind = data[:1]
+        if kind == COMPRESSED:
+            return pickle.loads(zlib.decompress(data[1:]))
+        if kind == PICKLED:
+            return pickle.loads(data[1:])
+        return int(data)
+
+    def get_or_set(self, key, default, timeout=DEFAULT_TIMEOUT, version=None):
+        value = self.get(key, version=version)
+        if value is not None:
+            return value
+        lock = f'{key}:lock'
+        if self.add(lock, 1, self._lock_timeout, version=version):
+            try:
+                return super().get_or_set(key, default, timeout, version)
+            finally:
+                self.delete(lock, version=version)
+        deadline = time.monotonic() + self._lock_timeout
+        while time.monotonic() < deadline:
+            time.sleep(LOCK_POLL_INTERVAL)
+            value = self.get(key, version=version)
+            if value is not None:
+                return value
+            if not self.has_key(lock, version=version):
+                break
+        return super().get_or_set(key, default, timeout, version)
+
+
+class SQLiteCache(SharedCache):
+    def __init__(self, location, params):
+        super().__init__(location, params)
+        options = params.get('OPTIONS', {})
+        self._path = location
+        self._mmap_size = int(options.get('MMAP_SIZE', 64 * 1024 * 1024))
+        self._local = threading.local()
+
+    @property
+    def _connection(self):
+        # Соединение нельзя переносить через fork: проверяем pid.
+        pid, conn = getattr(self._local, 'connection', (None, None))
+        if pid == os.getpid():
+            return conn
+        directory = os.path.dirname(self._path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self._path, timeout=5, isolation_level=None)
+        conn.execute('PRAGMA journal_mode = wal')
+        conn.execute('PRAGMA synchronous = normal')
+        conn.execute(f'PRAGMA mmap_size = {self._mmap_size}')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS cache ('
+            'key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL'
+            ') WITHOUT ROWID'
+        )
+        conn.execute(
+            'CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)')
+        self._local.connection = (os.getpid(), conn)
+        self._local.writes = 0
+        return conn
+
+    def _expires(self, timeout):
+        ttl = self._ttl(timeout)
+        return None if ttl is None else time.time() + ttl
+
+    def _select(self, keys):
+        conn = self._connection
+        now = time.time()
+        found = {}
+        for start in range(0, len(keys), SQL_CHUNK_SIZE):
+            chunk = keys[start:start + SQL_CHUNK_SIZE]
+            rows = conn.execute(
+                'SELECT key, value FROM cache WHERE key IN (%s) '
+                'AND (expires IS NULL OR expires > ?)'
+                % ', '.join('?' * len(chunk)),
+                [*chunk, now],
+            )
+            found.update(rows)
+        return found
+
+    def _written(self, count=1):
+        self._local.writes += count
+        if self._local.writes >= CULL_CHECK_INTERVAL:
+            self._local.writes = 0
+            self._cull()
+
+    def _cull(self):
+        conn = self._connection
+        conn.execute('DELETE FROM cache WHERE expires <= ?', [time.time()])
+        (count,) = conn.execute('SELECT COUNT(*) FROM cache').fetchone()
+        if count > self._max_entries:
+            conn.execute(
+                'DELETE FROM cache WHERE key IN ('
+                'SELECT key FROM cache ORDER BY expires IS NULL, expires '
+                'LIMIT ?)',
+                [count // self._cull_frequency],
+            )
+
+    def get(self, key, default=None, version=None):
+        key = self.make_key(key, version)
+        self.validate_key(key)
+        found = self._select([key])
+        return self.loads(found[key]) if key in found else default
+
+    def get_many(self, keys, version=None):
+        names = {}
+        for key in keys:
+            name = self.make_key(key, version)
+            self.validate_key(name)
+            names[name] = key
+        found = self._select(list(names))
+        return {names[name]: self.loads(value)
+                for name, value in found.items()}
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout, version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        rows = []
+        for key, value in data.items():
+            key = self.make_key(key, version)
+            self.validate_key(key)
+            rows.append((key, self.dumps(value), self._expires(timeout)))
+        conn = self._connection
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.executemany(
+                'INSERT OR REPLACE INTO cache (key, value, expires) '
+                'VALUES (?, ?, ?)', rows)
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+        self._written(len(rows))
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version)
+        self.validate_key(key)
+        cursor = self._connection.execute(
+            'INSERT INTO cache (key, value, expires) VALUES (?, ?, ?) '
+            'ON CONFLICT (key) DO UPDATE SET '
+            'value = excluded.value, expires = excluded.expires '
+            'WHERE cache.expires <= ?',
+            [key, self.dumps(value), self._expires(timeout), time.time()],
+        )
+        if cursor.rowcount:
+            self._written()
+        return bool(cursor.rowcount)
+
+    def incr(self, key, delta=1, version=None):
+        name = self.make_key(key, version)
+        self.validate_key(name)
+        conn = self._connection
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            found = self._select([name])
+            if name not in found:
+                raise ValueError(f"Key '{key}' not found")
+            value = self.loads(found[name]) + delta
+            conn.execute(
+                'UPDATE cache SET value = ? WHERE key = ?',
+                [self.dumps(value), name])
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+        return value
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version)
+        self.validate_key(key)
+        cursor = self._connection.execute(
+            'UPDATE cache SET expires = ? WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            [self._expires(timeout), key, time.time()],
+        )
+        return bool(cursor.rowcount)
+
+    def has_key(self, key, version=None):
+        key = self.make_key(key, version)
+        self.validate_key(key)
+        return key in self._select([key])
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version)
+
+    def delete_many(self, keys, version=None):
+        names = [self.make_key(key, version) for key in keys]
+        for name in names:
+            self.validate_key(name)
+        conn = self._connection
+        for start in range(0, len(names), SQL_CHUNK_SIZE):
+            chunk = names[start:start + SQL_CHUNK_SIZE]
+            conn.execute(
+                'DELETE FROM cache WHERE key IN (%s)'
+                % ', '.join('?' * len(chunk)), chunk)
+
+    def clear(self):
+        self._connection.execute('DELETE FROM cache')
+
+
+class RedisCache(SharedCache):
+    # Атомарный incr, который, как в Django, не создаёт отсутствующий ключ.
+    INCR_SCRIPT = (
+        "if redis.call('exists', KEYS[1]) == 1 then "
+        "return redis.call('incrby', KEYS[1], ARGV[1]) end "
+        "return false"
+    )
+
+    def __init__(self, location, params):
+        super().__init__(location, params)
+        try:
+            import redis
+        except ImportError:
+            raise ImproperlyConfigured(
+                'Для RedisCache установите пакет redis')
+        options = params.get('OPTIONS', {})
+        self._client = redis.Redis.from_url(
+            location,
+            socket_timeout=options.get('SOCKET_TIMEOUT', 1),
+            socket_connect_timeout=options.get('SOCKET_CONNECT_TIMEOUT', 1),
+        )
+        self._incr = self._client.register_script(self.INCR_SCRIPT)
+
+    def _key(self, key, version):
+        key = self.make_key(key, version)
+        self.validate_key(key)
+        return key
+
+    def _set_args(self, timeout):
+        ttl = self._ttl(timeout)
+        if ttl is None:
+            return {}
+        return {'px': max(int(ttl * 1000), 1)}
+
+    def get(self, key, default=None, version=None):
+        value = self._client.get(self._key(key, version))
+        return default if value is None else self.loads(value)
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        if not keys:
+            return {}
+        values = self._client.mget([self._key(key, version) for key in keys])
+        return {key: self.loads(value)
+                for key, value in zip(keys, values) if value is not None}
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._client.set(
+            self._key(key, version), self.dumps(value),
+            **self._set_args(timeout))
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        pipeline = self._client.pipeline(transaction=False)
+        args = self._set_args(timeout)
+        for key, value in data.items():
+            pipeline.set(self._key(key, version), self.dumps(value), **args)
+        pipeline.execute()
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return bool(self._client.set(
+            self._key(key, version), self.dumps(value), nx=True,
+            **self._set_args(timeout)))
+
+    def incr(self, key, delta=1, version=None):
+        value = self._incr(keys=[self._key(key, version)], args=[delta])
+        if value is None:
+            raise ValueError(f"Key '{key}' not found")
+        return value
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        ttl = self._ttl(timeout)
+        if ttl is None:
+            return bool(self._client.persist(key)
+                        or self._client.exists(key))
+        return bool(self._client.pexpire(key, max(int(ttl * 1000), 1)))
+
+    def has_key(self, key, version=None):
+        return bool(self._client.exists(self._key(key, version)))
+
+    def delete(self, key, version=None):
+        self._client.delete(self._key(key, version))
+
+    def delete_many(self, keys, version=None):
+        keys = [self._key(key, version) for key in keys]
+        if keys:
+            self._client.delete(*keys)
+
+    def clear(self):
+        self._client.flushdb()
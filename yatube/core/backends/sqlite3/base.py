@@ -0,0 +1,49 @@
+"""SQLite с настройками для работы под нагрузкой.
+
+Каждое новое соединение получает ``PRAGMA`` из ``SQLITE_PRAGMAS``: журнал
+WAL (читатели не ждут писателя), ``synchronous=NORMAL`` (fsync только при
+контрольной точке), ``mmap_size``, ``cache_size``, ``temp_store`` и
+``busy_timeout``, чтобы конкурирующая запись ждала блокировку, а не падала
+с «database is locked». Команды выполняются на сыром соединении, до
+обёрток ``execute_wrapper``, и не попадают ни в бюджет запросов, ни в
+метрики; с ``CONN_MAX_AGE`` они выполняются раз на соединение, а не на
+запрос.
+
+При ``SQLITE_IMMEDIATE_TRANSACTIONS`` транзакции начинаются с
+``BEGIN IMMEDIATE``: блокировка записи берётся сразу и ждёт
+``busy_timeout``. Отложенная транзакция, которая сначала читает, а потом
+пишет, при занятой базе получает ошибку без ожидания.
+"""
+import re
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+NAME_RE = re.compile(r'^[a-z_]+$')
+VALUE_RE = re.compile(r'^-?\w+$')
+
+
+def pragma_statements(pragmas):
+    statements = []
+    for name, value in pragmas.items():
+        value = str(value)
+        if not NAME_RE.match(name) or not VALUE_RE.match(value):
+            raise ImproperlyConfigured(
+                f'Недопустимая настройка SQLITE_PRAGMAS: {name}={value}')
+        statements.append(f'PRAGMA {name} = {value}')
+    return statements
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for statement in pragma_statements(settings.SQLITE_PRAGMAS):
+            conn.execute(statement).fetchall()
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        if settings.SQLITE_IMMEDIATE_TRANSACTIONS:
+            self.cursor().execute('BEGIN IMMEDIATE')
+        else:
+            super()._start_transaction_under_autocommit()
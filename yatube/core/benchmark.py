@@ -0,0 +1,109 @@
+"""Нагрузочный прогон представлений через тестовый клиент Django.
+
+Сценарий — это метод и функция, которая по генератору случайных чисел
+выдаёт путь и данные запроса. Несколько потоков-клиентов выполняют запросы
+сценария параллельно; для каждого запроса замеряются время и число
+SQL-запросов. Итоги можно сохранить как базовую линию и сравнивать с ней
+следующие прогоны.
+"""
+import json
+import random
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connections
+
+from .queries import QueryCounter, execute_wrapper_all
+
+Scenario = namedtuple('Scenario', 'name method make_request')
+
+
+def percentile(values, fraction):
+    """Перцентиль отсортированного списка методом ближайшего ранга."""
+    if not values:
+        return 0.0
+    index = max(0, min(len(values) - 1, round(fraction * len(values)) - 1))
+    return values[index]
+
+
+def _worker(scenario, requests, client_factory, worker_seed):
+    rng = random.Random(worker_seed)
+    client = client_factory()
+    samples = []
+    try:
+        for _ in range(requests):
+            path, data = scenario.make_request(rng)
+            counter = QueryCounter()
+            started = time.perf_counter()
+            try:
+                with execute_wrapper_all(counter):
+                    response = getattr(client, scenario.method)(path, data)
+                failed = response.status_code >= 400
+            except Exception:
+                failed = True
+            samples.append((time.perf_counter() - started, len(counter),
+                            failed))
+    finally:
+        connections.close_all()
+    return samples
+
+
+def run(scenario, clients, requests, client_factory, random_seed=None):
+    """Прогоняет сценарий; ``requests`` — число запросов на клиента."""
+    rng = random.Random(random_seed)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        futures = [
+            executor.submit(_worker, scenario, requests, client_factory,
+                            rng.random())
+            for _ in range(clients)
+        ]
+        samples = [sample for future in futures for sample in future.result()]
+    elapsed = time.perf_counter() - started
+    latencies = sorted(latency for latency, _, _ in samples)
+    total = len(samples)
+    return {
+        'requests': total,
+        'errors': sum(failed for _, _, failed in samples),
+        'p50': percentile(latencies, 0.50) * 1000,
+        'p95': percentile(latencies, 0.95) * 1000,
+        'p99': percentile(latencies, 0.99) * 1000,
+        'rps': total / elapsed if elapsed else 0.0,
+        'queries': (
+            sum(queries for _, queries, _ in samples) / total
+            if total else 0.0),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Регрессии относительно базовой линии в виде читаемых строк.
+
+    Задержки и число запросов не должны вырасти, а RPS — упасть больше чем
+    на ``tolerance`` (доля).
+    """
+    regressions = []
+    for name, current in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        for metric in ('p50', 'p95', 'p99', 'queries'):
+            if current[metric] > base[metric] * (1 + tolerance):
+                regressions.append(
+                    f'{name}: {metric} {current[metric]:.2f} '
+                    f'> {base[metric]:.2f}')
+        if current['rps'] < base['rps'] * (1 - tolerance):
+            regressions.append(
+                f'{name}: rps {current["rps"]:.1f} < {base["rps"]:.1f}')
+    return regressions
+
+
+def load_baseline(path):
+    with open(path, encoding='utf-8') as baseline:
+        return json.load(baseline)
+
+
+def save_baseline(path, results):
+    with open(path, 'w', encoding='utf-8') as baseline:
+        json.dump(results, baseline, ensure_ascii=False, indent=2,
+                  sort_keys=True)
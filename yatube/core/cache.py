@@ -0,0 +1,290 @@
+"""Версионированные пространства имён кеша.
+
+Вместо короткого TTL страницы кешируются надолго, а в ключ входит версия
+каждого пространства имён, от которого зависит страница. Изменение данных
+увеличивает версию, и старые записи просто перестают запрашиваться.
+"""
+import hashlib
+import math
+import random
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.middleware.csrf import get_token
+from django.utils.cache import (
+    get_cache_key, get_max_age, has_vary_header, learn_cache_key,
+    patch_cache_control, patch_vary_headers)
+from django.views.decorators.http import condition
+
+from . import metrics, purge
+from .db_router import use_primary
+
+LOCK_POLL_INTERVAL = 0.01
+
+
+def _version_key(namespace):
+    return 'version:' + hashlib.md5(namespace.encode()).hexdigest()
+
+
+def _bumped_key(namespace):
+    return 'bumped:' + hashlib.md5(namespace.encode()).hexdigest()
+
+
+def get_versions(namespaces):
+    keys = {_version_key(namespace): namespace for namespace in namespaces}
+    found = cache.get_many(keys)
+    versions = {}
+    for key, namespace in keys.items():
+        if key not in found:
+            cache.add(key, int(time.time() * 1000), None)
+            found[key] = cache.get(key)
+        versions[namespace] = found[key]
+    return versions
+
+
+def bump(*namespaces):
+    for namespace in set(namespaces):
+        try:
+            cache.incr(_version_key(namespace))
+        except ValueError:
+            cache.add(_version_key(namespace), int(time.time() * 1000), None)
+    if settings.DATABASE_REPLICAS:
+        cache.set_many(
+            {_bumped_key(namespace): 1 for namespace in namespaces},
+            settings.REPLICA_STICKINESS)
+    purge.purge(namespaces)
+
+
+def recently_bumped(namespaces):
+    """Менялось ли что-то из ``namespaces`` за ``REPLICA_STICKINESS``."""
+    return bool(cache.get_many(
+        [_bumped_key(namespace) for namespace in namespaces]))
+
+
+def _key_prefix(namespaces):
+    versions = get_versions(namespaces)
+    return hashlib.md5(repr(sorted(versions.items())).encode()).hexdigest()
+
+
+def etag(request, namespaces):
+    """ETag страницы: версии ``namespaces`` и пользователь, которому она
+    отрисована. Считается без запросов к базе.
+
+    У вошедших в ETag входит и CSRF-cookie: вход заново меняет cookie, и
+    страница с формой, сохранённая в браузере, не должна отдавать старый
+    токен.
+    """
+    user = getattr(request, 'user', None)
+    tag = f'{_key_prefix(namespaces)}-{getattr(user, "pk", None) or 0}'
+    if getattr(user, 'is_authenticated', False):
+        get_token(request)
+        secret = request.META['CSRF_COOKIE']
+        tag += '-' + hashlib.md5(secret.encode()).hexdigest()[:12]
+    return tag
+
+
+def _format(namespaces, kwargs):
+    return [namespace.format(**kwargs) for namespace in namespaces]
+
+
+def versioned_etag(*namespaces):
+    """``etag_func`` для ``condition``; ``namespaces`` как в
+    ``cache_page_versioned``."""
+    def etag_func(request, *args, **kwargs):
+        return etag(request, _format(namespaces, kwargs))
+    return etag_func
+
+
+def signed_in(request):
+    return getattr(getattr(request, 'user', None), 'is_authenticated', False)
+
+
+def mark_rendered_for(request, response):
+    """Запоминает в ответе, отрисован ли он для гостя; отметка сохраняется
+    вместе с ответом в кеше страниц."""
+    if not hasattr(response, 'rendered_for_guest'):
+        response.rendered_for_guest = not signed_in(request)
+    return response
+
+
+def patch_proxy_headers(request, response, namespaces):
+    """Ответ, отрисованный для гостя и отдаваемый гостю, разрешает
+    кешировать прокси на ``PROXY_CACHE_MAX_AGE`` секунд и помечается
+    суррогатными ключами ``namespaces``; браузер каждый раз сверяет ETag.
+    Ответы вошедшим, с cookie, без известных ``namespaces`` или без отметки
+    ``mark_rendered_for`` — только для браузера.
+    """
+    if (request.method not in ('GET', 'HEAD')
+            or response.status_code not in (200, 304)):
+        return
+    if (namespaces is None or response.cookies or signed_in(request)
+            or not getattr(response, 'rendered_for_guest', False)):
+        patch_cache_control(response, private=True, max_age=0)
+        return
+    patch_cache_control(
+        response, public=True, max_age=0,
+        s_maxage=settings.PROXY_CACHE_MAX_AGE)
+    patch_vary_headers(response, ('Cookie',))
+    response['Surrogate-Key'] = ' '.join(sorted(
+        {purge.surrogate_key(namespace) for namespace in namespaces}))
+
+
+def proxy_cacheable(namespaces_func):
+    """Заголовки ``patch_proxy_headers`` с пространствами имён, которые
+    ``namespaces_func`` возвращает по аргументам представления."""
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            response = mark_rendered_for(
+                request, view_func(request, *args, **kwargs))
+            patch_proxy_headers(
+                request, response, namespaces_func(request, *args, **kwargs))
+            return response
+        return wrapper
+    return decorator
+
+
+def _lock_key(key):
+    return 'page-lock:' + hashlib.md5(key.encode()).hexdigest()
+
+
+def _fetch(request, key_prefix):
+    """Ключ и запись кеша для запроса, как в ``FetchFromCacheMiddleware``."""
+    methods = ('GET', 'HEAD') if request.method == 'HEAD' else ('GET',)
+    key = None
+    for method in methods:
+        key = get_cache_key(request, key_prefix, method, cache=cache)
+        entry = cache.get(key) if key else None
+        if entry is not None:
+            return key, entry
+    return key, None
+
+
+def _store(request, response, timeout, key_prefix, started):
+    """Кладёт ответ в кеш по правилам ``UpdateCacheMiddleware``.
+
+    Запись живёт ещё ``PAGE_CACHE_STALE_TIMEOUT`` секунд после того, как
+    перестала быть свежей, и хранит время своей отрисовки. Ответы
+    вошедшим не кешируются: ``Cache-Control: private`` им ставит
+    ``proxy_cacheable`` уже после ``_store``, поэтому решает запрос.
+    """
+    if (signed_in(request) or response.streaming
+            or response.status_code != 200 or get_max_age(response) == 0):
+        return
+    if (not request.COOKIES and response.cookies
+            and has_vary_header(response, 'Cookie')):
+        return
+    lifetime = timeout + settings.PAGE_CACHE_STALE_TIMEOUT
+    key = learn_cache_key(request, response, lifetime, key_prefix, cache=cache)
+
+    def save(response):
+        now = time.time()
+        cache.set(
+            key, (now + timeout, time.perf_counter() - started, response),
+            lifetime)
+
+    if hasattr(response, 'render') and callable(response.render):
+        response.add_post_render_callback(save)
+    else:
+        save(response)
+
+
+def _wait(request, key_prefix, lock):
+    """Ответ, отрисованный держателем ``lock``, или ``None``."""
+    deadline = time.monotonic() + settings.PAGE_CACHE_LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(LOCK_POLL_INTERVAL)
+        key, entry = _fetch(request, key_prefix)
+        if entry is not None:
+            return entry[2]
+        if not cache.has_key(lock):
+            return None
+    return None
+
+
+def _cached_response(view_func, timeout, key_prefix, request, *args,
+                     **kwargs):
+    def refresh(lock):
+        started = time.perf_counter()
+        try:
+            response = mark_rendered_for(
+                request, view_func(request, *args, **kwargs))
+            _store(request, response, timeout, key_prefix, started)
+            return response
+        finally:
+            if lock is not None:
+                cache.delete(lock)
+
+    def acquire(lock):
+        # Без блокировок каждый запрос обновляет запись сам.
+        if not settings.PAGE_CACHE_LOCK_TIMEOUT:
+            return True
+        return cache.add(lock, 1, settings.PAGE_CACHE_LOCK_TIMEOUT)
+
+    key, entry = _fetch(request, key_prefix)
+    if entry is not None:
+        fresh_until, render_time, response = entry
+        # Вероятностное раннее обновление: чем дороже страница и ближе
+        # конец срока, тем вероятнее, что запрос обновит её заранее.
+        early = (render_time * settings.PAGE_CACHE_EARLY_BETA
+                 * -math.log(1 - random.random()))
+        if time.time() + early < fresh_until:
+            return response, 'hit'
+        lock = _lock_key(key)
+        if acquire(lock):
+            return refresh(lock), 'miss'
+        return response, 'stale'
+    # Пока заголовки Vary страницы неизвестны, варианты различаем по Cookie.
+    lock = _lock_key(key or '\n'.join((
+        key_prefix, request.build_absolute_uri(),
+        request.META.get('HTTP_COOKIE', ''))))
+    if acquire(lock):
+        return refresh(lock), 'miss'
+    response = _wait(request, key_prefix, lock)
+    if response is not None:
+        return response, 'hit'
+    return refresh(None), 'miss'
+
+
+def cache_page_versioned(timeout, *namespaces):
+    """Аналог ``cache_page``, ключ которого зависит от версий ``namespaces``.
+
+    Кешируются только страницы гостей: вошедшему страница отрисовывается
+    заново, в ней его меню, кнопки и CSRF-токен, а ключ кеша пользователей
+    не различает. Пространства имён могут ссылаться на аргументы
+    представления: ``'group:{slug}'``. Вскоре после изменения страница
+    отрисовывается из основной базы, чтобы в кеш не попала отстающая
+    реплика.
+
+    От одновременных промахов страницу отрисовывает один запрос, который
+    взял блокировку; остальные ждут его ответ. Устаревшую запись, пока её
+    обновляют, отдают как есть; незадолго до конца срока запись
+    обновляется заранее. Ответ получает ETag из тех же версий, и условный
+    запрос с совпадающим ETag получает 304 без обращения к кешу страниц.
+    Гостевые ответы может кешировать прокси (``patch_proxy_headers``).
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD') or signed_in(request):
+                return view_func(request, *args, **kwargs)
+            names = _format(namespaces, kwargs)
+            key_prefix = _key_prefix(names)
+            if settings.DATABASE_REPLICAS and recently_bumped(names):
+                with use_primary():
+                    response, result = _cached_response(
+                        view_func, timeout, key_prefix, request, *args,
+                        **kwargs)
+            else:
+                response, result = _cached_response(
+                    view_func, timeout, key_prefix, request, *args, **kwargs)
+            metrics.CACHE_REQUESTS.inc('page', result)
+            return response
+        conditional = condition(
+            etag_func=versioned_etag(*namespaces))(wrapper)
+        return proxy_cacheable(
+            lambda request, *args, **kwargs: _format(namespaces, kwargs)
+        )(conditional)
+    return decorator
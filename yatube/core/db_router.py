@@ -0,0 +1,136 @@
+"""Чтение с реплик базы данных.
+
+Реплики перечислены в ``DATABASE_REPLICAS`` (алиас из ``DATABASES`` и вес).
+Запросы на чтение уходят на реплику только внутри представлений с
+``@read_from_replica``; всё остальное, включая любые записи, идёт в
+``default``. Реплика выбирается случайно с учётом веса среди здоровых:
+здоровье проверяется ``SELECT 1`` не чаще раза в
+``REPLICA_HEALTH_CHECK_INTERVAL`` секунд. Если здоровых реплик нет, чтение
+идёт в ``default``.
+
+Чтобы автор сразу видел свои изменения, представления с
+``@pin_to_primary`` ставят cookie с временем записи, и следующие
+``REPLICA_STICKINESS`` секунд этот браузер читает только из ``default``.
+Кешированные страницы те же ``REPLICA_STICKINESS`` секунд после изменения
+их пространства имён отрисовываются из ``default`` (см. ``core.cache``),
+иначе в кеш попала бы отстающая копия. Поэтому ``REPLICA_STICKINESS``
+должна превышать отставание реплик.
+"""
+import random
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PIN_COOKIE = 'primary_pin'
+
+_local = threading.local()
+_health = {}
+_health_lock = threading.Lock()
+
+
+def is_healthy(alias):
+    now = time.monotonic()
+    checked_at, healthy = _health.get(alias, (None, False))
+    if (checked_at is not None
+            and now - checked_at < settings.REPLICA_HEALTH_CHECK_INTERVAL):
+        return healthy
+    try:
+        with connections[alias].cursor() as cursor:
+            cursor.execute('SELECT 1')
+        healthy = True
+    except Exception:
+        healthy = False
+    with _health_lock:
+        _health[alias] = (now, healthy)
+    return healthy
+
+
+def reset_health():
+    with _health_lock:
+        _health.clear()
+
+
+def choose_replica():
+    replicas = [
+        (alias, weight)
+        for alias, weight in settings.DATABASE_REPLICAS.items()
+        if weight > 0 and is_healthy(alias)
+    ]
+    if not replicas:
+        return DEFAULT_DB_ALIAS
+    aliases, weights = zip(*replicas)
+    return random.choices(aliases, weights)[0]
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        alias = getattr(_local, 'replica', None)
+        if alias is None:
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.DATABASE_REPLICAS
+
+
+def is_pinned(request):
+    try:
+        written_at = float(request.COOKIES[PIN_COOKIE])
+    except (KeyError, ValueError):
+        return False
+    return time.time() - written_at < settings.REPLICA_STICKINESS
+
+
+@contextmanager
+def use_primary():
+    """Внутри блока ``read_from_replica`` не переключает чтение."""
+    previous = getattr(_local, 'primary', False)
+    _local.primary = True
+    try:
+        yield
+    finally:
+        _local.primary = previous
+
+
+def read_from_replica(view_func):
+    """Чтение в представлении идёт с одной реплики на весь запрос."""
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if (not settings.DATABASE_REPLICAS
+                or getattr(_local, 'primary', False)
+                or is_pinned(request)):
+            return view_func(request, *args, **kwargs)
+        previous = getattr(_local, 'replica', None)
+        _local.replica = choose_replica()
+        try:
+            response = view_func(request, *args, **kwargs)
+            if hasattr(response, 'render') and callable(response.render):
+                response.render()
+            return response
+        finally:
+            _local.replica = previous
+    return wrapper
+
+
+def pin_to_primary(view_func):
+    """После записи браузер какое-то время читает только из ``default``."""
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        response = view_func(request, *args, **kwargs)
+        if request.method == 'POST' or response.status_code in (301, 302):
+            response.set_cookie(
+                PIN_COOKIE, str(time.time()),
+                max_age=settings.REPLICA_STICKINESS, httponly=True,
+                samesite='Lax')
+        return response
+    return wrapper
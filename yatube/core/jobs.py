@@ -0,0 +1,161 @@
+"""Очередь отложенных задач в базе данных.
+
+Задача — функция с декоратором ``@task``. ``func.enqueue(**kwargs)`` кладёт
+строку ``Job`` в текущую транзакцию: откат изменений отменяет и задачу, а
+запрос на запись не ждёт побочной работы. ``manage.py runworker`` берёт
+задачи по убыванию приоритета. Взятая задача скрыта от других воркеров на
+``timeout`` секунд (тайм-аут видимости): если воркер упал, её возьмёт
+другой. После ошибки повтор откладывается на ``JOBS_RETRY_DELAY``,
+удваиваясь с каждой попыткой; после ``max_attempts`` попыток задача
+остаётся в статусе «не выполнена» для разбора в админке. Выполненные
+задачи удаляются.
+
+Воркер не видит базу SQLite в памяти (тесты), поэтому с ней задачи
+выполняются сразу при постановке, и ошибка задачи поднимается у того, кто
+её поставил; ``JOBS_INLINE`` задаёт это явно.
+"""
+import json
+import logging
+import os
+import socket
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .queries import outside_budget
+
+logger = logging.getLogger(__name__)
+
+
+def runs_inline():
+    if settings.JOBS_INLINE is not None:
+        return settings.JOBS_INLINE
+    return connection.vendor == 'sqlite' and connection.is_in_memory_db()
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def task(priority=0, max_attempts=3, timeout=None):
+    """Делает функцию задачей: у неё появляется ``enqueue(**kwargs)``.
+
+    Аргументы задачи должны сериализоваться в JSON. ``job_key`` в
+    ``enqueue`` не даёт поставить вторую такую же задачу, пока первая ждёт
+    в очереди; ``delay`` откладывает выполнение на столько секунд.
+    """
+    def decorator(func):
+        name = f'{func.__module__}.{func.__qualname__}'
+
+        def enqueue(job_key=None, delay=0, **kwargs):
+            return _enqueue(
+                func, name, kwargs, job_key, delay, priority, max_attempts,
+                timeout)
+
+        func.enqueue = enqueue
+        return func
+    return decorator
+
+
+def _enqueue(func, name, kwargs, key, delay, priority, max_attempts,
+             timeout):
+    from .models import Job
+
+    if runs_inline():
+        with outside_budget():
+            func(**kwargs)
+        return None
+    job = Job(
+        name=name,
+        kwargs=json.dumps(kwargs),
+        key=key,
+        priority=priority,
+        max_attempts=max_attempts,
+        timeout=timeout or settings.JOBS_VISIBILITY_TIMEOUT,
+        run_at=timezone.now() + timedelta(seconds=delay),
+    )
+    if key is None:
+        job.save()
+        return job
+    try:
+        with transaction.atomic():
+            job.save()
+    except IntegrityError:
+        return None
+    return job
+
+
+def claim(worker):
+    """Берёт доступную задачу с наибольшим приоритетом или ``None``."""
+    from .models import Job
+
+    while True:
+        now = timezone.now()
+        with transaction.atomic():
+            job = Job.objects.select_for_update(skip_locked=True).filter(
+                Q(locked_until__isnull=True) | Q(locked_until__lt=now),
+                status=Job.QUEUED, run_at__lte=now,
+            ).order_by('-priority', 'run_at', 'pk').first()
+            if job is None:
+                return None
+            if job.attempts >= job.max_attempts:
+                # Воркер упал на последней попытке.
+                Job.objects.filter(pk=job.pk).update(
+                    status=Job.FAILED, key=None, locked_until=None)
+                continue
+            Job.objects.filter(pk=job.pk).update(
+                attempts=F('attempts') + 1,
+                locked_until=now + timedelta(seconds=job.timeout),
+                locked_by=worker,
+            )
+        job.attempts += 1
+        job.locked_by = worker
+        return job
+
+
+def run(job):
+    """Выполняет взятую задачу; возвращает ``done``, ``retry`` или
+    ``failed``."""
+    from .models import Job
+
+    # Если тайм-аут видимости истёк и задачу взял другой воркер, её строка
+    # уже не наша.
+    own = Job.objects.filter(pk=job.pk, locked_by=job.locked_by)
+    try:
+        import_string(job.name)(**json.loads(job.kwargs))
+    except Exception:
+        logger.exception('Задача %s (%s) не выполнена', job.name, job.pk)
+        error = traceback.format_exc()
+        if job.attempts >= job.max_attempts:
+            own.update(
+                status=Job.FAILED, key=None, locked_until=None,
+                last_error=error)
+            return 'failed'
+        delay = settings.JOBS_RETRY_DELAY * 2 ** (job.attempts - 1)
+        own.update(
+            run_at=timezone.now() + timedelta(seconds=delay),
+            locked_until=None, locked_by='', last_error=error)
+        return 'retry'
+    own.delete()
+    return 'done'
+
+
+def work(worker, burst=False, should_stop=lambda: False):
+    """Цикл воркера; с ``burst`` заканчивается, когда очередь пуста."""
+    processed = 0
+    while not should_stop():
+        job = claim(worker)
+        if job is None:
+            if burst:
+                break
+            time.sleep(settings.JOBS_POLL_INTERVAL)
+            continue
+        run(job)
+        processed += 1
+    return processed
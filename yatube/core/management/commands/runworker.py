@@ -0,0 +1,62 @@
+import multiprocessing
+import signal
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core import jobs
+
+
+class Command(BaseCommand):
+    help = 'Выполняет задачи из очереди core.jobs в нескольких процессах'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes', type=int, default=2,
+            help='Сколько процессов-воркеров запустить')
+        parser.add_argument(
+            '--burst', action='store_true',
+            help='Выйти, когда очередь опустеет')
+
+    def handle(self, *args, **options):
+        if options['processes'] <= 1:
+            processed = self.work(options['burst'])
+            self.stdout.write(f'Выполнено задач: {processed}')
+            return
+        # Соединения с базой нельзя наследовать через fork.
+        connections.close_all()
+        processes = [
+            multiprocessing.Process(
+                target=self.work, args=(options['burst'],), daemon=True)
+            for _ in range(options['processes'])
+        ]
+        for process in processes:
+            process.start()
+
+        def stop(signum, frame):
+            for process in processes:
+                process.terminate()
+
+        signal.signal(signal.SIGTERM, stop)
+        try:
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            for process in processes:
+                process.join()
+
+    def work(self, burst):
+        stopping = []
+
+        def stop(signum, frame):
+            # Текущая задача доделывается, новые не берутся.
+            stopping.append(signum)
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+        worker = jobs.worker_name()
+        self.stdout.write(f'Воркер {worker} запущен')
+        try:
+            return jobs.work(worker, burst, lambda: bool(stopping))
+        finally:
+            connections.close_all()
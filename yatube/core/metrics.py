@@ -0,0 +1,169 @@
+"""Метрики производительности в памяти процесса.
+
+Счётчики и гистограммы с фиксированными корзинами: наблюдение — это поиск
+корзины и прибавление под замком, поэтому сбор можно держать включённым
+постоянно. ``render()`` отдаёт всё в текстовом формате Prometheus. Данные
+запроса, которые копятся по ходу обработки (время SQL и шаблонов),
+хранятся в ``current()`` текущего потока.
+"""
+import threading
+from bisect import bisect_left
+
+LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+_local = threading.local()
+REGISTRY = []
+
+
+def _escape(value):
+    return (
+        str(value).replace('\\', '\\\\')
+        .replace('"', '\\"').replace('\n', '\\n')
+    )
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ''
+    return '{' + ','.join(
+        f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def render(self):
+        lines = [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} {self.kind}',
+        ]
+        with self._lock:
+            values = sorted(self._values.items())
+        for label_values, value in values:
+            lines.extend(self._render_value(label_values, value))
+        return lines
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = (
+                self._values.get(label_values, 0) + amount)
+
+    def value(self, *label_values):
+        return self._values.get(label_values, 0)
+
+    def _render_value(self, label_values, value):
+        labels = _format_labels(self.labels, label_values)
+        return [f'{self.name}{labels} {_format_number(value)}']
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(),
+                 buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *label_values):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(label_values)
+            if state is None:
+                state = self._values[label_values] = [
+                    [0] * (len(self.buckets) + 1), 0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def count(self, *label_values):
+        state = self._values.get(label_values)
+        return state[2] if state else 0
+
+    def _render_value(self, label_values, state):
+        counts, total, count = state
+        lines = []
+        cumulative = 0
+        for bound, bucket in zip((*self.buckets, float('inf')), counts):
+            cumulative += bucket
+            labels = _format_labels(
+                self.labels, label_values, [('le', _format_number(bound))])
+            lines.append(f'{self.name}_bucket{labels} {cumulative}')
+        labels = _format_labels(self.labels, label_values)
+        lines.append(f'{self.name}_sum{labels} {_format_number(total)}')
+        lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+def render():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+def start_request():
+    _local.request = {
+        'view': '',
+        'slow_queries': [],
+        'sql_time': 0.0,
+        'sql_count': 0,
+        'template_time': 0.0,
+        'template_depth': 0,
+    }
+    return _local.request
+
+
+def current():
+    """Данные обрабатываемого запроса или ``None`` вне запроса."""
+    return getattr(_local, 'request', None)
+
+
+def finish_request():
+    _local.request = None
+
+
+REQUEST_DURATION = Histogram(
+    'yatube_request_duration_seconds', 'Время обработки запроса',
+    ('view', 'method'))
+REQUESTS = Counter(
+    'yatube_requests_total', 'Обработанные запросы',
+    ('view', 'method', 'status'))
+SQL_DURATION = Histogram(
+    'yatube_sql_duration_seconds', 'Суммарное время SQL за запрос',
+    ('view',))
+SQL_QUERIES = Histogram(
+    'yatube_sql_queries', 'Число SQL-запросов за запрос',
+    ('view',), buckets=COUNT_BUCKETS)
+TEMPLATE_DURATION = Histogram(
+    'yatube_template_render_seconds', 'Время отрисовки шаблонов за запрос',
+    ('view',))
+CACHE_REQUESTS = Counter(
+    'yatube_cache_requests_total', 'Обращения к кешу',
+    ('cache', 'result'))
+THUMBNAIL_DURATION = Histogram(
+    'yatube_thumbnail_seconds', 'Время нарезки вариантов картинки')
@@ -0,0 +1,57 @@
+import time
+
+from . import metrics, slow_queries
+from .queries import execute_wrapper_all
+
+
+class SQLTimer:
+    def __init__(self, state):
+        self.state = state
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.state['sql_time'] += time.perf_counter() - started
+            self.state['sql_count'] += 1
+
+
+class MetricsMiddleware:
+    """Время ответа, SQL и шаблонов по имени URL в ``core.metrics``.
+
+    Стоит первым в ``MIDDLEWARE``, чтобы учитывать работу остальных
+    middleware. Медленные запросы, замеченные за время ответа, сохраняются
+    в сводку ``SlowQuery``.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state = metrics.start_request()
+        started = time.perf_counter()
+        try:
+            with execute_wrapper_all(SQLTimer(state)):
+                response = self.get_response(request)
+        finally:
+            metrics.finish_request()
+        elapsed = time.perf_counter() - started
+        if state['slow_queries']:
+            slow_queries.save(state['slow_queries'])
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        if view == 'metrics':
+            return response
+        method = request.method
+        metrics.REQUEST_DURATION.observe(elapsed, view, method)
+        metrics.REQUESTS.inc(view, method, f'{response.status_code // 100}xx')
+        metrics.SQL_DURATION.observe(state['sql_time'], view)
+        metrics.SQL_QUERIES.observe(state['sql_count'], view)
+        metrics.TEMPLATE_DURATION.observe(state['template_time'], view)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        state = metrics.current()
+        if state is not None:
+            state['view'] = request.resolver_match.view_name
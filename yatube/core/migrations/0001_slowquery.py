@@ -0,0 +1,38 @@
+# Generated by Django 2.2.16 on 2026-10-17 07:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlowQuery',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fingerprint', models.CharField(max_length=32, unique=True, verbose_name='Отпечаток')),
+                ('statement', models.TextField(verbose_name='Нормализованный SQL')),
+                ('example', models.TextField(verbose_name='Пример запроса')),
+                ('params', models.TextField(blank=True, verbose_name='Параметры примера')),
+                ('view', models.CharField(blank=True, max_length=200, verbose_name='Представление')),
+                ('template', models.CharField(blank=True, max_length=300, verbose_name='Шаблон')),
+                ('source', models.CharField(blank=True, max_length=300, verbose_name='Место вызова')),
+                ('plan', models.TextField(blank=True, verbose_name='План запроса')),
+                ('calls', models.PositiveIntegerField(default=0, verbose_name='Вызовов')),
+                ('total_time', models.FloatField(default=0, verbose_name='Суммарное время, с')),
+                ('max_time', models.FloatField(default=0, verbose_name='Максимальное время, с')),
+                ('first_seen', models.DateTimeField(auto_now_add=True, verbose_name='Впервые')),
+                ('last_seen', models.DateTimeField(auto_now=True, verbose_name='Последний раз')),
+            ],
+            options={
+                'verbose_name': 'Медленный запрос',
+                'verbose_name_plural': 'Медленные запросы',
+                'ordering': ('-total_time',),
+            },
+        ),
+    ]
@@ -9,3 +9,69 @@ class CreatedModel(models.Model):
 
     class Meta:
         abstract = True
+
+
+class SlowQuery(models.Model):
+    """Медленный SQL-запрос, сгруппированный по отпечатку."""
+    fingerprint = models.CharField('Отпечаток', max_length=32, unique=True)
+    statement = models.TextField('Нормализованный SQL')
+    example = models.TextField('Пример запроса')
+    params = models.TextField('Параметры примера', blank=True)
+    view = models.CharField('Представление', max_length=200, blank=True)
+    template = models.CharField('Шаблон', max_length=300, blank=True)
+    source = models.CharField('Место вызова', max_length=300, blank=True)
+    plan = models.TextField('План запроса', blank=True)
+    calls = models.PositiveIntegerField('Вызовов', default=0)
+    total_time = models.FloatField('Суммарное время, с', default=0)
+    max_time = models.FloatField('Максимальное время, с', default=0)
+    first_seen = models.DateTimeField('Впервые', auto_now_add=True)
+    last_seen = models.DateTimeField('Последний раз', auto_now=True)
+
+    class Meta:
+        ordering = ('-total_time',)
+        verbose_name = 'Медленный запрос'
+        verbose_name_plural = 'Медленные запросы'
+
+    def __str__(self):
+        return self.statement[:100]
+
+
+class Job(models.Model):
+    """Отложенная задача для ``manage.py runworker`` (см. ``core.jobs``)."""
+    QUEUED = 'queued'
+    FAILED = 'failed'
+    STATUSES = (
+        (QUEUED, 'В очереди'),
+        (FAILED, 'Не выполнена'),
+    )
+
+    name = models.CharField('Задача', max_length=200)
+    kwargs = models.TextField('Аргументы', default='{}')
+    key = models.CharField(
+        'Ключ', max_length=200, unique=True, null=True, blank=True,
+        help_text='Пока задача с ключом в очереди, такая же не ставится')
+    status = models.CharField(
+        'Статус', max_length=10, choices=STATUSES, default=QUEUED)
+    priority = models.SmallIntegerField('Приоритет', default=0)
+    attempts = models.PositiveSmallIntegerField('Попыток', default=0)
+    max_attempts = models.PositiveSmallIntegerField(
+        'Наибольшее число попыток', default=3)
+    timeout = models.PositiveIntegerField('Тайм-аут видимости, с')
+    run_at = models.DateTimeField('Выполнить не раньше')
+    locked_until = models.DateTimeField('Занята до', null=True, blank=True)
+    locked_by = models.CharField('Воркер', max_length=100, blank=True)
+    last_error = models.TextField('Последняя ошибка', blank=True)
+    created = models.DateTimeField('Создана', auto_now_add=True)
+
+    class Meta:
+        ordering = ('-priority', 'run_at', 'pk')
+        indexes = [
+            models.Index(
+                fields=['status', '-priority', 'run_at'],
+                name='core_job_queue_idx'),
+        ]
+        verbose_name = 'Задача'
+        verbose_name_plural = 'Задачи'
+
+    def __str__(self):
+        return self.name
@@ -0,0 +1,145 @@
+from django.conf import settings
+from django.core import signing
+from django.core.paginator import EmptyPage, InvalidPage, Page, Paginator
+from django.core.paginator import PageNotAnInteger
+from django.db.models import Q
+
+
+class KeysetPaginator(Paginator):
+    """Постраничная навигация по ключу сортировки вместо OFFSET.
+
+    Следующие и предыдущие страницы открываются по непрозрачным курсорам
+    ``?after=`` и ``?before=``, поэтому глубокая страница стоит столько же,
+    сколько первая. Старые ссылки ``?page=N`` продолжают работать через
+    OFFSET, но не глубже ``PAGINATOR_MAX_OFFSET_PAGE``. Общее число записей
+    не считается.
+    """
+    salt = 'core.paginator'
+
+    def __init__(self, object_list, per_page, ordering=('-pub_date', '-pk'),
+                 max_offset_page=None):
+        self.ordering = tuple(ordering)
+        self.max_offset_page = (
+            max_offset_page or settings.PAGINATOR_MAX_OFFSET_PAGE)
+        self._last_number = 1
+        super().__init__(object_list.order_by(*self.ordering), per_page)
+
+    @property
+    def num_pages(self):
+        return self._last_number
+
+    def validate_number(self, number):
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('Номер страницы не является числом')
+        if number < 1:
+            raise EmptyPage('Номер страницы меньше 1')
+        return number
+
+    def get_page(self, number):
+        try:
+            number = self.validate_number(number)
+        except InvalidPage:
+            number = 1
+        return self.page(min(number, self.max_offset_page))
+
+    def page(self, number):
+        number = self.validate_number(number)
+        offset = (number - 1) * self.per_page
+        rows = self._slice(Q(), True, offset, offset + self.per_page + 1)
+        return self._build_page(
+            rows[:self.per_page],
+            number,
+            has_previous=number > 1,
+            has_next=len(rows) > self.per_page,
+        )
+
+    def page_from_request(self, query):
+        for direction in ('after', 'before'):
+            token = query.get(direction)
+            if token:
+                try:
+                    return self.cursor_page(token, direction)
+                except InvalidPage:
+                    break
+        return self.get_page(query.get('page'))
+
+    def cursor_page(self, token, direction):
+        forward = direction == 'after'
+        rows = self._slice(
+            self._seek(self.decode(token), forward), forward,
+            0, self.per_page + 1)
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if forward:
+            return self._build_page(
+                rows, 2, has_previous=True, has_next=has_more)
+        rows.reverse()
+        return self._build_page(
+            rows, 2 if has_more else 1, has_previous=has_more, has_next=True)
+
+    def _slice(self, seek, forward, start, stop):
+        """Строки ``start:stop`` после условия ``seek``; с ``forward=False``
+        — в обратном порядке."""
+        queryset = self.object_list.filter(seek)
+        if not forward:
+            queryset = queryset.reverse()
+        return list(queryset[start:stop])
+
+    def encode(self, row):
+        values = []
+        for name, _ in self._fields():
+            value = getattr(row, name)
+            if hasattr(value, 'isoformat'):
+                value = value.isoformat()
+            values.append(value)
+        return signing.dumps(values, salt=self.salt)
+
+    def decode(self, token):
+        try:
+            values = signing.loads(token, salt=self.salt)
+        except signing.BadSignature:
+            raise InvalidPage('Неверный курсор')
+        fields = self._fields()
+        if not isinstance(values, list) or len(values) != len(fields):
+            raise InvalidPage('Неверный курсор')
+        try:
+            return [
+                self._field(name).to_python(value)
+                for (name, _), value in zip(fields, values)
+            ]
+        except Exception:
+            raise InvalidPage('Неверный курсор')
+
+    def _field(self, name):
+        annotations = self.object_list.query.annotations
+        if name in annotations:
+            return annotations[name].output_field
+        opts = self.object_list.model._meta
+        return opts.pk if name == 'pk' else opts.get_field(name)
+
+    def _fields(self):
+        return [
+            (name.lstrip('-'), name.startswith('-'))
+            for name in self.ordering
+        ]
+
+    def _seek(self, values, forward):
+        query = Q()
+        equal = {}
+        for (name, descending), value in zip(self._fields(), values):
+            lookup = 'lt' if descending == forward else 'gt'
+            query |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        return query
+
+    def _build_page(self, rows, number, has_previous, has_next):
+        if has_previous and number < 2:
+            number = 2
+        self._last_number = number + 1 if has_next else number
+        page = Page(rows, number, self)
+        page.next_cursor = self.encode(rows[-1]) if has_next and rows else ''
+        page.previous_cursor = (
+            self.encode(rows[0]) if has_previous and rows else '')
+        return page
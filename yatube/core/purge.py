@@ -0,0 +1,56 @@
+"""Сброс страниц в кеширующем прокси перед Django.
+
+Гостевые ответы помечаются заголовком ``Surrogate-Key`` с ключами их
+пространств имён кеша (``post-123``, ``group-slug``, ``profile-имя``).
+Когда ``core.cache.bump`` сбрасывает пространства имён, после фиксации
+транзакции те же ключи уходят в ``PROXY_PURGER``. ``HTTPPurger`` шлёт
+запрос ``PROXY_PURGE_METHOD`` на ``PROXY_PURGE_URL`` с ключами в заголовке
+``Surrogate-Key``, как это понимают Varnish (xkey) и CDN; ``NullPurger``
+ничего не делает.
+"""
+import logging
+import urllib.request
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+def surrogate_key(namespace):
+    return namespace.replace(':', '-')
+
+
+class NullPurger:
+    def purge(self, keys):
+        pass
+
+
+class HTTPPurger:
+    def __init__(self):
+        self.url = settings.PROXY_PURGE_URL
+        self.method = settings.PROXY_PURGE_METHOD
+        self.timeout = settings.PROXY_PURGE_TIMEOUT
+
+    def purge(self, keys):
+        request = urllib.request.Request(
+            self.url, method=self.method,
+            headers={'Surrogate-Key': ' '.join(keys)})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout):
+                pass
+        except OSError as exc:
+            # Прокси недоступен: страницы устареют не дольше s-maxage.
+            logger.warning(
+                'Не удалось сбросить %s в прокси: %s', ' '.join(keys), exc)
+
+
+def get_purger():
+    return import_string(settings.PROXY_PURGER)()
+
+
+def purge(namespaces):
+    """Сбрасывает страницы ``namespaces`` после фиксации транзакции."""
+    keys = sorted({surrogate_key(namespace) for namespace in namespaces})
+    transaction.on_commit(lambda: get_purger().purge(keys))
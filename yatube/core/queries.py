@@ -0,0 +1,80 @@
+"""Бюджет SQL-запросов представления.
+
+Представление объявляет, сколько запросов ему позволено сделать. Если
+бюджет превышен, в тестах поднимается ``QueryBudgetExceeded``, а в работе
+пишется предупреждение в лог, поэтому вернувшийся N+1 виден сразу.
+"""
+import logging
+from contextlib import ExitStack, contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class QueryCounter:
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries.append(sql)
+        return execute(sql, params, many, context)
+
+    def __len__(self):
+        return len(self.queries)
+
+
+@contextmanager
+def execute_wrapper_all(wrapper):
+    """``execute_wrapper`` сразу на всех соединениях, включая реплики."""
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(wrapper))
+        yield
+
+
+@contextmanager
+def outside_budget():
+    """Не засчитывает в бюджет фоновую работу, выполняемую на месте."""
+    saved = {}
+    for connection in connections.all():
+        saved[connection] = connection.execute_wrappers
+        connection.execute_wrappers = [
+            wrapper for wrapper in connection.execute_wrappers
+            if not isinstance(wrapper, QueryCounter)
+        ]
+    try:
+        yield
+    finally:
+        for connection, wrappers in saved.items():
+            connection.execute_wrappers = wrappers
+
+
+def query_budget(max_queries):
+    """Ограничивает число SQL-запросов представления ``max_queries``."""
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            counter = QueryCounter()
+            with execute_wrapper_all(counter):
+                response = view_func(request, *args, **kwargs)
+                if hasattr(response, 'render') and callable(response.render):
+                    response.render()
+            if len(counter) > max_queries:
+                message = (
+                    f'{view_func.__module__}.{view_func.__name__}: '
+                    f'{len(counter)} SQL-запросов при бюджете {max_queries}'
+                )
+                if settings.QUERY_BUDGET_RAISE:
+                    raise QueryBudgetExceeded(
+                        message + '\n' + '\n'.join(counter.queries))
+                logger.warning(message)
+            return response
+        return wrapper
+    return decorator
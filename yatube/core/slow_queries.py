@@ -0,0 +1,173 @@
+"""Журнал медленных SQL-запросов.
+
+``SlowQueryRecorder`` ставится через ``connection.execute_wrapper`` на
+каждое соединение и замеряет все запросы. Запрос дольше
+``SLOW_QUERY_THRESHOLD`` секунд пишется в ротируемый лог вместе с
+нормализованным текстом, параметрами, представлением, строкой шаблона,
+местом вызова в коде проекта и выводом ``EXPLAIN``. В запросе записи
+копятся и в конце сохраняются в ``SlowQuery``, по одной строке на отпечаток
+запроса; сводка видна в админке.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+STRING_RE = re.compile(r"'(?:[^']|'')*'")
+NUMBER_RE = re.compile(r'(?<![\w."])-?\d+(?:\.\d+)?\b')
+IN_LIST_RE = re.compile(r'\bIN \(\?(?:, \?)*\)', re.IGNORECASE)
+SPACE_RE = re.compile(r'\s+')
+
+# Обёртки execute_wrapper из core не считаются местом вызова.
+WRAPPER_FILES = {
+    os.path.join(os.path.dirname(__file__), name)
+    for name in ('middleware.py', 'queries.py', 'slow_queries.py')
+}
+
+
+def normalize(sql):
+    """SQL без значений: одинаковые по форме запросы совпадают."""
+    sql = STRING_RE.sub('?', sql.replace('%s', '?'))
+    sql = NUMBER_RE.sub('?', sql)
+    sql = SPACE_RE.sub(' ', sql).strip()
+    return IN_LIST_RE.sub('IN (...)', sql)
+
+
+def fingerprint(statement):
+    return hashlib.md5(statement.encode()).hexdigest()
+
+
+def template_location():
+    """Самый вложенный узел шаблона, который сейчас отрисовывается."""
+    frame = sys._getframe()
+    while frame is not None:
+        if frame.f_code.co_name == 'render_annotated':
+            node = frame.f_locals.get('self')
+            token = getattr(node, 'token', None)
+            origin = getattr(node, 'origin', None)
+            if token is not None and origin is not None:
+                return f'{origin.template_name}:{token.lineno}'
+        frame = frame.f_back
+    return ''
+
+
+def source_location():
+    """Ближайшая строка кода проекта в стеке вызова."""
+    frame = sys._getframe()
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if (filename.startswith(settings.BASE_DIR)
+                and filename not in WRAPPER_FILES
+                and 'site-packages' not in filename):
+            path = os.path.relpath(filename, settings.BASE_DIR)
+            return f'{path}:{frame.f_lineno} {frame.f_code.co_name}'
+        frame = frame.f_back
+    return ''
+
+
+def explain(connection, sql, params):
+    if not sql.lstrip().upper().startswith('SELECT'):
+        return ''
+    prefix = (
+        'EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' else 'EXPLAIN ')
+    # EXPLAIN не должен попадать ни в бюджет, ни в метрики, ни сюда же.
+    wrappers = connection.execute_wrappers
+    connection.execute_wrappers = []
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(prefix + sql, params)
+            rows = cursor.fetchall()
+    except Exception:
+        return ''
+    finally:
+        connection.execute_wrappers = wrappers
+    return '\n'.join(str(row[-1]) for row in rows)
+
+
+class SlowQueryRecorder:
+    def __call__(self, execute, sql, params, many, context):
+        if getattr(_local, 'paused', False):
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        result = execute(sql, params, many, context)
+        elapsed = time.perf_counter() - started
+        threshold = settings.SLOW_QUERY_THRESHOLD
+        if threshold is not None and elapsed >= threshold:
+            record(context['connection'], sql, params, many, elapsed)
+        return result
+
+
+def install(connection, **kwargs):
+    """Обработчик ``connection_created``."""
+    if not any(isinstance(wrapper, SlowQueryRecorder)
+               for wrapper in connection.execute_wrappers):
+        connection.execute_wrappers.append(SlowQueryRecorder())
+
+
+def record(connection, sql, params, many, elapsed):
+    state = metrics.current()
+    statement = normalize(sql)
+    entry = {
+        'fingerprint': fingerprint(statement),
+        'statement': statement,
+        'example': sql,
+        'params': json.dumps(params, default=str, ensure_ascii=False),
+        'view': state['view'] if state else '',
+        'template': template_location(),
+        'source': source_location(),
+        'plan': '' if many else explain(connection, sql, params),
+        'duration': elapsed,
+    }
+    logger.warning(
+        '%.3f с %s %s %s %s\n%s\nпараметры: %s\n%s',
+        elapsed, entry['view'] or '-', entry['template'] or '-',
+        entry['source'] or '-', entry['fingerprint'], sql,
+        entry['params'], entry['plan'],
+    )
+    if state is not None:
+        state['slow_queries'].append(entry)
+
+
+def save(entries):
+    """Добавляет записи к сводке по отпечаткам."""
+    from .models import SlowQuery
+
+    _local.paused = True
+    try:
+        for entry in entries:
+            duration = entry.pop('duration')
+            changes = dict(
+                entry,
+                calls=F('calls') + 1,
+                total_time=F('total_time') + duration,
+                max_time=Greatest('max_time', duration),
+                last_seen=timezone.now(),
+            )
+            query = SlowQuery.objects.filter(fingerprint=entry['fingerprint'])
+            if query.update(**changes):
+                continue
+            try:
+                with transaction.atomic():
+                    SlowQuery.objects.create(
+                        **entry, calls=1, total_time=duration,
+                        max_time=duration)
+            except IntegrityError:
+                query.update(**changes)
+    finally:
+        _local.paused = False
@@ -0,0 +1,38 @@
+import time
+
+from django.template import TemplateDoesNotExist
+from django.template.backends import django as django_backend
+
+from . import metrics
+
+
+class Template(django_backend.Template):
+    """Шаблон, время отрисовки которого попадает в метрики запроса.
+
+    Считается только внешняя отрисовка: вложенные ``render_to_string``
+    уже входят в её время.
+    """
+
+    def render(self, context=None, request=None):
+        state = metrics.current()
+        if state is None:
+            return super().render(context, request)
+        state['template_depth'] += 1
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            state['template_depth'] -= 1
+            if not state['template_depth']:
+                state['template_time'] += time.perf_counter() - started
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return Template(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            django_backend.reraise(exc, self)
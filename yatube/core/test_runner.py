@@ -0,0 +1,45 @@
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+
+class TemporaryCache:
+    """Переносит файловый кеш во временный каталог, чтобы тесты не
+    смешивали его с кешем разработки и между запусками."""
+
+    def enable(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.cache_settings = None
+        cache = settings.CACHES['default']
+        if cache['BACKEND'] == 'core.backends.cache.SQLiteCache':
+            self.cache_settings = override_settings(CACHES={'default': dict(
+                cache,
+                LOCATION=os.path.join(self.cache_dir, 'cache.sqlite3'))})
+            self.cache_settings.enable()
+
+    def disable(self):
+        if self.cache_settings is not None:
+            self.cache_settings.disable()
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+
+class QueryBudgetRunner(DiscoverRunner):
+    """Тесты падают, если представление превысило бюджет запросов.
+
+    Кеш на время тестов — во временном каталоге (``TemporaryCache``); для
+    pytest то же делает ``conftest.py`` в корне репозитория.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        settings.QUERY_BUDGET_RAISE = True
+        self.cache = TemporaryCache()
+        self.cache.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.cache.disable()
+        super().teardown_test_environment(**kwargs)
@@ -1,6 +1,36 @@
+import os
+from io import StringIO
+import tempfile
+import threading
+import time
 from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from unittest import mock
 
-from django.test import TestCase, Client
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.http import HttpResponse
+from django.utils import timezone
+from django.test import (
+    Client, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase,
+    override_settings)
+from django.test.utils import CaptureQueriesContext
+
+from core import benchmark, db_router, jobs, metrics, slow_queries
+from core.backends.cache import SQLiteCache
+from core.backends.sqlite3.base import pragma_statements
+from core.cache import (
+    _fetch, _key_prefix, _lock_key, _store, bump, cache_page_versioned,
+    mark_rendered_for, proxy_cacheable, recently_bumped)
+from core.models import Job, SlowQuery
+from core.paginator import KeysetPaginator
+from core.queries import QueryBudgetExceeded, query_budget
+from posts.models import Comment, Follow, Post
+
+User = get_user_model()
 
 
 class ViewTestClass(TestCase):
@@ -11,3 +41,564 @@ class ViewTestClass(TestCase):
         response = self.guest_client.get('/nonexist-page/')
         self.assertTemplateUsed(response, 'core/404.html')
         self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+
+class KeysetPaginatorTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(username='author')
+        for number in range(25):
+            Post.objects.create(text=f'Пост {number}', author=author)
+        cls.posts = list(Post.objects.order_by('-pub_date', '-pk'))
+
+    def setUp(self):
+        self.paginator = KeysetPaginator(Post.objects.all(), 10)
+
+    def test_cursor_walks_all_pages(self):
+        page = self.paginator.page_from_request({})
+        seen = list(page)
+        while page.has_next():
+            page = self.paginator.page_from_request(
+                {'after': page.next_cursor})
+            seen.extend(page)
+        self.assertEqual(seen, self.posts)
+        self.assertEqual(len(page), 5)
+
+    def test_before_cursor_returns_previous_page(self):
+        second = self.paginator.page_from_request({'page': '2'})
+        first = self.paginator.page_from_request(
+            {'before': second.previous_cursor})
+        self.assertEqual(list(first), self.posts[:10])
+        self.assertFalse(first.has_previous())
+        self.assertTrue(first.has_next())
+
+    def test_page_number_fallback_is_bounded(self):
+        paginator = KeysetPaginator(Post.objects.all(), 10, max_offset_page=2)
+        self.assertEqual(
+            list(paginator.get_page(3)), self.posts[10:20])
+
+    def test_bad_cursor_falls_back_to_first_page(self):
+        page = self.paginator.page_from_request({'after': 'garbage'})
+        self.assertEqual(list(page), self.posts[:10])
+
+
+class QueryBudgetTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='author')
+
+    def setUp(self):
+        self.request = RequestFactory().get('/')
+
+        @query_budget(1)
+        def view(request):
+            User.objects.count()
+            User.objects.exists()
+            return HttpResponse()
+
+        self.view = view
+
+    @override_settings(QUERY_BUDGET_RAISE=True)
+    def test_over_budget_raises_in_tests(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            self.view(self.request)
+
+    @override_settings(QUERY_BUDGET_RAISE=False)
+    def test_over_budget_is_logged_in_production(self):
+        with self.assertLogs('core.queries', 'WARNING'):
+            response = self.view(self.request)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+
+class BenchmarkTest(TestCase):
+    def test_percentile_uses_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual(benchmark.percentile(values, 0.5), 50)
+        self.assertEqual(benchmark.percentile(values, 0.99), 99)
+        self.assertEqual(benchmark.percentile([], 0.5), 0.0)
+
+    def test_run_counts_requests_and_errors(self):
+        class StatusClient:
+            def get(self, path, data):
+                return HttpResponse(status=int(path))
+
+        scenario = benchmark.Scenario(
+            'status', 'get', lambda rng: (rng.choice(['200', '500']), None))
+        result = benchmark.run(scenario, 2, 10, StatusClient, random_seed=1)
+        self.assertEqual(result['requests'], 20)
+        self.assertGreater(result['errors'], 0)
+        self.assertLess(result['errors'], 20)
+        self.assertGreater(result['rps'], 0)
+
+    def test_compare_reports_regressions(self):
+        baseline = {'index': {
+            'p50': 10, 'p95': 20, 'p99': 30, 'rps': 100, 'queries': 3}}
+        same = {'index': dict(baseline['index'], p95=22)}
+        worse = {'index': dict(baseline['index'], queries=5, rps=50)}
+        self.assertEqual(benchmark.compare(same, baseline, 0.2), [])
+        self.assertEqual(len(benchmark.compare(worse, baseline, 0.2)), 2)
+
+
+class MetricsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        for metric in metrics.REGISTRY:
+            metric.clear()
+
+    def test_histogram_renders_cumulative_buckets(self):
+        histogram = metrics.Histogram(
+            'test_seconds', 'Тест', ('view',), buckets=(0.1, 1))
+        metrics.REGISTRY.remove(histogram)
+        for value in (0.05, 0.1, 0.5, 3):
+            histogram.observe(value, 'a"b')
+        self.assertEqual(histogram.render()[2:], [
+            'test_seconds_bucket{view="a\\"b",le="0.1"} 2',
+            'test_seconds_bucket{view="a\\"b",le="1"} 3',
+            'test_seconds_bucket{view="a\\"b",le="+Inf"} 4',
+            'test_seconds_sum{view="a\\"b"} 3.65',
+            'test_seconds_count{view="a\\"b"} 4',
+        ])
+
+    def test_requests_are_measured_per_url_name(self):
+        User.objects.create_user(username='author')
+        self.client.get('/')
+        self.client.get('/')
+        self.assertEqual(
+            metrics.REQUEST_DURATION.count('posts:index', 'GET'), 2)
+        self.assertEqual(
+            metrics.REQUESTS.value('posts:index', 'GET', '2xx'), 2)
+        self.assertEqual(metrics.CACHE_REQUESTS.value('page', 'miss'), 1)
+        self.assertEqual(metrics.CACHE_REQUESTS.value('page', 'hit'), 1)
+        self.assertEqual(metrics.TEMPLATE_DURATION.count('posts:index'), 2)
+
+        with self.settings(METRICS_TOKEN='secret'):
+            response = self.client.get(
+                '/metrics', HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        body = response.content.decode()
+        self.assertIn(
+            'yatube_request_duration_seconds_count'
+            '{view="posts:index",method="GET"} 2', body)
+        self.assertIn('yatube_sql_queries_bucket{view="posts:index"', body)
+        self.assertNotIn('view="metrics"', body)
+
+    def test_metrics_are_hidden_from_outside(self):
+        response = self.client.get('/metrics', REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(response.status_code, HTTPStatus.FORBIDDEN)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_metrics_need_token_or_staff_behind_proxy(self):
+        url = '/metrics'
+        self.assertEqual(
+            self.client.get(url, REMOTE_ADDR='127.0.0.1').status_code,
+            HTTPStatus.FORBIDDEN)
+        self.assertEqual(
+            self.client.get(
+                url, HTTP_AUTHORIZATION='Bearer wrong').status_code,
+            HTTPStatus.FORBIDDEN)
+        self.assertEqual(
+            self.client.get(
+                url, HTTP_AUTHORIZATION='Bearer secret').status_code,
+            HTTPStatus.OK)
+        self.client.force_login(
+            User.objects.create_user(username='admin', is_staff=True))
+        self.assertEqual(self.client.get(url).status_code, HTTPStatus.OK)
+
+
+class SlowQueryTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='reader')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_normalize_strips_values(self):
+        self.assertEqual(
+            slow_queries.normalize(
+                'SELECT "t"."id" FROM "t"  WHERE "t"."a" = \'x\'\'y\' '
+                'AND "t"."b" IN (%s, %s, %s) LIMIT 21'),
+            'SELECT "t"."id" FROM "t" WHERE "t"."a" = ? '
+            'AND "t"."b" IN (...) LIMIT ?',
+        )
+
+    @override_settings(SLOW_QUERY_THRESHOLD=0)
+    def test_slow_queries_are_logged_and_grouped(self):
+        # Лог перехватывается целиком: с нулевым порогом туда попадают и
+        # запросы самого теста.
+        with self.assertLogs('core.slow_queries', 'WARNING'):
+            self.client.get('/')
+            cache.clear()
+            self.client.get('/')
+            posts_query = SlowQuery.objects.get(
+                view='posts:index', statement__contains='FROM "posts_post"')
+            self.assertEqual(posts_query.calls, 2)
+            self.assertIn('SCAN', posts_query.plan)
+            self.assertTrue(
+                posts_query.source.startswith('core/paginator.py'))
+            post = Post.objects.create(author=self.user, text='Пост')
+            self.client.get(f'/posts/{post.pk}/')
+            comments_query = SlowQuery.objects.get(
+                view='posts:post_detail',
+                statement__contains='FROM "posts_comment"')
+            self.assertTrue(
+                comments_query.source.startswith('core/paginator.py'))
+
+    @override_settings(SLOW_QUERY_THRESHOLD=None)
+    def test_threshold_none_disables_log(self):
+        self.client.get('/')
+        self.assertFalse(SlowQuery.objects.exists())
+
+
+@override_settings(DATABASE_REPLICAS={'replica1': 3, 'replica2': 1})
+class ReplicaRouterTest(TestCase):
+    def setUp(self):
+        db_router.reset_health()
+        self.router = db_router.ReplicaRouter()
+        self.factory = RequestFactory()
+
+    def read_alias(self, request):
+        aliases = []
+
+        @db_router.read_from_replica
+        def view(request):
+            aliases.append(self.router.db_for_read(Post))
+            return HttpResponse()
+
+        view(request)
+        return aliases[0]
+
+    def test_unreachable_replicas_fall_back_to_default(self):
+        self.assertFalse(db_router.is_healthy('replica1'))
+        self.assertEqual(db_router.choose_replica(), 'default')
+
+    def test_replica_is_chosen_by_weight(self):
+        with mock.patch.object(db_router, 'is_healthy', return_value=True):
+            chosen = [db_router.choose_replica() for _ in range(400)]
+        self.assertGreater(chosen.count('replica1'), chosen.count('replica2'))
+        self.assertNotIn('default', chosen)
+
+    def test_reads_and_writes(self):
+        with mock.patch.object(db_router, 'choose_replica',
+                               return_value='replica2'):
+            self.assertEqual(
+                self.read_alias(self.factory.get('/')), 'replica2')
+            with db_router.use_primary():
+                self.assertEqual(
+                    self.read_alias(self.factory.get('/')), 'default')
+        self.assertEqual(self.router.db_for_read(Post), 'default')
+        self.assertEqual(self.router.db_for_write(Post), 'default')
+        self.assertFalse(self.router.allow_migrate('replica1', 'posts'))
+
+    def test_pinned_browser_reads_from_primary(self):
+        request = self.factory.get('/')
+        request.COOKIES[db_router.PIN_COOKIE] = str(time.time())
+        with mock.patch.object(db_router, 'choose_replica',
+                               return_value='replica2'):
+            self.assertEqual(self.read_alias(request), 'default')
+        request.COOKIES[db_router.PIN_COOKIE] = str(time.time() - 60)
+        self.assertFalse(db_router.is_pinned(request))
+
+    def test_write_pins_browser(self):
+        author = User.objects.create_user(username='author')
+        user = User.objects.create_user(username='reader')
+        self.client.force_login(user)
+        response = self.client.get(f'/profile/{author.username}/follow/')
+        self.assertIn(db_router.PIN_COOKIE, response.cookies)
+        self.assertNotIn(
+            db_router.PIN_COOKIE, self.client.get('/').cookies)
+
+    def test_bumped_namespace_is_recent(self):
+        cache.clear()
+        self.assertFalse(recently_bumped(['index']))
+        bump('index')
+        self.assertTrue(recently_bumped(['index']))
+
+
+class SQLiteBackendTest(TestCase):
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_connection_gets_pragmas(self):
+        self.assertEqual(self.pragma('busy_timeout'), 5000)
+        self.assertEqual(self.pragma('cache_size'), -20000)
+        # temp_store: 2 — MEMORY.
+        self.assertEqual(self.pragma('temp_store'), 2)
+
+    def test_invalid_pragma_is_rejected(self):
+        with self.assertRaises(ImproperlyConfigured):
+            pragma_statements({'journal_mode': 'wal; DROP TABLE posts_post'})
+
+
+class SQLiteTransactionTest(TransactionTestCase):
+    def test_transactions_take_write_lock_immediately(self):
+        with CaptureQueriesContext(connection) as context:
+            with transaction.atomic():
+                Post.objects.exists()
+        self.assertEqual(context.captured_queries[0]['sql'], 'BEGIN IMMEDIATE')
+
+
+class SQLiteCacheTest(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'cache.sqlite3')
+        self.cache = self.make_cache()
+
+    def make_cache(self):
+        return SQLiteCache(
+            self.path, {'OPTIONS': {'COMPRESS_MIN_LENGTH': 100}})
+
+    def test_values_are_shared_between_instances(self):
+        other = self.make_cache()
+        self.cache.set_many({'a': 1, 'b': 'текст', 'c': None})
+        self.assertEqual(
+            other.get_many(['a', 'b', 'c', 'd']),
+            {'a': 1, 'b': 'текст', 'c': None})
+        other.delete('a')
+        self.assertIsNone(self.cache.get('a'))
+
+    def test_large_values_are_compressed(self):
+        value = 'пост ' * 1000
+        self.cache.set('page', value)
+        self.assertEqual(self.cache.get('page'), value)
+        (raw,) = self.cache._connection.execute(
+            'SELECT value FROM cache').fetchone()
+        self.assertTrue(raw.startswith(b'z'))
+        self.assertLess(len(raw), len(value))
+
+    def test_incr_add_and_expiry(self):
+        with self.assertRaises(ValueError):
+            self.cache.incr('version')
+        self.assertTrue(self.cache.add('version', 5, None))
+        self.assertFalse(self.cache.add('version', 1))
+        self.assertEqual(self.cache.incr('version'), 6)
+        self.assertEqual(self.make_cache().get('version'), 6)
+        self.cache.set('short', 1, -1)
+        self.assertFalse(self.cache.has_key('short'))
+        self.assertTrue(self.cache.add('short', 2))
+
+    def test_get_or_set_waits_for_lock_holder(self):
+        self.cache.add('page:lock', 1)
+        timer = threading.Timer(
+            0.1, lambda: self.make_cache().set('page', 'готово'))
+        timer.start()
+        self.addCleanup(timer.join)
+        self.assertEqual(
+            self.cache.get_or_set('page', lambda: 'заново'), 'готово')
+
+
+@override_settings(PAGE_CACHE_EARLY_BETA=0)
+class PageCacheTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.renders = 0
+        self.factory = RequestFactory()
+
+        @cache_page_versioned(60, 'page-test')
+        def view(request):
+            self.renders += 1
+            time.sleep(0.1)
+            return HttpResponse(f'отрисовка {self.renders}')
+
+        self.view = view
+
+    def get(self):
+        return self.view(self.factory.get('/page/')).content.decode()
+
+    def test_concurrent_misses_render_once(self):
+        responses = []
+        threads = [
+            threading.Thread(target=lambda: responses.append(self.get()))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.renders, 1)
+        self.assertEqual(responses, ['отрисовка 1'] * 5)
+
+    def test_stale_entry_is_served_during_refresh(self):
+        self.get()
+        key, (_, render_time, response) = _fetch(
+            self.factory.get('/page/'), _key_prefix(['page-test']))
+        cache.set(key, (time.time() - 1, render_time, response))
+        cache.add(_lock_key(key), 1)
+        self.assertEqual(self.get(), 'отрисовка 1')
+        cache.delete(_lock_key(key))
+        self.assertEqual(self.get(), 'отрисовка 2')
+        self.assertEqual(self.get(), 'отрисовка 2')
+
+    @override_settings(PAGE_CACHE_EARLY_BETA=1e9)
+    def test_expensive_entry_is_refreshed_early(self):
+        self.get()
+        self.assertEqual(self.get(), 'отрисовка 2')
+
+    def test_only_guest_responses_are_stored(self):
+        key_prefix = _key_prefix(['page-test'])
+        request = self.factory.get('/page/')
+        request.user = mock.Mock(is_authenticated=True)
+        _store(request, HttpResponse('своя'), 60, key_prefix,
+               time.perf_counter())
+        self.assertIsNone(_fetch(request, key_prefix)[1])
+        request.user = mock.Mock(is_authenticated=False)
+        _store(request, HttpResponse('общая'), 60, key_prefix,
+               time.perf_counter())
+        self.assertEqual(_fetch(request, key_prefix)[1][2].content,
+                         'общая'.encode())
+
+
+class ProxyHeadersTest(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.member = self.factory.get('/page/')
+        self.member.user = mock.Mock(is_authenticated=True)
+        self.guest = self.factory.get('/page/')
+        self.guest.user = mock.Mock(is_authenticated=False)
+
+    def view(self, response):
+        return proxy_cacheable(lambda request: ['page-test'])(
+            lambda request: response)
+
+    def test_guest_render_is_public(self):
+        response = self.view(HttpResponse())(self.guest)
+        self.assertIn('public', response['Cache-Control'])
+        self.assertTrue(response.has_header('Surrogate-Key'))
+
+    def test_member_render_is_private_for_guests(self):
+        rendered = mark_rendered_for(self.member, HttpResponse('своя'))
+        response = self.view(rendered)(self.guest)
+        self.assertIn('private', response['Cache-Control'])
+        self.assertNotIn('public', response['Cache-Control'])
+        self.assertFalse(response.has_header('Surrogate-Key'))
+
+
+class PurgeRecorder(BaseHTTPRequestHandler):
+    """Прокси-заглушка: запоминает запросы на сброс."""
+    requests = []
+
+    def do_PURGE(self):
+        self.requests.append(self.headers['Surrogate-Key'].split())
+        self.send_response(HTTPStatus.OK)
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class PurgeTest(TransactionTestCase):
+    def setUp(self):
+        server = HTTPServer(('127.0.0.1', 0), PurgeRecorder)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        PurgeRecorder.requests = []
+        proxy = override_settings(
+            PROXY_PURGER='core.purge.HTTPPurger',
+            PROXY_PURGE_URL=f'http://127.0.0.1:{server.server_port}/')
+        proxy.enable()
+        self.addCleanup(proxy.disable)
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+
+    def test_changes_purge_surrogate_keys(self):
+        post = Post.objects.create(author=self.author, text='Пост')
+        Comment.objects.create(post=post, author=self.reader, text='Да')
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(PurgeRecorder.requests, [
+            ['index', f'post-{post.pk}', 'profile-author'],
+            ['index', f'post-{post.pk}', 'profile-author', 'profile-reader'],
+            ['profile-author', 'profile-reader'],
+        ])
+
+    def test_purge_waits_for_commit(self):
+        with transaction.atomic():
+            Post.objects.create(author=self.author, text='Пост')
+            self.assertEqual(PurgeRecorder.requests, [])
+        self.assertEqual(len(PurgeRecorder.requests), 1)
+
+    @override_settings(PROXY_PURGE_URL='http://127.0.0.1:9/')
+    def test_unreachable_proxy_is_logged(self):
+        with self.assertLogs('core.purge', 'WARNING'):
+            Post.objects.create(author=self.author, text='Пост')
+
+
+CALLS = []
+
+
+@jobs.task(priority=1)
+def record_call(value):
+    CALLS.append(value)
+
+
+@jobs.task(max_attempts=2)
+def fail(value):
+    raise RuntimeError(value)
+
+
+@override_settings(JOBS_INLINE=False, JOBS_RETRY_DELAY=10)
+class JobQueueTest(TestCase):
+    def setUp(self):
+        CALLS.clear()
+
+    def test_jobs_run_by_priority(self):
+        fail.enqueue(value='низкий')
+        record_call.enqueue(value='первый')
+        record_call.enqueue(value='второй')
+        job = jobs.claim('w1')
+        self.assertEqual(job.name, 'core.tests.record_call')
+        self.assertEqual(jobs.run(job), 'done')
+        self.assertEqual(CALLS, ['первый'])
+        with self.assertLogs('core.jobs', 'ERROR'):
+            self.assertEqual(jobs.work('w1', burst=True), 2)
+        self.assertEqual(CALLS, ['первый', 'второй'])
+        self.assertEqual(Job.objects.get().name, 'core.tests.fail')
+
+    def test_failed_job_is_retried_with_backoff(self):
+        fail.enqueue(value='ошибка')
+        with self.assertLogs('core.jobs', 'ERROR'):
+            self.assertEqual(jobs.run(jobs.claim('w1')), 'retry')
+        job = Job.objects.get()
+        self.assertIn('RuntimeError: ошибка', job.last_error)
+        self.assertGreater(job.run_at, timezone.now())
+        self.assertIsNone(jobs.claim('w1'))
+        Job.objects.update(run_at=timezone.now())
+        with self.assertLogs('core.jobs', 'ERROR'):
+            self.assertEqual(jobs.run(jobs.claim('w1')), 'failed')
+        self.assertEqual(Job.objects.get().status, Job.FAILED)
+        self.assertIsNone(jobs.claim('w1'))
+
+    def test_claimed_job_is_hidden_until_timeout(self):
+        record_call.enqueue(value='один')
+        job = jobs.claim('w1')
+        self.assertIsNone(jobs.claim('w2'))
+        Job.objects.update(locked_until=timezone.now())
+        stolen = jobs.claim('w2')
+        self.assertEqual(stolen.attempts, 2)
+        self.assertEqual(jobs.run(job), 'done')
+        self.assertTrue(Job.objects.exists())
+        self.assertEqual(jobs.run(stolen), 'done')
+        self.assertFalse(Job.objects.exists())
+
+    def test_job_key_prevents_duplicates(self):
+        self.assertIsNotNone(record_call.enqueue(job_key='k', value=1))
+        self.assertIsNone(record_call.enqueue(job_key='k', value=2))
+        self.assertEqual(call_command('runworker', processes=1, burst=True,
+                                      stdout=StringIO()), None)
+        self.assertEqual(CALLS, [1])
+        self.assertIsNotNone(record_call.enqueue(job_key='k', value=3))
+
+    @override_settings(JOBS_INLINE=None)
+    def test_in_memory_database_runs_inline(self):
+        self.assertIsNone(record_call.enqueue(value='сразу'))
+        self.assertEqual(CALLS, ['сразу'])
+        self.assertFalse(Job.objects.exists())
+
+    @override_settings(JOBS_INLINE=True)
+    def test_inline_task_error_is_raised(self):
+        with self.assertRaisesMessage(RuntimeError, 'сразу'):
+            fail.enqueue(value='сразу')
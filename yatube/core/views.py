@@ -1,4 +1,9 @@
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
 from django.shortcuts import render
+from django.utils.crypto import constant_time_compare
+
+from . import metrics as metrics_registry
 
 
 def page_not_found(request, exception):
@@ -11,3 +16,23 @@ def csrf_failure(request, reason=''):
 
 def internal_server_error(request):
     return render(request, 'core/500.html', {'path': request.path}, status=500)
+
+
+def may_read_metrics(request):
+    if getattr(getattr(request, 'user', None), 'is_staff', False):
+        return True
+    token = settings.METRICS_TOKEN
+    if token and constant_time_compare(
+            request.META.get('HTTP_AUTHORIZATION', ''), f'Bearer {token}'):
+        return True
+    allowed = settings.METRICS_ALLOWED_IPS
+    return allowed is None or request.META.get('REMOTE_ADDR') in allowed
+
+
+def metrics(request):
+    if not may_read_metrics(request):
+        return HttpResponseForbidden()
+    return HttpResponse(
+        metrics_registry.render(),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
@@ -1,14 +1,67 @@
 from django.contrib import admin
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponseBadRequest, StreamingHttpResponse
+from django.urls import path
 
+from . import export, search
 from .models import Post, Group, Comment, Follow
 
 
-class PostAdmin(admin.ModelAdmin):
+class ExportMixin:
+    """Страница ``export/`` со списком модели: потоковая выгрузка таблицы
+    ``export_table``. Параметры: ``format`` (ndjson, csv), ``gzip``,
+    ``after`` и ``until`` — границы по id."""
+    export_table = None
+
+    def get_urls(self):
+        opts = self.model._meta
+        return [
+            path(
+                'export/',
+                self.admin_site.admin_view(self.export_view),
+                name=f'{opts.app_label}_{opts.model_name}_export',
+            ),
+        ] + super().get_urls()
+
+    def export_view(self, request):
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        try:
+            exporter = export.Export(
+                self.export_table,
+                fmt=request.GET.get('format', 'ndjson'),
+                after=_int_or_none(request.GET.get('after')),
+                until=_int_or_none(request.GET.get('until')),
+                compress='gzip' in request.GET,
+            )
+        except ValueError as exc:
+            return HttpResponseBadRequest(str(exc))
+        response = StreamingHttpResponse(
+            exporter, content_type=exporter.content_type)
+        response['Content-Disposition'] = (
+            f'attachment; filename="{exporter.filename}"')
+        return response
+
+
+def _int_or_none(value):
+    return None if value in (None, '') else int(value)
+
+
+class PostAdmin(ExportMixin, admin.ModelAdmin):
     list_display = ('pk', 'text', 'pub_date', 'author', 'group',)
     list_editable = ('group',)
     search_fields = ('text',)
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
+    export_table = 'posts'
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term or not search.available():
+            return super().get_search_results(
+                request, queryset, search_term)
+        if not search.match_expression(search_term):
+            return queryset.none(), False
+        return queryset.filter(pk__in=search.matching_ids(search_term)), False
 
 
 admin.site.register(Post, PostAdmin)
@@ -17,7 +70,15 @@ admin.site.register(Post, PostAdmin)
 admin.site.register(Group)
 
 
-admin.site.register(Comment)
+class CommentAdmin(ExportMixin, admin.ModelAdmin):
+    export_table = 'comments'
+
+
+admin.site.register(Comment, CommentAdmin)
+
+
+class FollowAdmin(ExportMixin, admin.ModelAdmin):
+    export_table = 'follows'
 
 
-admin.site.register(Follow)
+admin.site.register(Follow, FollowAdmin)
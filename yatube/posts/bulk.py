@@ -0,0 +1,94 @@
+"""Пакетная запись постов, комментариев и подписок.
+
+``bulk_create`` не посылает сигналов, поэтому то, что для одной записи
+делают обработчики ``posts.signals``, здесь делается один раз на пакет:
+счётчики меняются одним UPDATE на каждое приращение, кеш сбрасывается
+одним ``bump``, раскладка по лентам и прогрев страниц ставятся одной
+задачей. Объекты приходят проверенными, со ссылками на связанные объекты;
+вызывающий код пишет их внутри одной транзакции.
+"""
+from collections import Counter
+
+from django.db.models import Max
+
+from core import cache
+from . import search, stats, tasks, threads, timeline
+from .models import Comment, Follow, Post
+from .signals import (
+    comment_namespaces, follow_namespaces, post_namespaces, warm_post_pages)
+
+
+def _insert(model, objs, unique=None):
+    """``bulk_create``, после которого у объектов есть первичные ключи.
+
+    Django 2.2 возвращает ключи из ``bulk_create`` только на PostgreSQL.
+    На SQLite новые строки — это строки после прежнего наибольшего ключа:
+    запись в базу в каждый момент ведёт одна транзакция, поэтому чужих строк
+    между ними нет.
+
+    С ``unique`` — полями уникального ограничения — строки, которые уже
+    есть в базе, отбрасываются; возвращаются только вставленные объекты,
+    ключ узнаётся по значениям этих полей.
+    """
+    last_pk = model.objects.aggregate(last=Max('pk'))['last'] or 0
+    model.objects.bulk_create(objs, ignore_conflicts=unique is not None)
+    if not objs or objs[0].pk is not None:
+        return objs
+    rows = model.objects.filter(pk__gt=last_pk).order_by('pk')
+    if unique is None:
+        for obj, pk in zip(objs, rows.values_list('pk', flat=True)):
+            obj.pk = pk
+        return objs
+    pks = {
+        tuple(values[:-1]): values[-1]
+        for values in rows.values_list(*unique, 'pk')}
+    for obj in objs:
+        obj.pk = pks.get(tuple(getattr(obj, name) for name in unique))
+    return [obj for obj in objs if obj.pk is not None]
+
+
+def create_posts(posts):
+    _insert(Post, posts)
+    stats.change_many(
+        'posts_count', Counter(post.author_id for post in posts))
+    search.index_new_posts(posts)
+    tasks.fan_out_posts.enqueue(post_ids=[post.pk for post in posts])
+    cache.bump(*{
+        namespace for post in posts for namespace in post_namespaces(post)})
+    warm_post_pages(posts)
+    return posts
+
+
+def create_comments(comments):
+    for comment in comments:
+        if comment.parent is not None:
+            comment.depth = comment.parent.depth + 1
+    _insert(Comment, comments)
+    for comment in comments:
+        comment.path = threads.path_for(comment)
+    Comment.objects.bulk_update(comments, ['path'], batch_size=500)
+    stats.change_many(
+        'comments_count', Counter(comment.author_id for comment in comments))
+    stats.change_comment_counts(
+        Counter(comment.post_id for comment in comments))
+    cache.bump(*{
+        namespace for comment in comments
+        for namespace in comment_namespaces(comment)})
+    return comments
+
+
+def create_follows(follows):
+    """Подписки, которых ещё нет; повторы, в том числе записанные
+    параллельно, отбрасываются базой и остаются без ключа. Возвращает
+    вставленные подписки."""
+    follows = _insert(Follow, follows, unique=('user_id', 'author_id'))
+    stats.change_many(
+        'followers_count', Counter(follow.author_id for follow in follows))
+    stats.change_many(
+        'following_count', Counter(follow.user_id for follow in follows))
+    for follow in follows:
+        timeline.backfill(follow)
+    cache.bump(*{
+        namespace for follow in follows
+        for namespace in follow_namespaces(follow)})
+    return follows
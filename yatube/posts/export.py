@@ -0,0 +1,143 @@
+"""Потоковая выгрузка постов, комментариев и подписок в NDJSON или CSV.
+
+Строки читаются по возрастанию ``id`` через ``values_list(...).iterator()``
+порциями по ``EXPORT_CHUNK_SIZE``, без моделей и без загрузки таблицы в
+память, и сразу кодируются в байты. Выгрузку можно продолжить с места
+обрыва: ``after`` — последний выгруженный ``id``, ``until`` — последний
+нужный. С ``compress`` поток сжимается в gzip на лету.
+
+Выгрузку пишут команда ``export_posts`` и страница ``export/`` в админке
+постов, комментариев и подписок.
+"""
+import csv
+import json
+import zlib
+
+from django.conf import settings
+
+from .models import Comment, Follow, Post
+
+# Столбцы выгрузки: имя и путь поля для values_list.
+TABLES = {
+    'posts': (Post, (
+        ('id', 'id'),
+        ('author', 'author__username'),
+        ('group', 'group__slug'),
+        ('text', 'text'),
+        ('pub_date', 'pub_date'),
+        ('updated', 'updated'),
+        ('image', 'image'),
+        ('comment_count', 'comment_count'),
+    )),
+    'comments': (Comment, (
+        ('id', 'id'),
+        ('post', 'post'),
+        ('parent', 'parent'),
+        ('depth', 'depth'),
+        ('author', 'author__username'),
+        ('text', 'text'),
+        ('created', 'created'),
+    )),
+    'follows': (Follow, (
+        ('id', 'id'),
+        ('user', 'user__username'),
+        ('author', 'author__username'),
+    )),
+}
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+# Сколько байт копить перед тем, как отдать кусок потока.
+BUFFER_SIZE = 64 * 1024
+
+
+class Line:
+    """Файлоподобный объект для ``csv.writer``: возвращает записанное."""
+
+    def write(self, value):
+        return value
+
+
+def _value(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+class Export:
+    """Итератор по байтам выгрузки таблицы ``name``.
+
+    После обхода ``count`` — число выгруженных строк, ``last_id`` — ``id``
+    последней из них, с которого выгрузку можно продолжить.
+    """
+
+    def __init__(self, name, fmt='ndjson', after=None, until=None,
+                 compress=False, chunk_size=None):
+        if name not in TABLES:
+            raise ValueError(f'Неизвестная таблица {name}')
+        if fmt not in FORMATS:
+            raise ValueError(f'Неизвестный формат {fmt}')
+        self.name = name
+        self.fmt = fmt
+        self.after = after
+        self.until = until
+        self.compress = compress
+        self.chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+        self.count = 0
+        self.last_id = after
+
+    @property
+    def content_type(self):
+        return 'application/gzip' if self.compress else FORMATS[self.fmt]
+
+    @property
+    def filename(self):
+        return f'{self.name}.{self.fmt}' + ('.gz' if self.compress else '')
+
+    def rows(self):
+        model, columns = TABLES[self.name]
+        queryset = model.objects.order_by('pk')
+        if self.after is not None:
+            queryset = queryset.filter(pk__gt=self.after)
+        if self.until is not None:
+            queryset = queryset.filter(pk__lte=self.until)
+        return queryset.values_list(
+            *(path for _, path in columns)
+        ).iterator(chunk_size=self.chunk_size)
+
+    def lines(self):
+        names = [name for name, _ in TABLES[self.name][1]]
+        if self.fmt == 'csv':
+            writer = csv.writer(Line())
+            yield writer.writerow(names)
+        for row in self.rows():
+            self.count += 1
+            self.last_id = row[0]
+            values = [_value(value) for value in row]
+            if self.fmt == 'csv':
+                yield writer.writerow(
+                    ['' if value is None else value for value in values])
+            else:
+                yield json.dumps(
+                    dict(zip(names, values)), ensure_ascii=False) + '\n'
+
+    def __iter__(self):
+        compressor = (
+            zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+            if self.compress else None)
+        buffer = []
+        size = 0
+        for line in self.lines():
+            data = line.encode()
+            buffer.append(data)
+            size += len(data)
+            if size >= BUFFER_SIZE:
+                chunk = b''.join(buffer)
+                buffer, size = [], 0
+                chunk = compressor.compress(chunk) if compressor else chunk
+                if chunk:
+                    yield chunk
+        chunk = b''.join(buffer)
+        if compressor:
+            chunk = compressor.compress(chunk) + compressor.flush()
+        if chunk:
+            yield chunk
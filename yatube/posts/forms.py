@@ -1,5 +1,7 @@
 from django import forms
 
+from . import threads
+
 from .models import Comment, Post
 
 
@@ -30,3 +32,13 @@ class CommentForm(forms.ModelForm):
     class Meta:
         model = Comment
         fields = ('text',)
+
+    def __init__(self, *args, parent=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.instance.parent = parent
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if self.instance.parent is not None:
+            threads.check_reply(self.instance.parent)
+        return cleaned_data
@@ -0,0 +1,182 @@
+import os
+import threading
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from core import benchmark
+from core.cache import bump
+from posts.models import Group, Post, User
+
+SCENARIOS = (
+    'index', 'group_posts', 'profile', 'post_detail', 'comments',
+    'follow_index', 'api_posts', 'add_comment', 'post_create',
+)
+SAMPLE_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный прогон страниц постов: перцентили задержки, RPS и '
+        'число SQL-запросов, сравнение с базовой линией'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--clients', type=int, default=4,
+            help='Параллельных клиентов')
+        parser.add_argument(
+            '--requests', type=int, default=50,
+            help='Запросов на клиента в каждом сценарии')
+        parser.add_argument(
+            '--scenario', action='append', choices=SCENARIOS,
+            help='Сценарий; по умолчанию все')
+        parser.add_argument(
+            '--pages', type=int, default=5,
+            help='Из скольких первых страниц выбирать номер страницы')
+        parser.add_argument(
+            '--no-cache', action='store_true',
+            help='Прогон с DummyCache вместо настроенного кеша')
+        parser.add_argument(
+            '--anonymous', action='store_true',
+            help='Клиенты без входа: общий кеш страниц для всех')
+        parser.add_argument(
+            '--invalidate-every', type=float, metavar='SECONDS',
+            help='Сбрасывать кеш страниц постов с таким периодом во время '
+                 'прогона, как это делают новые посты')
+        parser.add_argument(
+            '--baseline', help='JSON-файл базовой линии для сравнения')
+        parser.add_argument(
+            '--save-baseline', action='store_true',
+            help='Записать результаты в файл --baseline')
+        parser.add_argument(
+            '--tolerance', type=float, default=0.2,
+            help='Допустимое ухудшение относительно базовой линии (доля)')
+        parser.add_argument('--seed', type=int, dest='random_seed')
+
+    def handle(self, *args, **options):
+        post_ids = list(Post.objects.order_by('-pub_date').values_list(
+            'pk', flat=True)[:SAMPLE_SIZE])
+        # Самые обсуждаемые посты: глубокие и широкие ветки комментариев.
+        discussed_ids = list(Post.objects.filter(
+            comment_count__gt=0).order_by('-comment_count').values_list(
+            'pk', flat=True)[:SAMPLE_SIZE]) or post_ids
+        slugs = list(Group.objects.values_list('slug', flat=True)[
+            :SAMPLE_SIZE])
+        group_ids = list(Group.objects.values_list('pk', flat=True)[
+            :SAMPLE_SIZE])
+        usernames = list(User.objects.filter(
+            posts__isnull=False).distinct().values_list(
+            'username', flat=True)[:SAMPLE_SIZE])
+        reader = User.objects.filter(
+            stats__following_count__gt=0
+        ).order_by('-stats__following_count').first()
+        if not post_ids or not slugs or reader is None:
+            raise CommandError(
+                'Нет данных для прогона; заполните базу командой seed_posts')
+
+        def page(rng):
+            return {'page': rng.randint(1, options['pages'])}
+
+        scenarios = {
+            'index': benchmark.Scenario(
+                'index', 'get',
+                lambda rng: (reverse('posts:index'), page(rng))),
+            'group_posts': benchmark.Scenario(
+                'group_posts', 'get',
+                lambda rng: (reverse(
+                    'posts:group_list', args=[rng.choice(slugs)]), page(rng))),
+            'profile': benchmark.Scenario(
+                'profile', 'get',
+                lambda rng: (reverse(
+                    'posts:profile', args=[rng.choice(usernames)]),
+                    page(rng))),
+            'post_detail': benchmark.Scenario(
+                'post_detail', 'get',
+                lambda rng: (reverse(
+                    'posts:post_detail', args=[rng.choice(post_ids)]), None)),
+            'comments': benchmark.Scenario(
+                'comments', 'get',
+                lambda rng: (reverse(
+                    'posts:post_comments', args=[rng.choice(discussed_ids)]),
+                    page(rng))),
+            'follow_index': benchmark.Scenario(
+                'follow_index', 'get',
+                lambda rng: (reverse('posts:follow_index'), page(rng))),
+            'api_posts': benchmark.Scenario(
+                'api_posts', 'get',
+                lambda rng: (reverse('api:posts'), page(rng))),
+            'add_comment': benchmark.Scenario(
+                'add_comment', 'post',
+                lambda rng: (
+                    reverse('posts:add_comment', args=[rng.choice(post_ids)]),
+                    {'text': 'Комментарий нагрузочного прогона'})),
+            'post_create': benchmark.Scenario(
+                'post_create', 'post',
+                lambda rng: (
+                    reverse('posts:post_create'),
+                    {'text': 'Пост нагрузочного прогона',
+                     'group': rng.choice(group_ids)})),
+        }
+
+        def client_factory():
+            client = Client(HTTP_HOST='localhost')
+            if not options['anonymous']:
+                client.force_login(reader)
+            return client
+
+        overrides = {}
+        if options['no_cache']:
+            overrides['CACHES'] = {'default': {
+                'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+        with override_settings(**overrides):
+            results = self.run_scenarios(
+                [scenarios[name] for name in options['scenario'] or SCENARIOS],
+                client_factory, options)
+
+        path = options['baseline']
+        if not path:
+            return
+        if options['save_baseline']:
+            benchmark.save_baseline(path, results)
+            self.stdout.write(f'Базовая линия записана в {path}')
+            return
+        if not os.path.exists(path):
+            raise CommandError(f'Нет файла базовой линии {path}')
+        regressions = benchmark.compare(
+            results, benchmark.load_baseline(path), options['tolerance'])
+        if regressions:
+            raise CommandError(
+                'Хуже базовой линии:\n' + '\n'.join(regressions))
+        self.stdout.write(self.style.SUCCESS('Не хуже базовой линии'))
+
+    def run_scenarios(self, scenarios, client_factory, options):
+        results = {}
+        stop = threading.Event()
+        if options['invalidate_every']:
+            threading.Thread(
+                target=self.invalidate, daemon=True,
+                args=(options['invalidate_every'], stop)).start()
+        try:
+            for scenario in scenarios:
+                results[scenario.name] = benchmark.run(
+                    scenario, options['clients'], options['requests'],
+                    client_factory, options['random_seed'])
+                self.report(scenario.name, results[scenario.name])
+        finally:
+            stop.set()
+        return results
+
+    def invalidate(self, period, stop):
+        while not stop.wait(period):
+            bump('index', 'groups')
+
+    def report(self, name, result):
+        self.stdout.write(
+            f"{name:<13} p50 {result['p50']:7.1f} мс  "
+            f"p95 {result['p95']:7.1f} мс  p99 {result['p99']:7.1f} мс  "
+            f"{result['rps']:7.1f} rps  "
+            f"{result['queries']:5.1f} SQL/запрос  "
+            f"ошибок {result['errors']}/{result['requests']}"
+        )
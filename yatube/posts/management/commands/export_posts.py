@@ -0,0 +1,58 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import export
+
+
+class Command(BaseCommand):
+    help = (
+        'Потоково выгружает посты, комментарии или подписки в NDJSON или '
+        'CSV; выгрузку можно продолжить с последнего id'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'table', nargs='?', default='posts', choices=export.TABLES)
+        parser.add_argument(
+            '--format', default='ndjson', choices=export.FORMATS,
+            dest='fmt')
+        parser.add_argument(
+            '--output', default='-',
+            help='Файл выгрузки; по умолчанию стандартный вывод')
+        parser.add_argument(
+            '--gzip', action='store_true', help='Сжать выгрузку gzip')
+        parser.add_argument(
+            '--after-id', type=int,
+            help='Начать после этого id (продолжение выгрузки)')
+        parser.add_argument(
+            '--until-id', type=int, help='Закончить на этом id')
+        parser.add_argument(
+            '--chunk-size', type=int,
+            help='Строк за одно чтение из базы; по умолчанию '
+                 'EXPORT_CHUNK_SIZE')
+
+    def handle(self, *args, **options):
+        exporter = export.Export(
+            options['table'],
+            fmt=options['fmt'],
+            after=options['after_id'],
+            until=options['until_id'],
+            compress=options['gzip'],
+            chunk_size=options['chunk_size'],
+        )
+        if options['output'] == '-':
+            if options['gzip'] and sys.stdout.isatty():
+                raise CommandError('Сжатая выгрузка не выводится в терминал')
+            self.write(exporter, sys.stdout.buffer)
+        else:
+            with open(options['output'], 'wb') as output:
+                self.write(exporter, output)
+        self.stderr.write(
+            f'Выгружено строк: {exporter.count}, последний id: '
+            f'{exporter.last_id}')
+
+    def write(self, exporter, output):
+        for chunk in exporter:
+            output.write(chunk)
+        output.flush()
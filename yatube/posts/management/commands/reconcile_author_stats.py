@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from posts import stats, tasks
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает счётчики постов, комментариев и подписок авторов '
+            'и число комментариев постов')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--enqueue', action='store_true',
+            help='Поставить пересчёт в очередь задач, а не выполнять сразу')
+
+    def handle(self, *args, **options):
+        if options['enqueue']:
+            tasks.reconcile_stats.enqueue(job_key='reconcile_stats')
+            self.stdout.write('Пересчёт поставлен в очередь')
+            return
+        fixed = stats.reconcile()
+        self.stdout.write(f'Исправлено записей: {fixed}')
@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand
+
+from posts import seed
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет базу пользователями, группами, постами с картинками, '
+        'комментариями и подписками для нагрузочных тестов'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--groups', type=int, default=10)
+        parser.add_argument('--posts', type=int, default=1000)
+        parser.add_argument('--comments', type=int, default=2000)
+        parser.add_argument(
+            '--replies', type=int, default=0,
+            help='Ответов на комментарии: глубокие и широкие ветки')
+        parser.add_argument(
+            '--follows', type=int, default=10,
+            help='Подписок на пользователя')
+        parser.add_argument(
+            '--images', type=int, default=10,
+            help='Разных картинок на весь набор')
+        parser.add_argument(
+            '--image-ratio', type=float, default=0.3,
+            help='Доля постов с картинкой')
+        parser.add_argument(
+            '--alpha', type=float, default=1.2,
+            help='Показатель степенного закона популярности авторов')
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='За сколько дней разбросаны даты постов')
+        parser.add_argument('--seed', type=int, dest='random_seed')
+        parser.add_argument(
+            '--prefix', default='seed',
+            help='Префикс имён пользователей и слагов групп')
+
+    def handle(self, *args, **options):
+        created = seed.seed(
+            users=options['users'],
+            groups=options['groups'],
+            posts=options['posts'],
+            comments=options['comments'],
+            replies=options['replies'],
+            follows=options['follows'],
+            images=options['images'],
+            image_ratio=options['image_ratio'],
+            alpha=options['alpha'],
+            days=options['days'],
+            random_seed=options['random_seed'],
+            prefix=options['prefix'],
+        )
+        for name, count in created.items():
+            self.stdout.write(f'{name}: {count}')
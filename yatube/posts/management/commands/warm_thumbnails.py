@@ -0,0 +1,40 @@
+from collections import Counter
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Нарезает недостающие варианты картинок постов и сравнивает объём '
+        'вариантов с исходными файлами'
+    )
+
+    def handle(self, *args, **options):
+        created = 0
+        original_size = 0
+        variant_sizes = Counter()
+        posts = Post.objects.exclude(image='').only(
+            'pk', 'image', 'image_variants')
+        for post in posts.iterator():
+            try:
+                created += thumbnails.process(Post, post.pk, post.image.name)
+            except Exception as error:
+                self.stderr.write(f'{post.image.name}: {error}')
+                continue
+            post.refresh_from_db(fields=['image_variants'])
+            smallest = {}
+            for variant in post.variants:
+                width = variant['width']
+                smallest[width] = min(
+                    smallest.get(width, variant['size']), variant['size'])
+            if smallest:
+                original_size += default_storage.size(post.image.name)
+                variant_sizes.update(smallest)
+        self.stdout.write(f'Нарезано картинок: {created}')
+        self.stdout.write(f'Исходные файлы: {original_size} байт')
+        for width, size in sorted(variant_sizes.items()):
+            self.stdout.write(f'Ширина {width}: {size} байт')
@@ -1,8 +1,10 @@
-from django.db import models
+from django.conf import settings
+from django.db import models, transaction
 from django.db.models import constraints
 from django.contrib.auth import get_user_model
 
 from core.models import CreatedModel
+from . import threads, thumbnails
 
 User = get_user_model()
 
@@ -21,6 +23,7 @@ class Post(models.Model):
                             help_text="Обязательное поле,\
                              не должно быть пустым")
     pub_date = models.DateTimeField("date published", auto_now_add=True)
+    updated = models.DateTimeField('Дата изменения', auto_now=True)
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -42,14 +45,61 @@ class Post(models.Model):
         upload_to='posts/',
         blank=True
     )
+    image_variants = models.TextField(
+        'Варианты картинки',
+        blank=True,
+        editable=False,
+    )
+    comment_count = models.PositiveIntegerField(
+        'Число комментариев',
+        default=0,
+        editable=False,
+    )
+
+    _saved_image = ''
 
     class Meta:
         ordering = ['-pub_date']
         default_related_name = 'posts'
+        indexes = (
+            models.Index(fields=('pub_date', 'id'), name='post_pub_date_idx'),
+            models.Index(
+                fields=('group', 'pub_date'), name='post_group_pub_date_idx'),
+            models.Index(
+                fields=('author', 'pub_date'),
+                name='post_author_pub_date_idx',
+            ),
+        )
 
     def __str__(self) -> str:
         return self.text
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        post = super().from_db(db, field_names, values)
+        if 'image' in field_names:
+            post._saved_image = values[field_names.index('image')]
+        return post
+
+    @property
+    def variants_ready(self):
+        source, _ = thumbnails.parse_variants(self.image_variants)
+        return source == self.image.name
+
+    @property
+    def variants(self):
+        source, variants = thumbnails.parse_variants(self.image_variants)
+        return variants if source == self.image.name else []
+
+    def save(self, *args, **kwargs):
+        image_changed = self.image.name != self._saved_image
+        if image_changed:
+            self.image_variants = ''
+        super().save(*args, **kwargs)
+        self._saved_image = self.image.name
+        if image_changed and self.image:
+            thumbnails.schedule(self)
+
 
 class Comment(CreatedModel):
     post = models.ForeignKey(
@@ -69,15 +119,50 @@ class Comment(CreatedModel):
         verbose_name='Текст',
         help_text='Введите текст'
     )
+    parent = models.ForeignKey(
+        'self',
+        on_delete=models.CASCADE,
+        blank=True,
+        null=True,
+        related_name='replies',
+        verbose_name='Ответ на комментарий',
+    )
+    depth = models.PositiveSmallIntegerField(
+        'Глубина', default=0, editable=False)
+    path = models.CharField(
+        'Путь в ветке',
+        max_length=threads.PATH_MAX_LENGTH,
+        blank=True,
+        editable=False,
+    )
 
     class Meta:
-        ordering = ['-created']
+        ordering = ['path']
+        indexes = (
+            models.Index(
+                fields=('post', 'path'), name='comment_post_path_idx'),
+        )
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
 
     def __str__(self):
         return self.text[:15]
 
+    @property
+    def accepts_replies(self):
+        return self.depth < settings.COMMENT_MAX_DEPTH
+
+    def save(self, *args, **kwargs):
+        if self._state.adding and self.parent_id is not None:
+            self.depth = self.parent.depth + 1
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if not self.path:
+                # В путь входит первичный ключ, известный только после
+                # вставки.
+                self.path = threads.path_for(self)
+                Comment.objects.filter(pk=self.pk).update(path=self.path)
+
 
 class Follow(models.Model):
     user = models.ForeignKey(
@@ -100,8 +185,67 @@ class Follow(models.Model):
             constraints.UniqueConstraint(
                 fields=('user', 'author'), name='follow_unique'),
         )
+        indexes = (
+            models.Index(
+                fields=('author', 'user'), name='follow_author_user_idx'),
+        )
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
 
     def __str__(self):
         return self.user.username, self.author.username
+
+
+class TimelineEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Подписчик',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост',
+    )
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        ordering = ['-pub_date']
+        indexes = (
+            models.Index(
+                fields=('user', '-pub_date', '-post'),
+                name='timeline_user_date_idx',
+            ),
+        )
+        constraints = (
+            constraints.UniqueConstraint(
+                fields=('user', 'post'), name='timeline_unique'),
+        )
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Ленты подписок'
+
+    def __str__(self):
+        return f'{self.user_id}: {self.post_id}'
+
+
+class AuthorStats(models.Model):
+    author = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Автор',
+    )
+    posts_count = models.PositiveIntegerField('Постов', default=0)
+    comments_count = models.PositiveIntegerField('Комментариев', default=0)
+    followers_count = models.PositiveIntegerField('Подписчиков', default=0)
+    following_count = models.PositiveIntegerField('Подписок', default=0)
+
+    class Meta:
+        verbose_name = 'Статистика автора'
+        verbose_name_plural = 'Статистика авторов'
+
+    def __str__(self):
+        return str(self.author_id)
@@ -0,0 +1,198 @@
+"""Полнотекстовый поиск по постам.
+
+На SQLite текст постов хранится в виртуальной таблице FTS5 ``posts_post_fts``
+(``rowid`` совпадает с ``id`` поста), поэтому поиск — это обращение к
+индексу с ранжированием по BM25 и готовыми фрагментами. Таблица обновляется
+сигналами ``Post`` и пересобирается командой ``rebuild_search_index``. На
+остальных СУБД поиск сводится к ``icontains`` без ранжирования.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+from django.utils.text import Truncator
+
+TABLE = 'posts_post_fts'
+
+# Маркеры совпадений в выдаче snippet(); заменяются на <mark> после escape.
+MARK_START = '\x02'
+MARK_END = '\x03'
+
+WORD_RE = re.compile(r'\w+')
+
+
+def available(conn=None):
+    return (conn or connection).vendor == 'sqlite'
+
+
+def create_table(conn=None):
+    with (conn or connection).cursor() as cursor:
+        cursor.execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5('
+            "text, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+
+
+def drop_table(conn=None):
+    with (conn or connection).cursor() as cursor:
+        cursor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+
+
+def rebuild(conn=None):
+    """Заново заполняет индекс из таблицы постов; возвращает число постов."""
+    conn = conn or connection
+    with conn.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE}')
+        cursor.execute(
+            f'INSERT INTO {TABLE} (rowid, text) '
+            'SELECT id, text FROM posts_post'
+        )
+        cursor.execute(f'SELECT count(*) FROM {TABLE}')
+        count = cursor.fetchone()[0]
+        cursor.execute(f"INSERT INTO {TABLE} ({TABLE}) VALUES ('optimize')")
+    return count
+
+
+def index_post(post):
+    if not available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s', [post.pk])
+        cursor.execute(
+            f'INSERT INTO {TABLE} (rowid, text) VALUES (%s, %s)',
+            [post.pk, post.text],
+        )
+
+
+def index_new_posts(posts):
+    """Добавляет в индекс только что созданные посты одним executemany."""
+    if not available() or not posts:
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {TABLE} (rowid, text) VALUES (%s, %s)',
+            [(post.pk, post.text) for post in posts],
+        )
+
+
+def remove_post(pk):
+    if not available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s', [pk])
+
+
+def match_expression(query):
+    """Запрос читателя как выражение FTS5: все слова, по префиксу.
+
+    Синтаксис FTS5 читателю недоступен, поэтому кавычки и операторы в
+    запросе не могут сломать выражение.
+    """
+    return ' '.join(f'"{word}"*' for word in WORD_RE.findall(query))
+
+
+def matching_ids(query):
+    """Выражение для ``pk__in``: id постов, подходящих под запрос.
+
+    В запросе должно быть хотя бы одно слово: пустое выражение FTS5 —
+    синтаксическая ошибка.
+    """
+    return RawSQL(
+        f'SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s',
+        [match_expression(query)],
+    )
+
+
+def highlight(snippet):
+    return mark_safe(
+        escape(snippet)
+        .replace(MARK_START, '<mark>')
+        .replace(MARK_END, '</mark>')
+    )
+
+
+class SearchResults:
+    """Ранжированная выдача для ``Paginator``.
+
+    Срез выполняет один запрос к FTS5 и одну выборку постов; у постов
+    появляются ``snippet`` и ``rank``. Выдача ограничена
+    ``SEARCH_MAX_RESULTS``.
+    """
+
+    def __init__(self, query, queryset):
+        self.query = query
+        self.expression = match_expression(query)
+        self.queryset = queryset
+        self.limit = settings.SEARCH_MAX_RESULTS
+        self._count = None
+
+    def count(self):
+        if self._count is None:
+            self._count = self._fetch_count() if self.expression else 0
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            raise TypeError('SearchResults поддерживает только срезы')
+        start = index.start or 0
+        stop = min(self.limit, self.count() if index.stop is None
+                   else index.stop)
+        if not self.expression or stop <= start:
+            return []
+        if available():
+            return self._fetch_ranked(start, stop)
+        return self._fetch_plain(start, stop)
+
+    def _fetch_count(self):
+        if not available():
+            return self._plain_queryset()[:self.limit].count()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT count(*) FROM (SELECT 1 FROM {TABLE} '
+                f'WHERE {TABLE} MATCH %s LIMIT %s)',
+                [self.expression, self.limit],
+            )
+            return cursor.fetchone()[0]
+
+    def _fetch_ranked(self, start, stop):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid, snippet({TABLE}, 0, %s, %s, %s, %s), rank '
+                f'FROM {TABLE} WHERE {TABLE} MATCH %s '
+                'ORDER BY rank LIMIT %s OFFSET %s',
+                [
+                    MARK_START, MARK_END, '…',
+                    settings.SEARCH_SNIPPET_WORDS,
+                    self.expression, stop - start, start,
+                ],
+            )
+            rows = cursor.fetchall()
+        posts = self.queryset.in_bulk([pk for pk, _, _ in rows])
+        results = []
+        for pk, snippet, rank in rows:
+            post = posts.get(pk)
+            if post is not None:
+                post.snippet = highlight(snippet)
+                post.rank = rank
+                results.append(post)
+        return results
+
+    def _plain_queryset(self):
+        queryset = self.queryset
+        for word in WORD_RE.findall(self.query):
+            queryset = queryset.filter(text__icontains=word)
+        return queryset.order_by('-pub_date', '-pk')
+
+    def _fetch_plain(self, start, stop):
+        posts = list(self._plain_queryset()[start:stop])
+        for post in posts:
+            post.snippet = Truncator(post.text).words(
+                settings.SEARCH_SNIPPET_WORDS)
+            post.rank = None
+        return posts
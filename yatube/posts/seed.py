@@ -0,0 +1,209 @@
+"""Генератор правдоподобного набора данных для нагрузочных тестов.
+
+Всё создаётся через ``bulk_create``, поэтому сигналы не срабатывают: после
+вставки лента подписок, счётчики авторов и поисковый индекс досчитываются
+отдельно. Подписки распределены по степенному закону: у немногих авторов
+очень много подписчиков, у большинства — единицы.
+"""
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+from io import BytesIO
+from itertools import accumulate
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from PIL import Image
+
+from . import search, stats, threads, timeline
+from .models import Comment, Follow, Group, Post, User
+
+WORDS = (
+    'утро город река лес дорога письмо друг работа книга море солнце '
+    'дождь окно кофе поезд музыка вечер сад снег ветер дом праздник '
+    'история встреча мечта новость фото кот собака прогулка'
+).split()
+
+
+@contextmanager
+def explicit_dates(*fields):
+    """Позволяет задать даты полям с ``auto_now_add`` при вставке."""
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def sentence(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize()
+
+
+def power_law_weights(count, alpha):
+    """Накопленные веса Ципфа для ``random.choices(cum_weights=...)``."""
+    return list(accumulate(
+        1 / (rank ** alpha) for rank in range(1, count + 1)))
+
+
+def make_images(rng, count, prefix):
+    names = []
+    for number in range(count):
+        buffer = BytesIO()
+        color = tuple(rng.randrange(256) for _ in range(3))
+        Image.new('RGB', (1200, 800), color).save(buffer, 'JPEG')
+        names.append(default_storage.save(
+            f'posts/{prefix}-{number}.jpg', ContentFile(buffer.getvalue())))
+    return names
+
+
+def add_replies(rng, replies, user_ids, parents, now):
+    """Отвечает на ``parents`` волнами: каждая волна — половина оставшихся
+    ответов на комментарии предыдущей волны с весами Ципфа. Так получаются
+    и широкие ветки (много ответов на один комментарий), и глубокие."""
+    created = 0
+    for depth in range(1, settings.COMMENT_MAX_DEPTH + 1):
+        left = replies - created
+        if not left or not parents:
+            break
+        count = left if depth == settings.COMMENT_MAX_DEPTH else (
+            left + 1) // 2
+        rng.shuffle(parents)
+        chosen = rng.choices(
+            parents, cum_weights=power_law_weights(len(parents), 1.0),
+            k=count)
+        last_id = Comment.objects.aggregate(last=Max('pk'))['last']
+        Comment.objects.bulk_create(
+            [
+                Comment(
+                    post_id=parent.post_id,
+                    parent_id=parent.pk,
+                    depth=depth,
+                    author_id=rng.choice(user_ids),
+                    text=sentence(rng, rng.randint(3, 20)),
+                    created=min(now, parent.created + timedelta(
+                        seconds=rng.randrange(24 * 60 * 60))),
+                )
+                for parent in chosen
+            ]
+        )
+        wave = Comment.objects.filter(pk__gt=last_id)
+        threads.fill_paths(wave)
+        parents = list(wave.only('pk', 'post_id', 'created'))
+        created += count
+    return created
+
+
+def seed(users=100, groups=10, posts=1000, comments=2000, replies=0,
+         follows=10, images=10, image_ratio=0.3, alpha=1.2, days=365,
+         random_seed=None, prefix='seed'):
+    """Создаёт набор данных; возвращает число созданных записей по типам."""
+    rng = random.Random(random_seed)
+    now = timezone.now()
+    password = make_password(None)
+    with transaction.atomic():
+        User.objects.bulk_create(
+            [
+                User(username=f'{prefix}{number}', password=password,
+                     first_name=sentence(rng, 1))
+                for number in range(users)
+            ]
+        )
+        user_ids = list(User.objects.filter(
+            username__startswith=prefix).values_list('pk', flat=True))
+        Group.objects.bulk_create(
+            [
+                Group(title=sentence(rng, 2), slug=f'{prefix}-{number}',
+                      description=sentence(rng, 12))
+                for number in range(groups)
+            ]
+        )
+        group_ids = list(Group.objects.filter(
+            slug__startswith=f'{prefix}-').values_list('pk', flat=True))
+
+        # Популярные авторы и пишут больше.
+        weights = power_law_weights(len(user_ids), alpha)
+        authors = rng.choices(user_ids, cum_weights=weights, k=posts)
+        image_names = make_images(rng, images, prefix) if images else []
+        last_post_id = Post.objects.aggregate(last=Max('pk'))['last'] or 0
+        with explicit_dates(Post._meta.get_field('pub_date'),
+                            Comment._meta.get_field('created')):
+            Post.objects.bulk_create(
+                [
+                    Post(
+                        text=sentence(rng, rng.randint(5, 60)),
+                        author_id=author_id,
+                        group_id=(rng.choice(group_ids)
+                                  if group_ids and rng.random() < 0.7
+                                  else None),
+                        image=(rng.choice(image_names)
+                               if image_names and rng.random() < image_ratio
+                               else ''),
+                        pub_date=now - timedelta(
+                            seconds=rng.randrange(days * 24 * 60 * 60)),
+                    )
+                    for author_id in authors
+                ]
+            )
+            post_dates = dict(Post.objects.filter(
+                pk__gt=last_post_id).values_list('pk', 'pub_date'))
+            post_ids = list(post_dates)
+            last_comment_id = Comment.objects.aggregate(
+                last=Max('pk'))['last'] or 0
+            Comment.objects.bulk_create(
+                [
+                    Comment(
+                        post_id=post_id,
+                        author_id=rng.choice(user_ids),
+                        text=sentence(rng, rng.randint(3, 20)),
+                        created=min(now, post_dates[post_id] + timedelta(
+                            seconds=rng.randrange(7 * 24 * 60 * 60))),
+                    )
+                    for post_id in (
+                        rng.choice(post_ids) for _ in range(
+                            comments if post_ids else 0))
+                ]
+            )
+            roots = Comment.objects.filter(pk__gt=last_comment_id)
+            threads.fill_paths(roots)
+            replies = add_replies(
+                rng, replies, user_ids,
+                list(roots.only('pk', 'post_id', 'created')), now)
+
+        follow_pairs = set()
+        for user_id in user_ids:
+            wanted = min(follows, len(user_ids) - 1)
+            followed = set()
+            while len(followed) < wanted:
+                followed.update(rng.choices(
+                    user_ids, cum_weights=weights, k=wanted - len(followed)))
+                followed.discard(user_id)
+            follow_pairs.update(
+                (user_id, author_id) for author_id in followed)
+        Follow.objects.bulk_create(
+            [Follow(user_id=user, author_id=author)
+             for user, author in follow_pairs],
+            ignore_conflicts=True,
+        )
+
+        stats.reconcile()
+        for follow in Follow.objects.filter(
+                user__username__startswith=prefix).iterator():
+            timeline.backfill(follow)
+        if search.available():
+            search.rebuild()
+    return {
+        'users': len(user_ids),
+        'groups': len(group_ids),
+        'posts': len(post_ids),
+        'comments': comments if post_ids else 0,
+        'replies': replies,
+        'follows': len(follow_pairs),
+        'images': len(image_names),
+    }
@@ -0,0 +1,204 @@
+import hashlib
+
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.urls import reverse
+
+from core import cache, jobs
+from . import search, stats, tasks, timeline
+from .models import Comment, Follow, Group, Post, User
+
+# Поля пользователя, которые видны в карточках его постов.
+AUTHOR_FIELDS = {'username', 'first_name', 'last_name'}
+
+
+def author_username(obj, field='author'):
+    """Имя автора ``obj`` (или пользователя в поле ``field``) или ``None``,
+    если его уже удалили вместе с его записями: страницы профиля больше
+    нет."""
+    if getattr(obj, f'{field}_id') is None:
+        return None
+    try:
+        return getattr(obj, field).username
+    except User.DoesNotExist:
+        return None
+
+
+def post_namespaces(post):
+    namespaces = ['index', f'post:{post.pk}']
+    username = author_username(post)
+    if username is not None:
+        namespaces.append(f'profile:{username}')
+    if post.group_id is not None:
+        namespaces.append(f'group:{post.group.slug}')
+    old_group_slug = getattr(post, '_old_group_slug', None)
+    if old_group_slug is not None:
+        namespaces.append(f'group:{old_group_slug}')
+    return namespaces
+
+
+def comment_namespaces(comment):
+    """Число комментариев есть в постах на всех списках и в профиле
+    комментатора. Вместе с постом удаляются и его комментарии: тогда
+    списки сбрасывает удаление поста."""
+    namespaces = [f'post:{comment.post_id}']
+    username = author_username(comment)
+    if username is not None:
+        namespaces.append(f'profile:{username}')
+    try:
+        post = comment.post
+    except Post.DoesNotExist:
+        return namespaces
+    return namespaces + post_namespaces(post)
+
+
+def follow_namespaces(follow):
+    """Подписка меняет счётчики в профилях автора и подписчика."""
+    usernames = (
+        author_username(follow, 'author'), author_username(follow, 'user'))
+    return [
+        f'profile:{username}' for username in usernames
+        if username is not None]
+
+
+def warm_post_pages(posts):
+    """Ставит прогрев списков, на которых показаны ``posts``."""
+    if jobs.runs_inline():
+        return
+    paths = [reverse('posts:index')]
+    for post in posts:
+        username = author_username(post)
+        if username is not None:
+            paths.append(reverse('posts:profile', args=[username]))
+        if post.group_id is not None:
+            paths.append(
+                reverse('posts:group_list', args=[post.group.slug]))
+    paths = list(dict.fromkeys(paths))
+    key = hashlib.md5(' '.join(paths).encode()).hexdigest()
+    tasks.warm_pages.enqueue(job_key=f'warm:{key}', paths=paths)
+
+
+@receiver(pre_save, sender=Post)
+def remember_group(sender, instance, **kwargs):
+    if instance.pk is not None:
+        instance._old_group_slug = Post.objects.filter(
+            pk=instance.pk
+        ).values_list('group__slug', flat=True).first()
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, **kwargs):
+    if created:
+        tasks.fan_out.enqueue(post_id=instance.pk)
+
+
+@receiver(post_save, sender=Post)
+def count_created_post(sender, instance, created, **kwargs):
+    if created:
+        stats.change(instance.author_id, posts_count=1)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    stats.change(instance.author_id, posts_count=-1)
+
+
+@receiver(post_save, sender=Post)
+def index_post_text(sender, instance, update_fields, **kwargs):
+    if update_fields is None or 'text' in update_fields:
+        search.index_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post_text(sender, instance, **kwargs):
+    search.remove_post(instance.pk)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_pages(sender, instance, **kwargs):
+    cache.bump(*post_namespaces(instance))
+    warm_post_pages([instance])
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_group_pages(sender, instance, **kwargs):
+    cache.bump('groups', f'group:{instance.slug}')
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_pages(sender, instance, created, update_fields,
+                            **kwargs):
+    """Имя автора есть в карточках его постов на всех списках."""
+    if created or (
+        update_fields is not None
+        and not AUTHOR_FIELDS.intersection(update_fields)
+    ):
+        return
+    groups = Group.objects.filter(
+        posts__author=instance
+    ).values_list('slug', flat=True).distinct()
+    cache.bump(
+        'index', f'profile:{instance.username}',
+        *(f'group:{slug}' for slug in groups))
+
+
+@receiver(post_save, sender=Comment)
+def count_created_comment(sender, instance, created, **kwargs):
+    if created:
+        stats.change(instance.author_id, comments_count=1)
+        stats.change_comment_count(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    stats.change(instance.author_id, comments_count=-1)
+    stats.change_comment_count(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Comment)
+def invalidate_saved_comment_pages(sender, instance, created, **kwargs):
+    if created:
+        cache.bump(*comment_namespaces(instance))
+    else:
+        cache.bump(f'post:{instance.post_id}')
+
+
+@receiver(post_delete, sender=Comment)
+def invalidate_deleted_comment_pages(sender, instance, **kwargs):
+    cache.bump(*comment_namespaces(instance))
+
+
+@receiver(post_save, sender=Follow)
+def count_created_follow(sender, instance, created, **kwargs):
+    if created:
+        stats.change(instance.author_id, followers_count=1)
+        stats.change(instance.user_id, following_count=1)
+
+
+@receiver(post_delete, sender=Follow)
+def count_deleted_follow(sender, instance, **kwargs):
+    stats.change(instance.author_id, followers_count=-1)
+    stats.change(instance.user_id, following_count=-1)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, **kwargs):
+    if created:
+        timeline.backfill(instance)
+
+
+@receiver(post_delete, sender=Follow)
+def trim_timeline(sender, instance, **kwargs):
+    timeline.trim(instance)
+    if timeline.left_heavy_authors(instance.author_id):
+        tasks.backfill_followers.enqueue(
+            job_key=f'backfill-followers:{instance.author_id}',
+            author_id=instance.author_id)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_profile_pages(sender, instance, **kwargs):
+    cache.bump(*follow_namespaces(instance))
@@ -0,0 +1,132 @@
+"""Денормализованные счётчики постов, комментариев и подписок авторов и
+число комментариев поста ``Post.comment_count``.
+
+Счётчики меняются атомарно через ``F()`` в сигналах создания и удаления
+``Post``, ``Comment`` и ``Follow``; расхождения исправляет команда
+``reconcile_author_stats``.
+"""
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import AuthorStats, Comment, Follow, Post, User
+
+COUNTERS = {
+    'posts_count': (Post, 'author'),
+    'comments_count': (Comment, 'author'),
+    'followers_count': (Follow, 'author'),
+    'following_count': (Follow, 'user'),
+}
+
+
+def _enough(deltas):
+    """Условие, при котором уменьшение не уведёт счётчики ниже нуля."""
+    return {
+        f'{name}__gte': -delta for name, delta in deltas.items() if delta < 0}
+
+
+def change(user_id, **deltas):
+    """Меняет счётчики пользователя на ``deltas``.
+
+    Строку счётчиков создаёт только увеличение. При удалении пользователя
+    его строка удаляется каскадом раньше постов и подписок, поэтому
+    уменьшение без строки или ниже нуля пропускается.
+    """
+    if user_id is None:
+        return
+    values = {name: F(name) + delta for name, delta in deltas.items()}
+    rows = AuthorStats.objects.filter(author_id=user_id)
+    if rows.filter(**_enough(deltas)).update(**values):
+        return
+    if any(delta < 0 for delta in deltas.values()):
+        return
+    try:
+        with transaction.atomic():
+            AuthorStats.objects.create(author_id=user_id)
+    except IntegrityError:
+        pass
+    rows.update(**values)
+
+
+def _by_delta(deltas):
+    groups = defaultdict(list)
+    for pk, delta in deltas.items():
+        if pk is not None and delta:
+            groups[delta].append(pk)
+    return groups.items()
+
+
+def change_many(name, deltas):
+    """Как ``change`` для многих пользователей сразу: ``deltas`` — словарь
+    ``{user_id: приращение}``; по одному UPDATE на каждое приращение."""
+    deltas = {pk: delta for pk, delta in deltas.items() if pk is not None}
+    AuthorStats.objects.bulk_create(
+        [AuthorStats(author_id=pk) for pk, delta in deltas.items()
+         if delta > 0],
+        ignore_conflicts=True)
+    for delta, user_ids in _by_delta(deltas):
+        AuthorStats.objects.filter(
+            author_id__in=user_ids, **_enough({name: delta})
+        ).update(**{name: F(name) + delta})
+
+
+def change_comment_count(post_id, delta):
+    change_comment_counts({post_id: delta})
+
+
+def change_comment_counts(deltas):
+    for delta, post_ids in _by_delta(deltas):
+        Post.objects.filter(
+            pk__in=post_ids, **_enough({'comment_count': delta})
+        ).update(comment_count=F('comment_count') + delta)
+
+
+def for_user(user_id):
+    """Счётчики автора без записи в базу, если строки ещё нет."""
+    return (
+        AuthorStats.objects.filter(author_id=user_id).first()
+        or AuthorStats(author_id=user_id)
+    )
+
+
+def _real_count(model, field):
+    counts = model.objects.filter(
+        **{field: OuterRef('pk')}
+    ).order_by().values(field).annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(counts), 0)
+
+
+def reconcile_comment_counts():
+    """Пересчитывает ``Post.comment_count``; возвращает число правок."""
+    posts = Post.objects.annotate(
+        real=_real_count(Comment, 'post')
+    ).exclude(comment_count=F('real')).values_list('pk', 'real')
+    fixed = 0
+    for post_id, real in posts.iterator():
+        fixed += Post.objects.filter(pk=post_id).update(comment_count=real)
+    return fixed
+
+
+def reconcile():
+    """Пересчитывает счётчики всех пользователей и постов; возвращает число
+    правок."""
+    users = User.objects.annotate(**{
+        f'real_{name}': _real_count(model, field)
+        for name, (model, field) in COUNTERS.items()
+    }).values('pk', *(f'real_{name}' for name in COUNTERS))
+    stored = {stats.author_id: stats for stats in AuthorStats.objects.all()}
+    fixed = 0
+    for user in users.iterator():
+        real = {name: user[f'real_{name}'] for name in COUNTERS}
+        stats = stored.get(user['pk'])
+        if stats is None:
+            AuthorStats.objects.create(author_id=user['pk'], **real)
+            fixed += 1
+        elif any(
+            getattr(stats, name) != value for name, value in real.items()
+        ):
+            AuthorStats.objects.filter(author_id=user['pk']).update(**real)
+            fixed += 1
+    return fixed + reconcile_comment_counts()
@@ -0,0 +1,77 @@
+"""Задачи очереди ``core.jobs``, которые ставят посты и их сигналы."""
+from io import BytesIO
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.handlers.wsgi import WSGIRequest
+from django.urls import resolve
+
+from core import jobs
+from . import stats, thumbnails, timeline
+from .models import Post
+
+
+@jobs.task(priority=10)
+def fan_out(post_id):
+    post = Post.objects.filter(pk=post_id).first()
+    if post is not None:
+        timeline.fan_out(post)
+
+
+@jobs.task(priority=10)
+def fan_out_posts(post_ids):
+    for post in Post.objects.filter(pk__in=post_ids).iterator():
+        timeline.fan_out(post)
+
+
+@jobs.task(priority=10, timeout=600)
+def backfill_followers(author_id):
+    timeline.backfill_followers(author_id)
+
+
+@jobs.task(priority=5, timeout=600)
+def make_thumbnails(post_id, image_name):
+    try:
+        thumbnails.process(Post, post_id, image_name)
+    finally:
+        thumbnails.forget_scheduled(image_name)
+
+
+def guest_request(path):
+    """GET-запрос гостя к ``path`` на адресе ``SITE_URL``."""
+    site = urlsplit(settings.SITE_URL)
+    default_port = '443' if site.scheme == 'https' else '80'
+    request = WSGIRequest({
+        'REQUEST_METHOD': 'GET',
+        'SCRIPT_NAME': '',
+        'PATH_INFO': path,
+        'QUERY_STRING': '',
+        'HTTP_HOST': site.netloc,
+        'SERVER_NAME': site.hostname,
+        'SERVER_PORT': str(site.port or default_port),
+        'wsgi.url_scheme': site.scheme,
+        'wsgi.input': BytesIO(),
+    })
+    request.user = AnonymousUser()
+    return request
+
+
+@jobs.task(priority=0)
+def warm_pages(paths):
+    """Отрисовывает гостевые страницы заново, пока их не запросил читатель.
+
+    Представление вызывается напрямую, без промежуточных слоёв и сети, с
+    тем же адресом ``SITE_URL``, что и у страниц в кеше.
+    """
+    for path in paths:
+        request = guest_request(path)
+        match = resolve(path)
+        response = match.func(request, *match.args, **match.kwargs)
+        if callable(getattr(response, 'render', None)):
+            response.render()
+
+
+@jobs.task(priority=-5, timeout=3600)
+def reconcile_stats():
+    stats.reconcile()
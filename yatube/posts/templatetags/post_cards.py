@@ -0,0 +1,96 @@
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from core import metrics
+from core.cache import get_versions
+from posts import thumbnails
+
+register = template.Library()
+
+
+@register.inclusion_tag('posts/includes/picture.html')
+def post_picture(post):
+    """Картинка поста со srcset из готовых вариантов.
+
+    Пока вариантов нет, отдаётся исходная картинка, а нарезка ставится в
+    очередь.
+    """
+    if not post.image:
+        return {}
+    if not post.variants_ready:
+        thumbnails.schedule(post)
+    sources = {}
+    for variant in post.variants:
+        sources.setdefault(variant['type'], []).append(variant)
+    fallback = sources.get('image/jpeg')
+    if not fallback:
+        return {'src': post.image.url}
+    return {
+        'sources': [
+            {
+                'type': content_type,
+                'srcset': ', '.join(
+                    f"{default_storage.url(variant['name'])} "
+                    f"{variant['width']}w"
+                    for variant in variants
+                ),
+            }
+            for content_type, variants in sources.items()
+        ],
+        'sizes': settings.POST_IMAGE_SIZES,
+        'src': default_storage.url(min(
+            fallback,
+            key=lambda variant: abs(
+                variant['width'] - settings.POST_IMAGE_FALLBACK_WIDTH),
+        )['name']),
+    }
+
+
+def card_namespaces(post):
+    """Пространства имён, от которых зависит карточка кроме самого поста:
+    в ней имя автора и ссылка на группу."""
+    namespaces = []
+    if post.author_id is not None:
+        namespaces.append(f'profile:{post.author.username}')
+    if post.group_id is not None:
+        namespaces.append(f'group:{post.group.slug}')
+    return namespaces
+
+
+def card_key(post, versions=None):
+    namespaces = card_namespaces(post)
+    if versions is None:
+        versions = get_versions(namespaces)
+    return ':'.join([
+        'post_card', str(post.pk), str(post.updated.timestamp()),
+        *(str(versions[namespace]) for namespace in namespaces),
+    ])
+
+
+@register.simple_tag
+def post_cards(posts):
+    """Карточки постов из кеша; отрисовываются только отсутствующие.
+
+    Версии пространств имён авторов и групп всей страницы читаются одним
+    обращением к кешу.
+    """
+    posts = list(posts)
+    versions = get_versions({
+        namespace for post in posts for namespace in card_namespaces(post)})
+    keys = {card_key(post, versions): post for post in posts}
+    cards = cache.get_many(keys)
+    metrics.CACHE_REQUESTS.inc('post_card', 'hit', amount=len(cards))
+    missing = {
+        key: render_to_string('posts/includes/post_card.html', {'post': post})
+        for key, post in keys.items() if key not in cards
+    }
+    if missing:
+        metrics.CACHE_REQUESTS.inc(
+            'post_card', 'miss', amount=len(missing))
+        cache.set_many(missing, settings.POST_CARD_CACHE_TIMEOUT)
+        cards.update(missing)
+    return [mark_safe(cards[key]) for key in keys]
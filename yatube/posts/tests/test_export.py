@@ -0,0 +1,94 @@
+import csv
+import gzip
+import io
+import json
+import os
+import tempfile
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from posts import export
+from posts.models import Comment, Follow, Group, Post, User
+
+
+class ExportTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        group = Group.objects.create(title='Группа', slug='group')
+        cls.posts = [
+            Post.objects.create(
+                text=f'Пост {number}, с запятой', author=cls.author,
+                group=group if number % 2 else None)
+            for number in range(5)
+        ]
+        Comment.objects.create(
+            post=cls.posts[0], author=cls.reader, text='Комментарий')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def read(self, exporter):
+        return b''.join(exporter)
+
+    def test_ndjson_rows(self):
+        lines = self.read(export.Export('posts', chunk_size=2)).splitlines()
+        rows = [json.loads(line) for line in lines]
+        self.assertEqual(
+            [row['id'] for row in rows], [post.pk for post in self.posts])
+        self.assertEqual(rows[1]['group'], 'group')
+        self.assertIsNone(rows[0]['group'])
+        self.assertEqual(rows[0]['author'], 'author')
+        self.assertEqual(rows[0]['comment_count'], 1)
+        self.assertEqual(
+            rows[0]['pub_date'], self.posts[0].pub_date.isoformat())
+
+    def test_csv_with_gzip(self):
+        data = gzip.decompress(self.read(
+            export.Export('comments', fmt='csv', compress=True)))
+        rows = list(csv.reader(io.StringIO(data.decode())))
+        self.assertEqual(rows[0], [name for name, _ in export.TABLES[
+            'comments'][1]])
+        self.assertEqual(rows[1][1], str(self.posts[0].pk))
+        self.assertEqual(rows[1][2], '')
+
+    def test_export_resumes_by_id_range(self):
+        exporter = export.Export(
+            'posts', after=self.posts[0].pk, until=self.posts[2].pk)
+        rows = [json.loads(line) for line in self.read(exporter).splitlines()]
+        self.assertEqual(
+            [row['id'] for row in rows],
+            [self.posts[1].pk, self.posts[2].pk])
+        self.assertEqual(exporter.count, 2)
+        self.assertEqual(exporter.last_id, self.posts[2].pk)
+
+    def test_command_writes_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'follows.ndjson.gz')
+            stderr = io.StringIO()
+            call_command(
+                'export_posts', 'follows', output=path, gzip=True,
+                stderr=stderr)
+            with gzip.open(path, 'rt') as dump:
+                rows = [json.loads(line) for line in dump]
+        self.assertEqual(
+            rows, [{'id': Follow.objects.get().pk, 'user': 'reader',
+                    'author': 'author'}])
+        self.assertIn('Выгружено строк: 1', stderr.getvalue())
+
+    def test_admin_export_streams_for_staff_only(self):
+        url = reverse('admin:posts_post_export')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 302)
+        admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+        self.client.force_login(admin)
+        response = self.client.get(url, {'format': 'csv', 'gzip': ''})
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertIn('posts.csv.gz', response['Content-Disposition'])
+        data = gzip.decompress(b''.join(response.streaming_content))
+        self.assertEqual(len(data.decode().splitlines()), 6)
+        response = self.client.get(url, {'format': 'xml'})
+        self.assertEqual(response.status_code, 400)
@@ -219,3 +219,40 @@ class CommentFormTests(TestCase):
                 text=form_data['text'],
             ).exists()
         )
+
+    def test_reply_to_comment(self):
+        self.author_client.post(
+            reverse('posts:add_comment', args=[self.post.id]),
+            data={'text': 'Ответ', 'parent': self.comment.pk},
+        )
+        reply = Comment.objects.get(text='Ответ')
+        self.assertEqual(reply.parent, self.comment)
+        self.assertEqual(reply.depth, 1)
+        self.assertTrue(reply.path.startswith(self.comment.path + '.'))
+
+    def test_reply_to_missing_comment_is_not_found(self):
+        other_post = Post.objects.create(author=self.user, text='Другой')
+        other_comment = Comment.objects.create(
+            author=self.user, text='Чужой', post=other_post)
+        for parent in (self.comment.pk + 100, other_comment.pk, 'x'):
+            with self.subTest(parent=parent):
+                response = self.author_client.post(
+                    reverse('posts:add_comment', args=[self.post.id]),
+                    data={'text': 'Ответ', 'parent': parent},
+                )
+                self.assertEqual(response.status_code, 404)
+
+    def test_reply_limits(self):
+        reply = Comment.objects.create(
+            author=self.user, text='Ответ', post=self.post,
+            parent=self.comment)
+        cases = (
+            ({'COMMENT_MAX_DEPTH': 1}, reply),
+            ({'COMMENT_MAX_REPLIES': 1}, self.comment),
+        )
+        for overrides, parent in cases:
+            with self.subTest(overrides=overrides):
+                with self.settings(**overrides):
+                    form = CommentForm({'text': 'Текст'}, parent=parent)
+                    self.assertFalse(form.is_valid())
+                    self.assertTrue(form.non_field_errors())
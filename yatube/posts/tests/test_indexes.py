@@ -0,0 +1,70 @@
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+
+from core.paginator import KeysetPaginator
+from posts import timeline
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN из SQLite')
+class QueryPlanTest(TestCase):
+    """Проверяем, что запросы списков идут по индексам без сортировки."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Пост')
+        Comment.objects.create(
+            post=cls.post, author=cls.reader, text='Комментарий')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def explain(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            return '\n'.join(str(row[-1]) for row in cursor.fetchall())
+
+    def page_queries(self, queryset, ordering):
+        paginator = KeysetPaginator(queryset, 10, ordering)
+        cursor = paginator.encode(paginator.object_list.first())
+        next_page = paginator.object_list.filter(
+            paginator._seek(paginator.decode(cursor), True))
+        return paginator.object_list[:11], next_page[:11]
+
+    def test_list_queries_use_indexes(self):
+        post_ordering = ('-pub_date', '-pk')
+        querysets = {
+            'index': (Post.objects.all(), post_ordering),
+            'group_posts': (
+                Post.objects.filter(group=self.group), post_ordering),
+            'profile': (
+                Post.objects.filter(author=self.author), post_ordering),
+            'follow_index': (
+                timeline.feed(self.reader), timeline.FEED_ORDERING),
+        }
+        for view, (queryset, ordering) in querysets.items():
+            for query in self.page_queries(queryset, ordering):
+                with self.subTest(view=view):
+                    plan = self.explain(query)
+                    self.assertIn('INDEX', plan)
+                    self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_comments_and_follow_use_indexes(self):
+        queries = (
+            self.post.comments.all(),
+            Follow.objects.filter(author=self.author, user=self.reader),
+            Follow.objects.filter(author=self.author).values('user_id'),
+        )
+        for query in queries:
+            with self.subTest(query=str(query.query)):
+                plan = self.explain(query)
+                self.assertIn('INDEX', plan)
+                self.assertNotIn('TEMP B-TREE', plan)
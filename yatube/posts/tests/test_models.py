@@ -1,7 +1,8 @@
 from django.contrib.auth import get_user_model
 from django.test import TestCase
 
-from posts.models import Post, Group, Comment, Follow
+from posts import stats
+from posts.models import AuthorStats, Post, Group, Comment, Follow
 
 User = get_user_model()
 
@@ -67,3 +68,54 @@ class FollowModelTest(TestCase):
         self.assertEqual(expected_user_username, str(follow.user.username))
         expected_author_username = follow.author.username
         self.assertEqual(expected_author_username, str(follow.author.username))
+
+
+class AuthorStatsModelTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+
+    def test_counters_follow_creates_and_deletes(self):
+        """Проверяем, что счётчики меняются вместе с записями."""
+        post = Post.objects.create(author=self.author, text='Пост')
+        Comment.objects.create(post=post, author=self.reader, text='Ответ')
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        author_stats = stats.for_user(self.author.pk)
+        reader_stats = stats.for_user(self.reader.pk)
+        self.assertEqual(author_stats.posts_count, 1)
+        self.assertEqual(author_stats.followers_count, 1)
+        self.assertEqual(reader_stats.comments_count, 1)
+        self.assertEqual(reader_stats.following_count, 1)
+        follow.delete()
+        post.delete()
+        author_stats.refresh_from_db()
+        reader_stats.refresh_from_db()
+        self.assertEqual(author_stats.posts_count, 0)
+        self.assertEqual(author_stats.followers_count, 0)
+        self.assertEqual(reader_stats.comments_count, 0)
+        self.assertEqual(reader_stats.following_count, 0)
+
+    def test_deleting_user_with_posts_and_follows(self):
+        """Удаление пользователя не упирается в счётчики без строки."""
+        post = Post.objects.create(author=self.author, text='Пост')
+        Comment.objects.create(post=post, author=self.author, text='Мой')
+        Comment.objects.create(post=post, author=self.reader, text='Ответ')
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=self.author, author=self.reader)
+        self.author.delete()
+        self.assertFalse(
+            AuthorStats.objects.filter(author_id=self.author.pk).exists())
+        reader_stats = stats.for_user(self.reader.pk)
+        self.assertEqual(reader_stats.comments_count, 0)
+        self.assertEqual(reader_stats.followers_count, 0)
+        self.assertEqual(reader_stats.following_count, 0)
+
+    def test_reconcile_repairs_drift(self):
+        Post.objects.create(author=self.author, text='Пост')
+        AuthorStats.objects.filter(author=self.author).update(posts_count=7)
+        AuthorStats.objects.filter(author=self.reader).delete()
+        self.assertEqual(stats.reconcile(), 2)
+        self.assertEqual(stats.for_user(self.author.pk).posts_count, 1)
+        self.assertTrue(
+            AuthorStats.objects.filter(author=self.reader).exists())
+        self.assertEqual(stats.reconcile(), 0)
@@ -0,0 +1,85 @@
+from io import StringIO
+from unittest import skipUnless
+
+from django.contrib.admin.sites import site
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import RequestFactory, TestCase
+from django.urls import reverse
+
+from posts import search
+from posts.models import Post
+
+User = get_user_model()
+
+
+@skipUnless(search.available(), 'FTS5 есть только в SQLite')
+class SearchTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.once = Post.objects.create(
+            author=cls.author, text='Кошка спит на диване')
+        cls.twice = Post.objects.create(
+            author=cls.author, text='Кошка ловит кошку, а кошки <b>спят</b>')
+        cls.other = Post.objects.create(
+            author=cls.author, text='Собака лает')
+
+    def found(self, query):
+        response = self.client.get(reverse('posts:search'), {'q': query})
+        return list(response.context['page_obj'])
+
+    def test_results_are_ranked_by_bm25(self):
+        self.assertEqual(self.found('кошк'), [self.twice, self.once])
+
+    def test_snippet_highlights_match_and_escapes_text(self):
+        post = self.found('спят')[0]
+        self.assertIn('<mark>спят</mark>', post.snippet)
+        self.assertIn('&lt;b&gt;', post.snippet)
+
+    def test_fts_syntax_in_query_is_harmless(self):
+        self.assertEqual(self.found('"кошка OR (NEAR'), [])
+        self.assertEqual(self.found('*** ""'), [])
+
+    def test_index_follows_edits_and_deletes(self):
+        post = Post.objects.get(pk=self.other.pk)
+        post.text = 'Собака спит'
+        post.save()
+        self.assertIn(post, self.found('спит'))
+        post.delete()
+        self.assertEqual(self.found('собака'), [])
+
+    def test_search_uses_fts_index(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'EXPLAIN QUERY PLAN SELECT rowid FROM {search.TABLE} '
+                f'WHERE {search.TABLE} MATCH %s ORDER BY rank',
+                [search.match_expression('кошка')],
+            )
+            plan = ' '.join(str(row[-1]) for row in cursor.fetchall())
+        self.assertIn('VIRTUAL TABLE INDEX', plan)
+
+    def test_admin_search_uses_index(self):
+        admin = site._registry[Post]
+        request = RequestFactory().get('/admin/posts/post/')
+        queryset, use_distinct = admin.get_search_results(
+            request, Post.objects.all(), 'диван')
+        self.assertEqual(list(queryset), [self.once])
+        self.assertFalse(use_distinct)
+
+    def test_admin_search_without_words_finds_nothing(self):
+        admin = site._registry[Post]
+        request = RequestFactory().get('/admin/posts/post/', {'q': '!!'})
+        queryset, _ = admin.get_search_results(
+            request, Post.objects.all(), '!!')
+        self.assertEqual(list(queryset), [])
+
+    def test_rebuild_command(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {search.TABLE}')
+        self.assertEqual(self.found('собака'), [])
+        out = StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertIn('3', out.getvalue())
+        self.assertEqual(self.found('собака'), [self.other])
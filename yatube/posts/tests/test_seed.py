@@ -0,0 +1,63 @@
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test import TestCase, override_settings
+
+from posts import seed, stats
+from posts.models import Comment, Follow, Post, TimelineEntry, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class SeedTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_seed_builds_consistent_dataset(self):
+        created = seed.seed(
+            users=20, groups=2, posts=60, comments=40, follows=3,
+            images=1, image_ratio=0.5, random_seed=1)
+        self.assertEqual(created['users'], User.objects.count())
+        self.assertEqual(Post.objects.count(), 60)
+        self.assertEqual(Comment.objects.count(), 40)
+        self.assertEqual(Follow.objects.count(), 20 * 3)
+        self.assertTrue(Post.objects.exclude(image='').exists())
+        self.assertGreater(
+            Post.objects.dates('pub_date', 'day').count(), 1)
+        self.assertEqual(stats.reconcile(), 0)
+        for follow in Follow.objects.all():
+            self.assertEqual(
+                TimelineEntry.objects.filter(
+                    user_id=follow.user_id,
+                    post__author_id=follow.author_id).count(),
+                Post.objects.filter(author_id=follow.author_id).count(),
+            )
+
+    def test_replies_form_threads(self):
+        created = seed.seed(
+            users=5, groups=1, posts=3, comments=10, replies=30, follows=1,
+            images=0, random_seed=1)
+        self.assertEqual(created['replies'], 30)
+        self.assertEqual(Comment.objects.count(), 40)
+        self.assertFalse(Comment.objects.filter(path='').exists())
+        self.assertGreater(Comment.objects.filter(depth__gt=2).count(), 0)
+        for reply in Comment.objects.filter(
+                parent__isnull=False).select_related('parent'):
+            self.assertTrue(reply.path.startswith(reply.parent.path + '.'))
+            self.assertEqual(reply.depth, reply.parent.depth + 1)
+            self.assertEqual(reply.post_id, reply.parent.post_id)
+        self.assertEqual(stats.reconcile(), 0)
+
+    def test_follows_follow_power_law(self):
+        seed.seed(users=50, groups=1, posts=0, comments=0, follows=5,
+                  images=0, random_seed=1)
+        followers = sorted(
+            (stats.for_user(user.pk).followers_count
+             for user in User.objects.all()),
+            reverse=True,
+        )
+        self.assertGreater(followers[0], 5 * followers[len(followers) // 2])
@@ -1,14 +1,22 @@
 import shutil
 import tempfile
+from io import BytesIO
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
 
-from posts.models import Group, Post, Comment, Follow
+from core.models import Job
+from posts.models import Group, Post, Comment, Follow, TimelineEntry
+from posts import stats, tasks, thumbnails
+from posts.templatetags.post_cards import (
+    card_key, post_cards, post_picture)
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
@@ -113,6 +121,7 @@ class TaskPagesTests(TestCase):
         post_group = first_object.group
         self.assertEqual(post_text, self.post.text)
         self.assertEqual(post_group.title, self.group.title)
+        cache.clear()
         response = self.authorized_client.get(
             reverse('posts:group_list', kwargs={'slug': self.group.slug})
         )
@@ -162,6 +171,16 @@ class PaginatorTests(TestCase):
         response = self.client.get(reverse('posts:index') + '?page=2')
         self.assertEqual(len(response.context['page_obj']), 3)
 
+    def test_second_page_by_cursor_contains_three_records(self):
+        cache.clear()
+        response = self.client.get(reverse('posts:index'))
+        next_cursor = response.context['page_obj'].next_cursor
+        self.assertContains(response, 'after=')
+        response = self.client.get(
+            reverse('posts:index'), {'after': next_cursor})
+        self.assertEqual(len(response.context['page_obj']), 3)
+        self.assertFalse(response.context['page_obj'].has_next())
+
     def test_group_first_page_contains_ten_records(self):
         response = self.client.get(reverse(
             'posts:group_list', kwargs={
@@ -267,6 +286,44 @@ class PostImageExistTest(TestCase):
                 post_image = test_object.image
                 self.assertEqual(post_image, 'posts/small.gif')
 
+    def test_image_variants_are_generated_outside_template(self):
+        post = Post.objects.get(pk=self.post.pk)
+        post.image_variants = ''
+        post.save()
+        updated = post.updated
+        self.assertEqual(post_picture(post)['src'], post.image.url)
+        post.refresh_from_db()
+        self.assertGreater(post.updated, updated)
+        widths = {variant['width'] for variant in post.variants}
+        self.assertEqual(widths, {2})
+        picture = post_picture(post)
+        self.assertIn('2w', picture['sources'][-1]['srcset'])
+        self.assertFalse(thumbnails.process(Post, post.pk, post.image.name))
+
+    @override_settings(POST_IMAGE_WIDTHS=(320, 640, 960, 1920))
+    def test_variants_are_not_wider_than_source(self):
+        buffer = BytesIO()
+        Image.new('RGB', (1000, 400)).save(buffer, 'PNG')
+        name = default_storage.save(
+            'posts/wide.png', ContentFile(buffer.getvalue()))
+        variants = thumbnails.render_variants(name, 'posts/variants/wide')
+        self.assertEqual(
+            sorted({variant['width'] for variant in variants}),
+            [320, 640, 960, 1000])
+
+    @override_settings(JOBS_INLINE=False)
+    def test_thumbnails_are_scheduled_once_for_all_processes(self):
+        cache.clear()
+        post = Post.objects.get(pk=self.post.pk)
+        thumbnails.schedule(post)
+        with self.assertNumQueries(0):
+            thumbnails.schedule(post)
+        tasks.make_thumbnails(post.pk, post.image.name)
+        Job.objects.all().delete()
+        thumbnails.schedule(post)
+        self.assertTrue(Job.objects.filter(
+            name='posts.tasks.make_thumbnails').exists())
+
 
 class FollowTest(TestCase):
     @classmethod
@@ -336,6 +393,136 @@ class FollowTest(TestCase):
         self.assertEqual = (len(response.context['page_obj']), 0)
 
 
+class TimelineTest(TestCase):
+    def setUp(self):
+        self.follower = User.objects.create_user(username='follower')
+        self.follower_client = Client()
+        self.follower_client.force_login(self.follower)
+        self.author = User.objects.create_user(username='author')
+        self.old_post = Post.objects.create(
+            author=self.author,
+            text='Старый пост',
+        )
+
+    def follow(self):
+        self.follower_client.get(reverse(
+            'posts:profile_follow',
+            kwargs={'username': self.author.username}))
+
+    def test_follow_backfills_timeline(self):
+        self.follow()
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.follower, post=self.old_post).exists())
+
+    def test_new_post_fans_out(self):
+        self.follow()
+        new_post = Post.objects.create(author=self.author, text='Новый')
+        response = self.follower_client.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            list(response.context['page_obj']), [new_post, self.old_post])
+
+    def test_unfollow_trims_timeline(self):
+        self.follow()
+        self.follower_client.get(reverse(
+            'posts:profile_unfollow',
+            kwargs={'username': self.author.username}))
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.follower).exists())
+        response = self.follower_client.get(reverse('posts:follow_index'))
+        self.assertEqual(len(response.context['page_obj']), 0)
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=0)
+    def test_heavy_author_is_read_on_request(self):
+        self.follow()
+        new_post = Post.objects.create(author=self.author, text='Новый')
+        self.assertFalse(TimelineEntry.objects.exists())
+        response = self.follower_client.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            list(response.context['page_obj']), [new_post, self.old_post])
+        self.assertFalse(TimelineEntry.objects.exists())
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_posts_stay_in_feed_when_author_gets_light(self):
+        other = User.objects.create_user(username='other')
+        Follow.objects.create(user=other, author=self.author)
+        self.follow()
+        new_post = Post.objects.create(author=self.author, text='Новый')
+        url = reverse('posts:follow_index')
+        expected = [new_post, self.old_post]
+        self.assertEqual(
+            list(self.follower_client.get(url).context['page_obj']),
+            expected)
+        Follow.objects.filter(user=other).delete()
+        self.assertEqual(
+            list(self.follower_client.get(url).context['page_obj']),
+            expected)
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1, POST_COUNT=2)
+    def test_heavy_author_is_merged_with_timeline(self):
+        light = User.objects.create_user(username='light')
+        Follow.objects.create(user=self.follower, author=light)
+        self.follow()
+        Follow.objects.create(user=light, author=self.author)
+        expected = [
+            Post.objects.create(author=author, text=f'Пост {number}')
+            for number, author in enumerate(
+                [light, self.author, light, self.author])
+        ][::-1] + [self.old_post]
+        self.assertFalse(TimelineEntry.objects.filter(
+            user=self.follower, post__author=self.author,
+            post__in=expected[:-1]).exists())
+        url = reverse('posts:follow_index')
+        posts = []
+        query = {}
+        while True:
+            page = self.follower_client.get(url, query).context['page_obj']
+            posts.extend(page)
+            if not page.has_next():
+                break
+            query = {'after': page.next_cursor}
+        self.assertEqual(posts, expected)
+
+
+class PostCardCacheTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(author=cls.author, text='Карточка')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_card_is_cached_after_page_render(self):
+        self.client.get(reverse('posts:index'))
+        self.assertIn('Карточка', cache.get(card_key(self.post)))
+
+    def test_cached_card_is_reused(self):
+        cache.set(card_key(self.post), 'из кеша')
+        self.assertEqual(post_cards([self.post]), ['из кеша'])
+
+    def test_edit_changes_card_key(self):
+        old_key = card_key(self.post)
+        self.post.text = 'Новый текст'
+        self.post.save()
+        self.assertNotEqual(card_key(self.post), old_key)
+        self.assertIn('Новый текст', post_cards([self.post])[0])
+
+    def test_author_and_group_edits_change_card(self):
+        group = Group.objects.create(title='Группа', slug='old-slug')
+        post = Post.objects.create(
+            author=self.author, text='В группе', group=group)
+        self.assertIn('old-slug', post_cards([post])[0])
+        author = User.objects.get(pk=self.author.pk)
+        author.first_name = 'Лев'
+        author.save()
+        group.slug = 'new-slug'
+        group.save()
+        post = Post.objects.select_related('author', 'group').get(pk=post.pk)
+        card = post_cards([post])[0]
+        self.assertIn('Лев', card)
+        self.assertIn('new-slug', card)
+
+
 class CommentTest(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -383,6 +570,119 @@ class CommentTest(TestCase):
                 self.assertEqual(fields, values)
 
 
+@override_settings(COMMENT_COUNT=3)
+class CommentPaginationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(
+            text='Популярный пост', author=cls.author)
+        for number in range(5):
+            Comment.objects.create(
+                post=cls.post, author=cls.author, text=f'Комментарий {number}')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_post_detail_shows_first_comments_and_count(self):
+        response = self.client.get(
+            reverse('posts:post_detail', args=[self.post.pk]))
+        comments = response.context['comments']
+        self.assertEqual(
+            [comment.text for comment in comments],
+            ['Комментарий 4', 'Комментарий 3', 'Комментарий 2'])
+        self.assertTrue(comments.has_next)
+        self.assertContains(response, 'Комментарии: 5')
+        self.assertContains(response, 'js-more-comments')
+
+    def test_fragment_returns_next_comments(self):
+        url = reverse('posts:post_comments', args=[self.post.pk])
+        first = self.client.get(url, {'format': 'json'}).json()
+        self.assertEqual(len(first['comments']), 3)
+        second = self.client.get(
+            url, {'format': 'json', 'after': first['next']}).json()
+        self.assertEqual(
+            [comment['text'] for comment in second['comments']],
+            ['Комментарий 1', 'Комментарий 0'])
+        self.assertIsNone(second['next'])
+        response = self.client.get(url, {'after': first['next']})
+        self.assertTemplateUsed(response, 'includes/comment.html')
+        self.assertContains(response, 'Комментарий 0')
+        self.assertNotContains(response, 'js-more-comments')
+
+    def test_fragment_of_missing_post_is_not_found(self):
+        response = self.client.get(
+            reverse('posts:post_comments', args=[self.post.pk + 1]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_comment_count_follows_comments(self):
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 5)
+        Comment.objects.filter(post=self.post).first().delete()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 4)
+        Post.objects.update(comment_count=0)
+        self.assertEqual(stats.reconcile_comment_counts(), 1)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 4)
+
+
+@override_settings(COMMENT_COUNT=3)
+class ThreadedCommentTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(text='Обсуждение', author=cls.author)
+
+        def comment(text, parent=None):
+            return Comment.objects.create(
+                post=cls.post, author=cls.author, text=text, parent=parent)
+
+        first = comment('Первая ветка')
+        reply = comment('Ответ', first)
+        comment('Ответ на ответ', reply)
+        comment('Второй ответ', first)
+        comment('Вторая ветка')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_threads_are_read_in_order(self):
+        url = reverse('posts:post_comments', args=[self.post.pk])
+        first = self.client.get(url, {'format': 'json'}).json()
+        second = self.client.get(
+            url, {'format': 'json', 'after': first['next']}).json()
+        comments = first['comments'] + second['comments']
+        self.assertEqual(
+            [(comment['text'], comment['depth']) for comment in comments],
+            [('Вторая ветка', 0), ('Первая ветка', 0), ('Ответ', 1),
+             ('Ответ на ответ', 2), ('Второй ответ', 1)])
+        self.assertIsNone(second['next'])
+
+    def test_nesting_is_rendered(self):
+        self.client.force_login(self.author)
+        response = self.client.get(
+            reverse('posts:post_detail', args=[self.post.pk]))
+        self.assertContains(response, 'margin-left: 2rem')
+        self.assertContains(response, 'data-parent=', count=3)
+
+    def test_reply_buttons_are_not_shared_through_cache(self):
+        url = reverse('posts:post_comments', args=[self.post.pk])
+        self.assertNotContains(self.client.get(url), 'js-reply')
+        self.client.force_login(self.author)
+        self.assertContains(self.client.get(url), 'data-parent=', count=3)
+        self.client.logout()
+        self.assertNotContains(self.client.get(url), 'js-reply')
+
+    def test_deleting_comment_removes_its_thread(self):
+        Comment.objects.get(text='Первая ветка').delete()
+        self.assertEqual(
+            list(self.post.comments.values_list('text', flat=True)),
+            ['Вторая ветка'])
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 1)
+
+
 class CacheTest(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -403,3 +703,174 @@ class CacheTest(TestCase):
         cache.clear()
         posts_count = Post.objects.count()
         self.assertEqual(len(response.context['page_obj']), posts_count)
+
+    def test_cached_page_is_not_shared_between_users(self):
+        cache.clear()
+        url = reverse('posts:profile', args=[self.author.username])
+        follower = User.objects.create_user(username='follower')
+        Follow.objects.create(user=follower, author=self.author)
+        reader = User.objects.create_user(username='reader')
+        for user in (follower, reader):
+            self.client.force_login(user)
+            response = self.client.get(url)
+            self.assertContains(response, f'Пользователь: {user.username}')
+        self.assertNotContains(response, 'Отписаться')
+        self.client.logout()
+        response = self.client.get(url)
+        self.assertNotContains(response, 'Пользователь:')
+        self.assertNotContains(response, 'Отписаться')
+
+    @override_settings(
+        SITE_URL='https://yatube.example',
+        ALLOWED_HOSTS=['yatube.example', 'testserver'])
+    def test_warm_pages_fills_guest_cache(self):
+        cache.clear()
+        url = reverse('posts:index')
+        tasks.warm_pages(paths=[url])
+        response = self.client.get(
+            url, HTTP_HOST='yatube.example', secure=True)
+        self.assertIsNone(response.context)
+        self.assertContains(response, self.post.text)
+
+    def test_new_post_invalidates_cached_pages(self):
+        cache.clear()
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:profile', kwargs={'username': 'author'}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                self.author_client.get(url)
+                self.assertIsNone(self.author_client.get(url).context)
+        Post.objects.create(author=self.author, text='Свежий пост')
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.author_client.get(url)
+                self.assertContains(response, 'Свежий пост')
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(title='Группа', slug='conditional')
+        cls.post = Post.objects.create(
+            author=cls.author, text='Пост', group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+
+    def assertNotModified(self, url):
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        return etag
+
+    def test_unchanged_pages_are_not_modified(self):
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=[self.group.slug]),
+            reverse('posts:profile', args=[self.author.username]),
+            reverse('posts:post_detail', args=[self.post.pk]),
+        )
+        self.client.get(urls[-1])
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertNotModified(url)
+
+    def test_changes_produce_new_etag(self):
+        detail = reverse('posts:post_detail', args=[self.post.pk])
+        self.client.get(detail)
+        index_etag = self.assertNotModified(reverse('posts:index'))
+        detail_etag = self.assertNotModified(detail)
+        Comment.objects.create(post=self.post, author=self.author, text='Да')
+        response = self.client.get(detail, HTTP_IF_NONE_MATCH=detail_etag)
+        self.assertContains(response, 'Да')
+        Post.objects.create(author=self.author, text='Свежий пост')
+        response = self.client.get(
+            reverse('posts:index'), HTTP_IF_NONE_MATCH=index_etag)
+        self.assertContains(response, 'Свежий пост')
+
+    def test_guest_pages_are_public_with_surrogate_keys(self):
+        detail = reverse('posts:post_detail', args=[self.post.pk])
+        self.client.get(detail)
+        expected = {
+            reverse('posts:index'): 'groups index',
+            reverse('posts:group_list', args=[self.group.slug]):
+                'group-conditional groups',
+            reverse('posts:profile', args=[self.author.username]):
+                'groups profile-author',
+            detail: f'groups post-{self.post.pk} profile-author',
+        }
+        for url, keys in expected.items():
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response['Surrogate-Key'], keys)
+                self.assertIn('public', response['Cache-Control'])
+                self.assertIn('s-maxage', response['Cache-Control'])
+                not_modified = self.client.get(
+                    url, HTTP_IF_NONE_MATCH=response['ETag'])
+                self.assertEqual(not_modified['Surrogate-Key'], keys)
+
+    def test_user_pages_are_private(self):
+        self.client.force_login(self.author)
+        response = self.client.get(reverse('posts:index'))
+        self.assertIn('private', response['Cache-Control'])
+        self.assertNotIn('public', response['Cache-Control'])
+        self.assertFalse(response.has_header('Surrogate-Key'))
+
+    def test_etag_depends_on_user(self):
+        anonymous_etag = self.client.get(reverse('posts:index'))['ETag']
+        self.client.force_login(self.author)
+        response = self.client.get(
+            reverse('posts:index'), HTTP_IF_NONE_MATCH=anonymous_etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_new_login_invalidates_page_with_form(self):
+        User.objects.create_user(username='reader', password='password')
+        credentials = {'username': 'reader', 'password': 'password'}
+        detail = reverse('posts:post_detail', args=[self.post.pk])
+        self.client.post(reverse('users:login'), credentials)
+        self.client.get(detail)
+        etag = self.client.get(detail)['ETag']
+        response = self.client.get(detail, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.client.get(reverse('users:logout'))
+        self.client.post(reverse('users:login'), credentials)
+        response = self.client.get(detail, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'csrfmiddlewaretoken')
+
+
+@override_settings(QUERY_BUDGET_RAISE=True)
+class QueryBudgetViewsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(title='Группа', slug='budget')
+        for number in range(15):
+            author = User.objects.create_user(username=f'author{number}')
+            Follow.objects.create(user=cls.reader, author=author)
+            cls.post = Post.objects.create(
+                text=f'Пост {number}', author=author, group=cls.group)
+            Comment.objects.create(
+                post=cls.post, author=author, text='Комментарий')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.reader)
+
+    def test_list_views_stay_within_budget(self):
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=[self.group.slug]),
+            reverse('posts:profile', args=[self.post.author.username]),
+            reverse('posts:post_detail', args=[self.post.pk]),
+            reverse('posts:post_comments', args=[self.post.pk]),
+            reverse('posts:follow_index'),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
@@ -0,0 +1,60 @@
+"""Ветки комментариев с материализованным путём.
+
+Путь комментария ``Comment.path`` — путь родителя и номер самого
+комментария фиксированной ширины через точку. Сегмент корневого
+комментария хранится в обратном порядке (``ROOT_BASE - pk``), поэтому
+сортировка по пути даёт ветки от новых к старым, а внутри ветки — ответы
+в порядке обхода в глубину от старых к новым. Страница комментариев поста
+читается одним запросом по индексу ``(post, path)`` без рекурсии, курсор
+страницы — сам путь.
+
+Глубина ветки ограничена ``COMMENT_MAX_DEPTH``, число прямых ответов на
+комментарий — ``COMMENT_MAX_REPLIES``.
+"""
+from django.conf import settings
+from django.core.exceptions import ValidationError
+
+SEGMENT_WIDTH = 10
+ROOT_BASE = 10 ** SEGMENT_WIDTH - 1
+SEPARATOR = '.'
+PATH_MAX_LENGTH = 255
+
+
+def root_path(pk):
+    return f'{ROOT_BASE - pk:0{SEGMENT_WIDTH}d}'
+
+
+def path_for(comment):
+    if comment.parent_id is None:
+        return root_path(comment.pk)
+    return f'{comment.parent.path}{SEPARATOR}{comment.pk:0{SEGMENT_WIDTH}d}'
+
+
+def check_reply(parent, reply_count=None):
+    """Проверяет, что на ``parent`` ещё можно ответить; ``reply_count`` —
+    уже известное число ответов на него."""
+    if parent.depth >= settings.COMMENT_MAX_DEPTH:
+        raise ValidationError(
+            'Ветка слишком глубокая, ответьте выше по ветке')
+    if reply_count is None:
+        reply_count = parent.replies.count()
+    if reply_count >= settings.COMMENT_MAX_REPLIES:
+        raise ValidationError('На этот комментарий ответили слишком много раз')
+
+
+def fill_paths(comments):
+    """Заполняет пути комментариев, вставленных ``bulk_create`` без них.
+
+    Уровни обрабатываются от корней вглубь, чтобы путь родителя был
+    известен раньше путей ответов.
+    """
+    missing = comments.filter(path='')
+    depths = list(missing.order_by('depth').values_list(
+        'depth', flat=True).distinct())
+    for depth in depths:
+        batch = []
+        for comment in missing.filter(depth=depth).select_related(
+                'parent').only('parent_id', 'parent__path').iterator():
+            comment.path = path_for(comment)
+            batch.append(comment)
+        comments.model.objects.bulk_update(batch, ['path'], batch_size=500)
@@ -0,0 +1,140 @@
+"""Фоновая подготовка картинок постов.
+
+Из исходной картинки нарезается набор вариантов разной ширины
+(``POST_IMAGE_WIDTHS``, но не шире самой картинки) в форматах WebP и JPEG
+с кадрированием по центру до пропорций ``POST_IMAGE_RATIO``. Сведения о
+вариантах сохраняются в самом посте (``Post.image_variants``), поэтому при
+отрисовке не нужно обращаться к хранилищу. Пока вариантов нет, шаблоны
+отдают исходную картинку, а нарезка ставится в очередь задач
+(``posts.tasks.make_thumbnails``). После нарезки у поста обновляется
+``updated``, поэтому закешированные карточки и страницы перерисовываются.
+"""
+import json
+import logging
+import os
+import time
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import features, Image
+
+from core import metrics
+
+logger = logging.getLogger(__name__)
+
+FORMATS = (
+    ('webp', 'WEBP', 'image/webp'),
+    ('jpg', 'JPEG', 'image/jpeg'),
+)
+
+# Сколько помнить, что нарезка картинки уже в очереди. Повторную задачу
+# всё равно отсекает её job_key; метка лишь избавляет отрисовку от попытки.
+SCHEDULED_TIMEOUT = 10 * 60
+
+
+def output_formats():
+    return [
+        (extension, pil_format, content_type)
+        for extension, pil_format, content_type in FORMATS
+        if pil_format != 'WEBP' or features.check('webp')
+    ]
+
+
+def parse_variants(raw):
+    """Исходная картинка и список её вариантов из ``Post.image_variants``."""
+    if not raw:
+        return None, []
+    data = json.loads(raw)
+    return data['source'], data['variants']
+
+
+def _crop(image):
+    ratio_width, ratio_height = settings.POST_IMAGE_RATIO
+    width, height = image.size
+    target_height = width * ratio_height // ratio_width
+    if target_height <= height:
+        top = (height - target_height) // 2
+        return image.crop((0, top, width, top + target_height))
+    target_width = height * ratio_width // ratio_height
+    left = (width - target_width) // 2
+    return image.crop((left, 0, left + target_width, height))
+
+
+def variant_widths(source_width):
+    """Ширины вариантов для кадрированной картинки ширины
+    ``source_width``: картинка не увеличивается, и если она уже самой
+    большой ширины, её собственная ширина становится наибольшим
+    вариантом."""
+    largest = min(source_width, max(settings.POST_IMAGE_WIDTHS))
+    return sorted({
+        width for width in settings.POST_IMAGE_WIDTHS if width < largest
+    } | {largest})
+
+
+def render_variants(image_name, directory):
+    ratio_width, ratio_height = settings.POST_IMAGE_RATIO
+    with default_storage.open(image_name) as source:
+        image = _crop(Image.open(source).convert('RGB'))
+    base = os.path.splitext(os.path.basename(image_name))[0]
+    variants = []
+    for width in variant_widths(image.width):
+        height = max(width * ratio_height // ratio_width, 1)
+        resized = image.resize((width, height), Image.LANCZOS)
+        for extension, pil_format, content_type in output_formats():
+            buffer = BytesIO()
+            resized.save(
+                buffer, pil_format, quality=settings.POST_IMAGE_QUALITY)
+            name = default_storage.save(
+                f'{directory}/{base}-{width}.{extension}',
+                ContentFile(buffer.getvalue()),
+            )
+            variants.append({
+                'name': name,
+                'width': width,
+                'type': content_type,
+                'size': buffer.tell(),
+            })
+    return variants
+
+
+def process(model, pk, image_name):
+    post = model.objects.filter(pk=pk, image=image_name).first()
+    if post is None or post.variants_ready:
+        return False
+    started = time.perf_counter()
+    try:
+        variants = render_variants(image_name, f'posts/variants/{pk}')
+    except Exception:
+        # Битая картинка отдаётся как есть и больше не ставится в очередь.
+        logger.exception('Не удалось нарезать картинку %s', image_name)
+        variants = []
+    metrics.THUMBNAIL_DURATION.observe(time.perf_counter() - started)
+    post.image_variants = json.dumps(
+        {'source': image_name, 'variants': variants})
+    post.save(update_fields=['image_variants', 'updated'])
+    return True
+
+
+def _scheduled_key(image_name):
+    return f'thumbnails:scheduled:{image_name}'
+
+
+def forget_scheduled(image_name):
+    cache.delete(_scheduled_key(image_name))
+
+
+def schedule(post):
+    """Ставит нарезку в очередь задач не чаще раза в ``SCHEDULED_TIMEOUT``
+    на картинку; метка в общем кеше видна всем процессам."""
+    from .tasks import make_thumbnails
+
+    image_name = post.image.name
+    if not image_name or not cache.add(
+            _scheduled_key(image_name), True, SCHEDULED_TIMEOUT):
+        return
+    make_thumbnails.enqueue(
+        job_key=f'thumbnails:{image_name}', post_id=post.pk,
+        image_name=image_name)
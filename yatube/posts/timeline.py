@@ -0,0 +1,170 @@
+"""Материализованная лента подписок.
+
+Посты обычных авторов раскладываются по лентам подписчиков при публикации
+(fan-out on write). Посты авторов, у которых подписчиков больше
+``TIMELINE_FANOUT_LIMIT``, при публикации не копируются: при чтении лента
+подписчика сливается с их постами (fan-out on read), без записи в базу.
+Страница ленты — это не больше страницы записей по индексу
+``(user, pub_date, post)`` таблицы ``TimelineEntry`` и не больше страницы
+постов каждого такого автора по индексу ``(author, pub_date)``.
+"""
+from django.conf import settings
+from django.db import connection
+from django.db.models import F, Q
+
+from core.paginator import KeysetPaginator
+
+from .models import AuthorStats, Follow, Post, TimelineEntry
+
+
+def is_heavy_author(author_id):
+    return AuthorStats.objects.filter(
+        author_id=author_id,
+        followers_count__gt=settings.TIMELINE_FANOUT_LIMIT,
+    ).exists()
+
+
+def fan_out(post):
+    if post.author_id is None or is_heavy_author(post.author_id):
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True)
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+            for user_id in followers.iterator()
+        ],
+        batch_size=settings.TIMELINE_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def _copy_posts(user_id, author_id):
+    """Кладёт в ленту последние посты автора одним INSERT ... SELECT."""
+    ops = connection.ops
+    params = [user_id, author_id, settings.TIMELINE_BACKFILL]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'{ops.insert_statement(ignore_conflicts=True)} '
+            f'{TimelineEntry._meta.db_table} (user_id, post_id, pub_date) '
+            f'SELECT %s, id, pub_date FROM {Post._meta.db_table} '
+            f'WHERE author_id = %s '
+            f'ORDER BY pub_date DESC LIMIT %s '
+            f'{ops.ignore_conflicts_suffix_sql(ignore_conflicts=True)}',
+            params,
+        )
+
+
+def backfill(follow):
+    if not is_heavy_author(follow.author_id):
+        _copy_posts(follow.user_id, follow.author_id)
+
+
+def left_heavy_authors(author_id):
+    """Стало ли у автора ровно ``TIMELINE_FANOUT_LIMIT`` подписчиков, то
+    есть он только что перестал быть автором без раскладки."""
+    return AuthorStats.objects.filter(
+        author_id=author_id,
+        followers_count=settings.TIMELINE_FANOUT_LIMIT,
+    ).exists()
+
+
+def backfill_followers(author_id):
+    """Раскладывает последние посты автора по лентам всех подписчиков.
+
+    Посты, опубликованные, пока у автора было больше
+    ``TIMELINE_FANOUT_LIMIT`` подписчиков, ни в одну ленту не попали; когда
+    он опускается до предела, ленты перестают читать его посты напрямую, и
+    без этой раскладки посты из лент пропали бы.
+    """
+    if is_heavy_author(author_id):
+        return
+    ops = connection.ops
+    params = [author_id, settings.TIMELINE_BACKFILL, author_id]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'{ops.insert_statement(ignore_conflicts=True)} '
+            f'{TimelineEntry._meta.db_table} (user_id, post_id, pub_date) '
+            f'SELECT follow.user_id, latest.id, latest.pub_date '
+            f'FROM {Follow._meta.db_table} follow, ('
+            f'SELECT id, pub_date FROM {Post._meta.db_table} '
+            f'WHERE author_id = %s ORDER BY pub_date DESC LIMIT %s'
+            f') latest '
+            f'WHERE follow.author_id = %s '
+            f'{ops.ignore_conflicts_suffix_sql(ignore_conflicts=True)}',
+            params,
+        )
+
+
+def trim(follow):
+    TimelineEntry.objects.filter(
+        user_id=follow.user_id, post__author_id=follow.author_id
+    ).delete()
+
+
+def heavy_authors(user):
+    return Follow.objects.filter(
+        user=user,
+        author__stats__followers_count__gt=settings.TIMELINE_FANOUT_LIMIT,
+    ).values_list('author_id', flat=True)
+
+
+def feed(user, posts=None):
+    """Посты из материализованной ленты; сортировать по ``FEED_ORDERING``.
+    Посты авторов без раскладки добавляет ``FeedPaginator``."""
+    if posts is None:
+        posts = Post.objects.all()
+    return posts.filter(timeline_entries__user=user).annotate(
+        feed_date=F('timeline_entries__pub_date'),
+        feed_post=F('timeline_entries__post_id'),
+    )
+
+
+FEED_ORDERING = ('-feed_date', '-feed_post')
+
+
+def _by_date(posts):
+    return posts.annotate(
+        feed_date=F('pub_date'), feed_post=F('pk')
+    ).order_by(*FEED_ORDERING)
+
+
+class FeedPaginator(KeysetPaginator):
+    """Страницы ленты ``user`` из постов ``posts``.
+
+    Страница собирается из двух запросов: по материализованной ленте и по
+    постам авторов без раскладки, где от каждого автора берётся не больше
+    нужного числа строк. Строки сливаются в Python; порядок ленты
+    ``FEED_ORDERING`` — по убыванию.
+    """
+
+    def __init__(self, posts, per_page, ordering=FEED_ORDERING, *, user):
+        self.posts = posts
+        self.heavy_authors = list(heavy_authors(user))
+        super().__init__(feed(user, posts), per_page, FEED_ORDERING)
+
+    def _slice(self, seek, forward, start, stop):
+        rows = super()._slice(seek, forward, 0, stop)
+        if self.heavy_authors:
+            rows += self._heavy_slice(seek, forward, stop)
+        names = [name for name, _ in self._fields()]
+        rows = sorted(
+            {row.pk: row for row in rows}.values(),
+            key=lambda row: [getattr(row, name) for name in names],
+            reverse=forward,
+        )
+        return rows[start:stop]
+
+    def _heavy_slice(self, seek, forward, stop):
+        latest = Q()
+        for author_id in self.heavy_authors:
+            posts = _by_date(Post.objects.filter(author_id=author_id))
+            posts = posts.filter(seek)
+            if not forward:
+                posts = posts.reverse()
+            latest |= Q(pk__in=posts.values('pk')[:stop])
+        queryset = _by_date(self.posts.filter(latest))
+        if not forward:
+            queryset = queryset.reverse()
+        return list(queryset[:stop])
@@ -1,19 +1,45 @@
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
+from django.core.cache import cache
 from django.core.paginator import Paginator
+from django.http import Http404, JsonResponse
 from django.shortcuts import get_object_or_404, render, redirect
-from django.views.decorators.cache import cache_page
+from django.views.decorators.http import condition
 
+from core.cache import cache_page_versioned, etag, proxy_cacheable
+from core.db_router import pin_to_primary, read_from_replica
+from core.paginator import KeysetPaginator
+from core.queries import query_budget
+
+from . import search as post_search, stats, timeline
 from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post, User
+from .models import Comment, Follow, Group, Post, User
+
+COMMENT_ORDERING = ('path',)
+
+
+def paginate(request, post_list, ordering=('-pub_date', '-pk')):
+    paginator = KeysetPaginator(post_list, settings.POST_COUNT, ordering)
+    return paginator.page_from_request(request.GET)
+
+
+def paginate_comments(query, post_id):
+    """Комментарии поста в порядке веток (см. ``posts.threads``) порциями
+    по ``COMMENT_COUNT``; следующая порция открывается курсором ``?after=``
+    по пути комментария."""
+    comments = Comment.objects.select_related('author').filter(
+        post_id=post_id)
+    paginator = KeysetPaginator(
+        comments, settings.COMMENT_COUNT, COMMENT_ORDERING)
+    return paginator.page_from_request(query)
 
 
-@cache_page(20, key_prefix='index_page')
+@query_budget(3)
+@cache_page_versioned(settings.POSTS_CACHE_TIMEOUT, 'index', 'groups')
+@read_from_replica
 def index(request):
-    post_list = Post.objects.select_related().all()
-    paginator = Paginator(post_list, settings.POST_COUNT)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    post_list = Post.objects.select_related('author', 'group')
+    page_obj = paginate(request, post_list)
     index = True
     context = {
         'page_obj': page_obj,
@@ -22,13 +48,16 @@ def index(request):
     return render(request, 'posts/index.html', context)
 
 
+@query_budget(4)
+@cache_page_versioned(
+    settings.POSTS_CACHE_TIMEOUT, 'group:{slug}', 'groups')
+@read_from_replica
 def group_posts(request, slug):
     template = 'posts/group_list.html'
     group = get_object_or_404(Group, slug=slug)
-    page_number = request.GET.get('page')
-    post_list = Post.objects.filter(group=group)
-    paginator = Paginator(post_list, settings.POST_COUNT)
-    page_obj = paginator.get_page(page_number)
+    post_list = Post.objects.select_related('author', 'group').filter(
+        group=group)
+    page_obj = paginate(request, post_list)
     context = {
         'title': f'Записи сообщества {slug}',
         'group': group,
@@ -37,13 +66,16 @@ def group_posts(request, slug):
     return render(request, template, context)
 
 
+@query_budget(6)
+@cache_page_versioned(
+    settings.POSTS_CACHE_TIMEOUT, 'profile:{username}', 'groups')
+@read_from_replica
 def profile(request, username):
     user_profile = get_object_or_404(User, username=username)
-    user_posts = Post.objects.filter(author=user_profile)
-    posts_count = user_posts.count()
-    paginator = Paginator(user_posts, settings.POST_COUNT)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    user_posts = Post.objects.select_related('author', 'group').filter(
+        author=user_profile)
+    posts_count = stats.for_user(user_profile.pk).posts_count
+    page_obj = paginate(request, user_posts)
     if request.user.is_authenticated:
         following = Follow.objects.filter(
             user=request.user, author=user_profile).exists()
@@ -58,12 +90,36 @@ def profile(request, username):
     return render(request, 'posts/profile.html', context)
 
 
+def post_author_key(post_id):
+    return f'post_author:{post_id}'
+
+
+def post_detail_namespaces(request, post_id):
+    """Страница поста зависит и от числа постов автора, поэтому в её
+    пространства имён входит профиль. Логин автора берётся из кеша: пока
+    его там нет, пространства имён неизвестны."""
+    username = cache.get(post_author_key(post_id))
+    if username is None:
+        return None
+    return [f'post:{post_id}', f'profile:{username}', 'groups']
+
+
+def post_detail_etag(request, post_id):
+    namespaces = post_detail_namespaces(request, post_id)
+    return None if namespaces is None else etag(request, namespaces)
+
+
+@query_budget(5)
+@proxy_cacheable(post_detail_namespaces)
+@condition(etag_func=post_detail_etag)
+@read_from_replica
 def post_detail(request, post_id):
-    user_post = get_object_or_404(Post, pk=post_id)
+    user_post = get_object_or_404(
+        Post.objects.select_related('author', 'group'), pk=post_id)
+    cache.add(post_author_key(post_id), user_post.author.username, None)
     form = CommentForm()
-    comments = user_post.comments.all()
-    posts = Post.objects.filter(author_id=user_post.author_id)
-    posts_count = posts.count()
+    comments = paginate_comments({}, post_id)
+    posts_count = stats.for_user(user_post.author_id).posts_count
     context = {
         'post': user_post,
         'posts_count': posts_count,
@@ -73,7 +129,53 @@ def post_detail(request, post_id):
     return render(request, 'posts/post_detail.html', context)
 
 
+@query_budget(4)
+@cache_page_versioned(settings.POSTS_CACHE_TIMEOUT, 'post:{post_id}')
+@read_from_replica
+def post_comments(request, post_id):
+    """Следующая порция комментариев для подгрузки на странице поста:
+    HTML-фрагмент или JSON при ``?format=json``."""
+    page_obj = paginate_comments(request.GET, post_id)
+    if not page_obj and not Post.objects.filter(pk=post_id).exists():
+        raise Http404
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'comments': [
+                {
+                    'id': comment.pk,
+                    'parent': comment.parent_id,
+                    'depth': comment.depth,
+                    'author': comment.author.username,
+                    'text': comment.text,
+                    'created': comment.created.isoformat(),
+                }
+                for comment in page_obj
+            ],
+            'next': page_obj.next_cursor or None,
+        })
+    context = {
+        'comments': page_obj,
+        'post_id': post_id,
+    }
+    return render(request, 'includes/comment.html', context)
+
+
+@query_budget(5)
+def search(request):
+    query = request.GET.get('q', '').strip()
+    results = post_search.SearchResults(
+        query, Post.objects.select_related('author', 'group'))
+    page_obj = Paginator(results, settings.POST_COUNT).get_page(
+        request.GET.get('page'))
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+    }
+    return render(request, 'posts/search.html', context)
+
+
 @login_required
+@pin_to_primary
 def post_create(request):
     form = PostForm(
         request.POST or None,
@@ -88,6 +190,7 @@ def post_create(request):
 
 
 @login_required
+@pin_to_primary
 def post_edit(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
     if post.author != request.user:
@@ -110,9 +213,16 @@ def post_edit(request, post_id):
 
 
 @login_required
+@pin_to_primary
 def add_comment(request, post_id):
     post = get_object_or_404(Post, id=post_id)
-    form = CommentForm(request.POST or None)
+    parent = None
+    parent_id = request.POST.get('parent', '')
+    if parent_id:
+        if not parent_id.isdigit():
+            raise Http404
+        parent = get_object_or_404(post.comments, pk=parent_id)
+    form = CommentForm(request.POST or None, parent=parent)
     if form.is_valid():
         comment = form.save(commit=False)
         comment.author = request.user
@@ -122,11 +232,13 @@ def add_comment(request, post_id):
 
 
 @login_required
+@query_budget(6)
+@read_from_replica
 def follow_index(request):
-    posts = Post.objects.filter(author__following__user=request.user)
-    paginator = Paginator(posts, settings.POST_COUNT)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    paginator = timeline.FeedPaginator(
+        Post.objects.select_related('author', 'group'), settings.POST_COUNT,
+        user=request.user)
+    page_obj = paginator.page_from_request(request.GET)
     follow = True
     context = {
         'page_obj': page_obj,
@@ -136,6 +248,7 @@ def follow_index(request):
 
 
 @login_required
+@pin_to_primary
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
     if request.user != author:
@@ -144,6 +257,7 @@ def profile_follow(request, username):
 
 
 @login_required
+@pin_to_primary
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
     if request.user != author:
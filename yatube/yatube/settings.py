@@ -38,16 +38,17 @@ INSTALLED_APPS = [
     'users.apps.UsersConfig',
     'core.apps.CoreConfig',
     'posts.apps.PostsConfig',
+    'api.apps.ApiConfig',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
-    'sorl.thumbnail',
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -62,7 +63,7 @@ ROOT_URLCONF = 'yatube.urls'
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.templates_backend.DjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -85,11 +86,35 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'core.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'CONN_MAX_AGE': 60,
     }
 }
 
+# Выполняются на каждом новом соединении SQLite (core.backends.sqlite3).
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'busy_timeout': 5000,
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -20000,
+    'temp_store': 'memory',
+}
+
+SQLITE_IMMEDIATE_TRANSACTIONS = True
+
+# Реплики только для чтения: алиас из DATABASES и вес. Для проверки на одной
+# машине подойдут копии db.sqlite3 (команда sync_sqlite_replicas); в тестах
+# реплике нужен 'TEST': {'MIRROR': 'default'}.
+DATABASE_REPLICAS = {}
+
+DATABASE_ROUTERS = ['core.db_router.ReplicaRouter']
+
+REPLICA_STICKINESS = 10
+
+REPLICA_HEALTH_CHECK_INTERVAL = 5
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -143,13 +168,135 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 POST_COUNT = 10
 
+COMMENT_COUNT = 20
+
+API_PAGE_SIZE = 20
+
+API_BATCH_SIZE = 500
+
+EXPORT_CHUNK_SIZE = 2000
+
+# Не больше 22: путь ветки хранится в CharField(max_length=255)
+COMMENT_MAX_DEPTH = 8
+
+COMMENT_MAX_REPLIES = 200
+
+PAGINATOR_MAX_OFFSET_PAGE = 100
+
+TIMELINE_FANOUT_LIMIT = 10000
+
+TIMELINE_BACKFILL = 1000
+
+TIMELINE_BATCH_SIZE = 500
+
+SEARCH_MAX_RESULTS = 200
+
+SEARCH_SNIPPET_WORDS = 16
+
+QUERY_BUDGET_RAISE = False
+
+# /metrics отдаётся сотрудникам (is_staff), по заголовку
+# «Authorization: Bearer <METRICS_TOKEN>» и адресам METRICS_ALLOWED_IPS
+# (None — всем). За прокси на той же машине REMOTE_ADDR у всех запросов
+# 127.0.0.1, поэтому локальные адреса сюда вписывать нельзя: либо токен,
+# либо /metrics закрыт на прокси.
+METRICS_TOKEN = None
+
+METRICS_ALLOWED_IPS = ()
+
+SLOW_QUERY_THRESHOLD = 0.1
+
+SLOW_QUERY_LOG = os.path.join(BASE_DIR, 'slow_queries.log')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'slow_queries': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': SLOW_QUERY_LOG,
+            'maxBytes': 10 * 1024 * 1024,
+            'backupCount': 5,
+            'encoding': 'utf-8',
+            'delay': True,
+        },
+    },
+    'loggers': {
+        'core.slow_queries': {
+            'handlers': ['slow_queries'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
+
+TEST_RUNNER = 'core.test_runner.QueryBudgetRunner'
+
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Кеш общий для всех воркеров (core.backends.cache). На нескольких машинах
+# вместо файла нужен сервер Redis:
+#     'BACKEND': 'core.backends.cache.RedisCache',
+#     'LOCATION': 'redis://127.0.0.1:6379/0',
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.backends.cache.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+            'COMPRESS_MIN_LENGTH': 1024,
+        },
     }
 }
+
+POSTS_CACHE_TIMEOUT = 60 * 60 * 6
+
+# Страницы cache_page_versioned: сколько отдавать устаревшую запись, пока её
+# обновляет другой запрос; сколько ждать чужую отрисовку (0 — не ждать);
+# насколько рано обновлять запись (beta из XFetch, 0 — не раньше срока).
+PAGE_CACHE_STALE_TIMEOUT = 60 * 10
+
+PAGE_CACHE_LOCK_TIMEOUT = 10
+
+PAGE_CACHE_EARLY_BETA = 1.0
+
+# Кеширующий прокси перед Django (core.purge): сколько он хранит гостевые
+# страницы и куда слать сброс по суррогатным ключам.
+PROXY_CACHE_MAX_AGE = 60 * 60
+
+PROXY_PURGER = 'core.purge.NullPurger'
+
+PROXY_PURGE_URL = 'http://127.0.0.1:6081/'
+
+PROXY_PURGE_METHOD = 'PURGE'
+
+PROXY_PURGE_TIMEOUT = 2
+
+# Адрес сайта, как его видят читатели: схема и хост входят в ключ кеша
+# страниц, и прогрев (posts.tasks.warm_pages) отрисовывает страницы для него.
+SITE_URL = 'http://localhost'
+
+POST_CARD_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Очередь задач core.jobs. JOBS_INLINE: None — выполнять задачи сразу только
+# с базой SQLite в памяти (тесты), True/False — всегда/никогда.
+JOBS_INLINE = None
+
+JOBS_VISIBILITY_TIMEOUT = 300
+
+JOBS_RETRY_DELAY = 10
+
+JOBS_POLL_INTERVAL = 1
+
+POST_IMAGE_WIDTHS = (320, 640, 960, 1920)
+
+POST_IMAGE_RATIO = (960, 339)
+
+POST_IMAGE_QUALITY = 80
+
+POST_IMAGE_FALLBACK_WIDTH = 960
+
+POST_IMAGE_SIZES = '(max-width: 960px) 100vw, 960px'